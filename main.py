@@ -18,10 +18,10 @@ try:
     import models.enums as enums
     import models.data_models as data_models
     import models.user_models as user_models
-    import services.data_service as data_service
-    import services.analysis_service as analysis_service
-    import services.ui_service as ui_service
+    # Модули сервисов загружаются по мере использования в main()
+    import services.metrics_service as metrics_service
     
+    metrics_service.configure_logging()
     print("✅ Все модули успешно импортированы")
     
 except Exception as e:
@@ -54,6 +54,7 @@ def main():
     print(f"2. Создано подключение: {conn.connection_string}")
     
     # 3. Создаем ETL сервис
+    import services.data_service as data_service
     etl = data_service.ETLService()
     etl.add_source(conn)
     etl.add_loader(StorageType.DOCUMENT)
@@ -64,6 +65,7 @@ def main():
     print(f"4. ETL выполнен: {result['loaded']} данных загружено")
     
     # 5. Анализ текста
+    import services.analysis_service as analysis_service
     nlp = analysis_service.NLPService()
     text = "Компания Microsoft в Сиэтле представила Windows 11 15.12.2024"
     entities = nlp.extract_entities(text)
@@ -85,6 +87,7 @@ def main():
     print("7. Граф сохранен в хранилище")
     
     # 8. Поиск
+    import services.ui_service as ui_service
     search = ui_service.SearchService(storage, nlp)
     query = user_models.UserQuery(
         user_id=user.id,
@@ -1,13 +1,13 @@
 ﻿from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
-from .enums import DataSourceType, StorageType, EntityType, RelationType
+from .ids import Id, new_id
+from .enums import DataSourceType, StorageType, EntityType, RelationType, GraphChangeType
 
 @dataclass
 class RawData:
     """Сырые данные"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     source_type: DataSourceType = DataSourceType.FILE
     content: Any = None
     metadata: Dict[str, Any] = field(default_factory=dict)
@@ -16,8 +16,8 @@ class RawData:
 @dataclass
 class TransformedData:
     """Трансформированные данные"""
-    id: str = field(default_factory=lambda: str(uuid4()))
-    source_id: Optional[str] = None
+    id: Id = field(default_factory=new_id)
+    source_id: Optional[Id] = None
     content: Any = None
     format: str = "JSON"
     storage_type: StorageType = StorageType.DOCUMENT
@@ -26,7 +26,7 @@ class TransformedData:
 @dataclass
 class Entity:
     """Семантическая сущность"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     name: str = ""
     entity_type: EntityType = EntityType.CONCEPT
     confidence: float = 1.0
@@ -35,25 +35,40 @@ class Entity:
 @dataclass
 class Relation:
     """Отношение между сущностями"""
-    id: str = field(default_factory=lambda: str(uuid4()))
-    source_entity_id: str = ""
-    target_entity_id: str = ""
+    id: Id = field(default_factory=new_id)
+    source_entity_id: Id = ""
+    target_entity_id: Id = ""
     relation_type: RelationType = RelationType.RELATED_TO
     strength: float = 1.0
 
 @dataclass
 class KnowledgeGraph:
     """Граф знаний"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     name: str = ""
     entities: List[Entity] = field(default_factory=list)
     relations: List[Relation] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.now)
 
+@dataclass
+class GraphChange:
+    """Запись журнала изменений графа знаний"""
+    id: Id = field(default_factory=new_id)
+    graph_id: Id = ""
+    version: int = 0
+    change_type: GraphChangeType = GraphChangeType.MERGE
+    added_entities: List[Id] = field(default_factory=list)
+    removed_entities: List[Id] = field(default_factory=list)
+    added_relations: List[Id] = field(default_factory=list)
+    removed_relations: List[Id] = field(default_factory=list)
+    # ID входящей сущности -> ID уже существующей, с которой она объединена
+    merged_entities: Dict[Id, Id] = field(default_factory=dict)
+    timestamp: datetime = field(default_factory=datetime.now)
+
 @dataclass
 class Connection:
     """Подключение к источнику"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     source_type: DataSourceType = DataSourceType.SQL
     connection_string: str = ""
     is_active: bool = False
@@ -30,3 +30,17 @@ class RelationType(Enum):
     PART_OF = "PART_OF"
     RELATED_TO = "RELATED_TO"
     LOCATED_IN = "LOCATED_IN"
+
+class JobStatus(Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+class GraphChangeType(Enum):
+    REPLACE = "REPLACE"
+    ADD_ENTITIES = "ADD_ENTITIES"
+    REMOVE_ENTITIES = "REMOVE_ENTITIES"
+    ADD_RELATIONS = "ADD_RELATIONS"
+    REMOVE_RELATIONS = "REMOVE_RELATIONS"
+    MERGE = "MERGE"
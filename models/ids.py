@@ -0,0 +1,204 @@
+"""
+Идентификаторы объектов: компактные 64-битные (по умолчанию) или UUID-строки
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Union
+from uuid import uuid4
+
+ID_SCHEME_ENV = "KMS_ID_SCHEME"
+ID_NODE_ENV = "KMS_ID_NODE"
+# Переменные, при которых ID создают несколько процессов: номер узла нужно задать явно
+MULTI_PROCESS_ENVS = ("KMS_SHARED_STATE_DIR", "KMS_SHARDS", "KMS_SHARD_NODES")
+
+logger = logging.getLogger(__name__)
+
+# Раскладка 64 бит: миллисекунды от эпохи | номер узла (процесса) | счетчик в пределах мс
+_EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+_NODE_BITS = 10
+_SEQUENCE_BITS = 12
+_NODE_MASK = (1 << _NODE_BITS) - 1
+_SEQUENCE_MASK = (1 << _SEQUENCE_BITS) - 1
+_TIME_SHIFT = _NODE_BITS + _SEQUENCE_BITS
+
+# Crockford base32: без I, L, O, U; строка всегда из 13 символов и сортируется как число
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: value for value, char in enumerate(_ALPHABET)}
+_DECODE.update({char.lower(): value for char, value in list(_DECODE.items())})
+_DECODE.update({"I": 1, "i": 1, "L": 1, "l": 1, "O": 0, "o": 0})
+_LENGTH = 13
+
+
+class CompactId(int):
+    """64-битный идентификатор, упорядоченный по времени создания
+
+    В памяти и в снимках - целое число; строкой (Crockford base32)
+    выводится только на границах API: str(), f-строки, шаблоны, JSON
+    (через jsonable: json записал бы число больше 2^53, которое JavaScript округляет).
+    """
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        value = int(self)
+        chars = []
+        for _ in range(_LENGTH):
+            chars.append(_ALPHABET[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+    def __format__(self, spec: str) -> str:
+        return str(self) if not spec else int.__format__(self, spec)
+
+    def __repr__(self) -> str:
+        return f"CompactId('{self}')"
+
+    @property
+    def created_at(self) -> datetime:
+        """Время генерации идентификатора"""
+        return datetime.fromtimestamp(((int(self) >> _TIME_SHIFT) + _EPOCH_MS) / 1000)
+
+    @classmethod
+    def parse(cls, text: str) -> "CompactId":
+        """Разобрать строковое представление"""
+        if len(text) != _LENGTH or _DECODE.get(text[0], 32) > 15:
+            raise ValueError(f"Неверный идентификатор: {text}")
+        value = 0
+        for char in text:
+            digit = _DECODE.get(char)
+            if digit is None:
+                raise ValueError(f"Неверный идентификатор: {text}")
+            value = (value << 5) | digit
+        return cls(value)
+
+
+Id = Union[CompactId, str]
+
+
+def _check_node(node: int) -> int:
+    if not 0 <= node <= _NODE_MASK:
+        raise ValueError(f"Номер узла должен быть от 0 до {_NODE_MASK}: {node}")
+    return node
+
+
+def _random_node(reason: str, warn: bool) -> int:
+    if warn:
+        logger.warning("%s: номер узла ID выбран случайно, ID разных процессов могут совпасть. "
+                       "Задайте уникальный %s или вызовите set_id_node()", reason, ID_NODE_ENV)
+    return secrets.randbits(_NODE_BITS)
+
+
+def _default_node() -> int:
+    """Номер узла из KMS_ID_NODE или случайные биты (с предупреждением в многопроцессном режиме)"""
+    node = os.environ.get(ID_NODE_ENV)
+    if node:
+        return _check_node(int(node))
+    multi_process = any(os.environ.get(name) for name in MULTI_PROCESS_ENVS)
+    return _random_node(f"{ID_NODE_ENV} не задан", warn=multi_process)
+
+
+class CompactIdGenerator:
+    """Монотонный генератор CompactId (потокобезопасный)"""
+
+    def __init__(self, node: Optional[int] = None):
+        self.node = _check_node(node) if node is not None else _default_node()
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def set_node(self, node: int):
+        """Задать номер узла явно"""
+        with self._lock:
+            self.node = _check_node(node)
+
+    def reset_node(self):
+        """После fork: номер узла родителя (в том числе из KMS_ID_NODE) не наследуется"""
+        self._lock = threading.Lock()
+        self.node = _random_node("Процесс создан через fork", warn=True)
+
+    def __call__(self) -> CompactId:
+        with self._lock:
+            now = int(time.time() * 1000) - _EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                # Та же миллисекунда или часы ушли назад: продолжаем счетчик,
+                # при переполнении занимаем следующую миллисекунду
+                self._sequence += 1
+                if self._sequence > _SEQUENCE_MASK:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return CompactId((self._last_ms << _TIME_SHIFT) | (self.node << _SEQUENCE_BITS)
+                             | self._sequence)
+
+
+def _uuid_generator() -> Callable[[], str]:
+    return lambda: str(uuid4())
+
+
+ID_SCHEMES: Dict[str, Callable[[], Callable[[], Any]]] = {
+    "compact": CompactIdGenerator,
+    "uuid": _uuid_generator,
+}
+
+_scheme = ""
+_generator: Optional[Callable[[], Any]] = None
+
+
+def set_id_scheme(name: str):
+    """Выбрать схему идентификаторов для новых объектов"""
+    global _scheme, _generator
+    name = name.lower()
+    if name not in ID_SCHEMES:
+        raise ValueError(f"Неизвестная схема идентификаторов: {name}")
+    _scheme, _generator = name, ID_SCHEMES[name]()
+
+
+def id_scheme() -> str:
+    """Текущая схема идентификаторов"""
+    return _scheme
+
+
+def new_id() -> Id:
+    """Новый идентификатор по текущей схеме (default_factory моделей)"""
+    return _generator()
+
+
+def jsonable(value: Any) -> Any:
+    """Копия значения для json: CompactId (в том числе ключи словарей) - строками"""
+    if isinstance(value, CompactId):
+        return str(value)
+    if isinstance(value, dict):
+        return {str(k) if isinstance(k, CompactId) else k: jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    return value
+
+
+def set_id_node(node: int):
+    """Номер узла текущего процесса (например, в post_fork-хуке gunicorn: worker.age % 1024)"""
+    set_node = getattr(_generator, "set_node", None)
+    if set_node is not None:
+        set_node(node)
+
+
+def parse_id(value: Any) -> Any:
+    """Идентификатор из строки, пришедшей извне; прочие значения - без изменений"""
+    if isinstance(value, CompactId):
+        return value
+    if isinstance(value, str):
+        try:
+            return CompactId.parse(value.strip())
+        except ValueError:
+            return value
+    return value
+
+
+set_id_scheme(os.environ.get(ID_SCHEME_ENV, "compact"))
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: getattr(_generator, "reset_node", lambda: None)())
@@ -1,13 +1,13 @@
 ﻿from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
-from .enums import UserRole
+from .ids import Id, new_id
+from .enums import UserRole, JobStatus
 
 @dataclass
 class User:
     """Пользователь системы"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     username: str = ""
     role: UserRole = UserRole.USER
     preferences: Dict[str, Any] = field(default_factory=dict)
@@ -16,7 +16,7 @@ class User:
 @dataclass
 class UserQuery:
     """Запрос пользователя"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     user_id: str = ""
     text: str = ""
     query_type: str = "SEARCH"
@@ -26,8 +26,8 @@ class UserQuery:
 @dataclass
 class SearchResult:
     """Результат поиска"""
-    id: str = field(default_factory=lambda: str(uuid4()))
-    query_id: str = ""
+    id: Id = field(default_factory=new_id)
+    query_id: Id = ""
     title: str = ""
     snippet: str = ""
     relevance: float = 0.0
@@ -37,9 +37,24 @@ class SearchResult:
 @dataclass
 class Report:
     """Аналитический отчет"""
-    id: str = field(default_factory=lambda: str(uuid4()))
+    id: Id = field(default_factory=new_id)
     title: str = ""
     content: Any = None
     format: str = "PDF"
     created_by: str = ""
     created_at: datetime = field(default_factory=datetime.now)
+
+@dataclass
+class ReportJob:
+    """Задание на фоновое формирование отчета"""
+    id: Id = field(default_factory=new_id)
+    title: str = ""
+    report_type: str = "SUMMARY"
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    created_by: str = ""
+    status: JobStatus = JobStatus.PENDING
+    progress: float = 0.0
+    error: Optional[str] = None
+    report: Optional[Report] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
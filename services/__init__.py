@@ -1,3 +1,57 @@
-from .data_service import *
-from .analysis_service import *
-from .ui_service import *
+"""
+Сервисы системы; модули загружаются при первом обращении к имени
+"""
+import importlib
+
+_EXPORTS = {
+    "DataExtractor": "data_service",
+    "DataTransformer": "data_service",
+    "DataLoader": "data_service",
+    "ETLService": "data_service",
+    "StorageService": "data_service",
+    "NLPService": "analysis_service",
+    "KnowledgeBuilder": "analysis_service",
+    "HypothesisGenerator": "analysis_service",
+    "SearchService": "ui_service",
+    "ReportService": "ui_service",
+    "ChatbotService": "ui_service",
+    "MetricsRegistry": "metrics_service",
+    "MetricsSink": "metrics_service",
+    "LoggingSink": "metrics_service",
+    "metrics": "metrics_service",
+    "instrumented": "metrics_service",
+    "configure_logging": "metrics_service",
+    "ProfilingService": "profiling_service",
+    "ProfileRecord": "profiling_service",
+    "AggregateStore": "aggregate_service",
+    "GraphIndex": "graph_index_service",
+    "TraversalResult": "graph_query_service",
+    "LexiconSentimentScorer": "sentiment_service",
+    "TextChunk": "chunking_service",
+    "iter_text_chunks": "chunking_service",
+    "iter_file_chunks": "chunking_service",
+    "LRUCache": "cache_service",
+    "DiskCache": "cache_service",
+    "NLPResultCache": "cache_service",
+    "ShardedStorageService": "shard_service",
+    "SharedStateWriter": "shared_state_service",
+    "SharedStorageService": "shared_state_service",
+    "ReportJobService": "report_job_service",
+    "ServiceContainer": "service_container",
+    "LazyService": "service_container",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
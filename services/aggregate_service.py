@@ -0,0 +1,204 @@
+"""
+Материализованные агрегаты хранилища, обновляемые при каждой записи
+"""
+import threading
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional
+
+from models.data_models import KnowledgeGraph, TransformedData
+
+
+# Поля метаданных документа с временем его создания (по ним документ относится к дню)
+DOCUMENT_TIME_KEYS = ("transformed_at", "saved_at")
+# Поля by_graph, которые отдаются наружу; остальные - счетчики для вычитания графа
+SUMMARY_FIELDS = ("name", "entities", "relations", "created_at")
+
+
+def _day(value: Optional[datetime]) -> str:
+    return (value or datetime.now()).date().isoformat()
+
+
+def document_day(doc: TransformedData) -> str:
+    """День документа: время создания из метаданных, как created_at у графа"""
+    for key in DOCUMENT_TIME_KEYS:
+        value = doc.metadata.get(key)
+        if isinstance(value, datetime):
+            return _day(value)
+        if isinstance(value, str):
+            try:
+                return _day(datetime.fromisoformat(value))
+            except ValueError:
+                pass
+    return _day(None)
+
+
+class AggregateStore:
+    """Счетчики по типам сущностей и отношений, графам, источникам и дням"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Сбросить все счетчики"""
+        self.totals_counter: Counter = Counter()
+        self.entities_by_type: Counter = Counter()
+        self.relations_by_type: Counter = Counter()
+        self.documents_by_source: Counter = Counter()
+        self.by_day: Dict[str, Counter] = {}
+        self.by_graph: Dict[str, Dict[str, Any]] = {}
+        self._document_keys: Dict[str, tuple] = {}
+
+    # ---------- Обновление ----------
+
+    def add_graph(self, graph: KnowledgeGraph):
+        """Учесть граф (повторное сохранение по тому же ID заменяет прежний)
+
+        В by_graph хранятся счетчики графа по типам: прежнее состояние вычитается
+        по ним, даже если объект графа успел измениться на месте.
+        """
+        summary = {
+            "name": graph.name,
+            "entities": len(graph.entities),
+            "relations": len(graph.relations),
+            "created_at": graph.created_at.isoformat(),
+            "day": _day(graph.created_at),
+            "entity_types": Counter(e.entity_type.value for e in graph.entities),
+            "relation_types": Counter(r.relation_type.value for r in graph.relations),
+        }
+        with self._lock:
+            previous = self.by_graph.get(graph.id)
+            if previous is not None:
+                self._count_graph(previous, -1)
+            self.by_graph[graph.id] = summary
+            self._count_graph(summary, 1)
+
+    def remove_graph(self, graph_id: str):
+        """Вычесть граф, который удаляется"""
+        with self._lock:
+            previous = self.by_graph.pop(graph_id, None)
+            if previous is not None:
+                self._count_graph(previous, -1)
+
+    def _count_graph(self, summary: Dict[str, Any], sign: int):
+        self._bump(self.totals_counter, "graphs", sign)
+        self._bump(self.totals_counter, "entities", sign * summary["entities"])
+        self._bump(self.totals_counter, "relations", sign * summary["relations"])
+        for key, count in summary["entity_types"].items():
+            self._bump(self.entities_by_type, key, sign * count)
+        for key, count in summary["relation_types"].items():
+            self._bump(self.relations_by_type, key, sign * count)
+
+        day_counter = self.by_day.setdefault(summary["day"], Counter())
+        self._bump(day_counter, "graphs", sign)
+        self._bump(day_counter, "entities", sign * summary["entities"])
+        if not day_counter:
+            del self.by_day[summary["day"]]
+
+    def apply_graph_delta(self, graph: KnowledgeGraph, entity_types: Counter,
+                          relation_types: Counter):
+        """Учесть точечное изменение графа: знаковые приращения по типам"""
+        entities = sum(entity_types.values())
+        relations = sum(relation_types.values())
+
+        with self._lock:
+            summary = self.by_graph.get(graph.id)
+            if summary is None:
+                return
+            self._bump(self.totals_counter, "entities", entities)
+            self._bump(self.totals_counter, "relations", relations)
+            for key, count in entity_types.items():
+                self._bump(self.entities_by_type, key, count)
+            for key, count in relation_types.items():
+                self._bump(self.relations_by_type, key, count)
+
+            day_counter = self.by_day.setdefault(summary["day"], Counter())
+            self._bump(day_counter, "entities", entities)
+            if not day_counter:
+                del self.by_day[summary["day"]]
+
+            summary["entities"] += entities
+            summary["relations"] += relations
+            summary["entity_types"].update(entity_types)
+            summary["relation_types"].update(relation_types)
+
+    def add_document(self, doc: TransformedData):
+        """Учесть документ (повторное сохранение по тому же ID заменяет прежний)"""
+        key = (str(doc.metadata.get("source", "unknown")), document_day(doc))
+        with self._lock:
+            previous = self._document_keys.get(doc.id)
+            if previous is not None:
+                self._count_document(previous, -1)
+            self._document_keys[doc.id] = key
+            self._count_document(key, 1)
+
+    def _count_document(self, key: tuple, sign: int):
+        source, day = key
+        self._bump(self.totals_counter, "documents", sign)
+        self._bump(self.documents_by_source, source, sign)
+        day_counter = self.by_day.setdefault(day, Counter())
+        self._bump(day_counter, "documents", sign)
+        if not day_counter:
+            del self.by_day[day]
+
+    @staticmethod
+    def _bump(counter: Counter, key: str, delta: int):
+        value = counter[key] + delta
+        if value:
+            counter[key] = value
+        else:
+            del counter[key]
+
+    # ---------- Запросы (O(1) относительно объема данных) ----------
+
+    def totals(self) -> Dict[str, int]:
+        """Общее число графов, сущностей, отношений и документов"""
+        with self._lock:
+            return {key: self.totals_counter.get(key, 0)
+                    for key in ("graphs", "entities", "relations", "documents")}
+
+    def count(self, name: str) -> int:
+        """Одно значение из итогов"""
+        return self.totals_counter.get(name, 0)
+
+    def graph_summary(self, graph_id: str) -> Optional[Dict[str, Any]]:
+        """Показатели одного графа"""
+        with self._lock:
+            summary = self.by_graph.get(graph_id)
+            return self._public(summary) if summary is not None else None
+
+    def day_summary(self, day: date) -> Dict[str, int]:
+        """Загрузки за день"""
+        return dict(self.by_day.get(day.isoformat(), {}))
+
+    def snapshot(self, include_graphs: bool = True) -> Dict[str, Any]:
+        """Все агрегаты одним словарем (by_graph растет с числом графов)"""
+        with self._lock:
+            return {
+                "totals": dict(self.totals_counter),
+                "entities_by_type": dict(self.entities_by_type),
+                "relations_by_type": dict(self.relations_by_type),
+                "documents_by_source": dict(self.documents_by_source),
+                "by_day": {day: dict(counter) for day, counter in self.by_day.items()},
+                "by_graph": ({gid: self._public(summary) for gid, summary in self.by_graph.items()}
+                             if include_graphs else {}),
+            }
+
+    @staticmethod
+    def _public(summary: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: summary[key] for key in SUMMARY_FIELDS}
+
+    @classmethod
+    def merged(cls, snapshots: Iterable[Dict[str, Any]]) -> "AggregateStore":
+        """Объединить агрегаты нескольких хранилищ (например, шардов)"""
+        store = cls()
+        for part in snapshots:
+            store.totals_counter.update(part["totals"])
+            store.entities_by_type.update(part["entities_by_type"])
+            store.relations_by_type.update(part["relations_by_type"])
+            store.documents_by_source.update(part["documents_by_source"])
+            for day, counts in part["by_day"].items():
+                store.by_day.setdefault(day, Counter()).update(counts)
+            store.by_graph.update(part["by_graph"])
+        return store
@@ -1,21 +1,76 @@
-﻿import re
-from typing import List, Dict, Any, Tuple
-from models.data_models import Entity, Relation, KnowledgeGraph
+﻿import hashlib
+import logging
+import re
+from collections import deque
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from models.data_models import Entity, Relation, KnowledgeGraph, GraphChange
 from models.enums import EntityType, RelationType
+from services.cache_service import NLPResultCache
+from services.chunking_service import TextChunk
+from services.sentiment_service import DEFAULT_LEXICON, LexiconSentimentScorer
+from services.metrics_service import instrumented, metrics
+
+logger = logging.getLogger(__name__)
+
+# Версия формата записей кэша сущностей (входит в отпечаток)
+ENTITY_CACHE_FORMAT = 2
 
 class NLPService:
     """Обработка естественного языка"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[NLPResultCache] = None, use_cache: bool = True):
         self.entity_patterns = {
             EntityType.PERSON: r'\b([А-Я][а-я]+ [А-Я][а-я]+)\b',
             EntityType.ORGANIZATION: r'\b(ООО|АО|ЗАО|ИП)\s+[«"][^«"]+[»"]',
             EntityType.LOCATION: r'\b(г\.|гор\.|город)\s+[А-Я][а-я]+\b',
             EntityType.DATE: r'\b(\d{1,2}\.\d{1,2}\.\d{4}|\d{4}\s+год)\b'
         }
+        self.concept_keywords = ['проект', 'риск', 'отчет', 'анализ', 'данные']
+        # Слово -> вес тональности (отрицательный вес - негативное слово)
+        self.sentiment_lexicon: Dict[str, float] = dict(DEFAULT_LEXICON)
+        self._sentiment_scorer: Optional[LexiconSentimentScorer] = None
+        self._sentiment_scorer_fingerprint = ""
+        
+        # Результаты по хэшу текста; ключ включает отпечаток шаблонов,
+        # поэтому изменение entity_patterns делает старые записи недостижимыми
+        self.cache = (cache or NLPResultCache.from_env()) if use_cache else None
+        self._fingerprints: Dict[str, Tuple[str, str]] = {}
     
+    def _fingerprint(self, kind: str, *parts: Any) -> str:
+        """Отпечаток настроек, от которых зависит результат"""
+        state = repr(parts)
+        cached = self._fingerprints.get(kind)
+        if cached is None or cached[0] != state:
+            cached = (state, hashlib.sha1(state.encode("utf-8")).hexdigest()[:16])
+            self._fingerprints[kind] = cached
+        return cached[1]
+    
+    @instrumented()
     def extract_entities(self, text: str) -> List[Entity]:
         """Извлечь сущности из текста"""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key("entities", self._entities_fingerprint(), text)
+            cached = self.cache.get(key, "entities")
+            if cached is not None:
+                entities = [Entity(name=name, entity_type=EntityType(entity_type),
+                                   confidence=confidence, properties=dict(properties))
+                            for name, entity_type, confidence, properties in cached]
+                logger.debug("Сущности взяты из кэша: %d", len(entities))
+                return entities
+        
+        entities = self._extract_entities(text)
+        if key is not None:
+            # Копия свойств: изменения возвращенных сущностей не должны попасть в кэш
+            self.cache.put(key, [[e.name, e.entity_type.value, e.confidence, dict(e.properties)]
+                                 for e in entities])
+        return entities
+    
+    def _entities_fingerprint(self) -> str:
+        return self._fingerprint("entities", ENTITY_CACHE_FORMAT, self.entity_patterns,
+                                 self.concept_keywords)
+    
+    def _extract_entities(self, text: str) -> List[Entity]:
         entities = []
         
         for entity_type, pattern in self.entity_patterns.items():
@@ -29,8 +84,7 @@ class NLPService:
                 entities.append(entity)
         
         # Извлечение концептов по ключевым словам
-        concept_keywords = ['проект', 'риск', 'отчет', 'анализ', 'данные']
-        for keyword in concept_keywords:
+        for keyword in self.concept_keywords:
             if keyword.lower() in text.lower():
                 entity = Entity(
                     name=keyword.capitalize(),
@@ -39,23 +93,132 @@ class NLPService:
                 )
                 entities.append(entity)
         
-        print(f"Извлечено {len(entities)} сущностей")
+        metrics.inc("kms_nlp_entities_total", len(entities))
+        logger.info("Извлечено %d сущностей", len(entities))
         return entities
     
+    def extract_entities_stream(self, chunks: Iterable[TextChunk]) -> Iterator[Entity]:
+        """Извлекать сущности из потока фрагментов большого документа
+        
+        Совпадение принадлежит фрагменту, в собственной части которого оно начинается;
+        поиск продолжается с конца предыдущего совпадения, как при сквозном проходе.
+        Позиции сущностей (в символах документа) - в properties["start"/"end"].
+        Результат разбора фрагмента кэшируется, поэтому повторная загрузка
+        неизменного документа не выполняет поиск заново.
+        """
+        patterns = {entity_type: re.compile(pattern, re.IGNORECASE)
+                    for entity_type, pattern in self.entity_patterns.items()}
+        resume = dict.fromkeys(patterns, 0)
+        keywords = {keyword.lower(): keyword for keyword in self.concept_keywords}
+        all_keywords = list(keywords)
+        fingerprint = self._entities_fingerprint() if self.cache is not None else ""
+        total = 0
+        
+        for chunk in chunks:
+            found = []
+            positions = [max(chunk.start, resume[entity_type] - chunk.offset)
+                         for entity_type in patterns]
+            scan = self._scan_chunk_cached(patterns, all_keywords, chunk, positions, fingerprint)
+            for entity_type, spans in zip(patterns, scan["matches"]):
+                for start, end in spans:
+                    resume[entity_type] = chunk.offset + end
+                    found.append(Entity(
+                        name=chunk.text[start:end],
+                        entity_type=entity_type,
+                        confidence=0.9,
+                        properties={"start": chunk.offset + start, "end": chunk.offset + end}
+                    ))
+            
+            # Концепт - один раз на документ, по первому вхождению
+            if keywords:
+                for lowered_keyword in list(keywords):
+                    index = scan["keywords"][lowered_keyword]
+                    if index == -1 or (index >= chunk.end and not chunk.is_last):
+                        continue
+                    keyword = keywords.pop(lowered_keyword)
+                    found.append(Entity(
+                        name=keyword.capitalize(),
+                        entity_type=EntityType.CONCEPT,
+                        confidence=0.7,
+                        properties={"start": chunk.offset + index,
+                                    "end": chunk.offset + index + len(keyword)}
+                    ))
+            
+            found.sort(key=lambda e: e.properties["start"])
+            total += len(found)
+            yield from found
+        
+        metrics.inc("kms_nlp_entities_total", total)
+        logger.info("Извлечено %d сущностей (потоково)", total)
+    
+    def _scan_chunk_cached(self, patterns, keywords: List[str], chunk: TextChunk,
+                           positions: List[int], fingerprint: str) -> Dict[str, Any]:
+        if self.cache is None:
+            return self._scan_chunk(patterns, keywords, chunk, positions)
+        # Результат зависит от фрагмента и от позиций продолжения поиска в нем
+        key = self.cache.make_key(
+            "chunk", fingerprint,
+            f"{chunk.start}:{chunk.end}:{int(chunk.is_last)}:{positions}\n{chunk.text}")
+        scan = self.cache.get(key, "chunk")
+        if scan is None:
+            scan = self._scan_chunk(patterns, keywords, chunk, positions)
+            self.cache.put(key, scan)
+        return scan
+    
+    def _scan_chunk(self, patterns, keywords: List[str], chunk: TextChunk,
+                    positions: List[int]) -> Dict[str, Any]:
+        """Совпадения шаблонов и первые вхождения ключевых слов (позиции внутри фрагмента)"""
+        matches = []
+        for regex, pos in zip(patterns.values(), positions):
+            spans = []
+            for match in regex.finditer(chunk.text, pos):
+                if match.start() >= chunk.end and not chunk.is_last:
+                    break
+                spans.append([match.start(), match.end()])
+            matches.append(spans)
+        lowered = chunk.text.lower()
+        return {"matches": matches,
+                "keywords": {keyword: lowered.find(keyword, chunk.start) for keyword in keywords}}
+    
+    def _scorer(self) -> Tuple[LexiconSentimentScorer, str]:
+        """Оценщик тональности, пересобираемый при изменении словаря"""
+        fingerprint = self._fingerprint("sentiment", self.sentiment_lexicon)
+        if self._sentiment_scorer is None or self._sentiment_scorer_fingerprint != fingerprint:
+            self._sentiment_scorer = LexiconSentimentScorer(self.sentiment_lexicon)
+            self._sentiment_scorer_fingerprint = fingerprint
+        return self._sentiment_scorer, fingerprint
+    
+    @instrumented()
     def analyze_sentiment(self, text: str) -> float:
         """Проанализировать тональность текста"""
-        positive_words = ['успех', 'хорошо', 'отлично', 'рекомендую', 'эффективный']
-        negative_words = ['проблема', 'риск', 'плохо', 'ошибка', 'негативный']
+        return self._analyze_sentiment_batch([text])[0]
+    
+    @instrumented()
+    def analyze_sentiment_batch(self, texts: List[str]) -> List[float]:
+        """Тональность множества текстов одним пакетным расчетом"""
+        return self._analyze_sentiment_batch(texts)
+    
+    def _analyze_sentiment_batch(self, texts: List[str]) -> List[float]:
+        # Без декоратора: вызов учитывается один раз, в публичном методе
+        scorer, fingerprint = self._scorer()
+        scores: List[Optional[float]] = [None] * len(texts)
+        keys: List[Optional[str]] = [None] * len(texts)
         
-        text_lower = text.lower()
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                keys[i] = self.cache.make_key("sentiment", fingerprint, text)
+                scores[i] = self.cache.get(keys[i], "sentiment")
         
-        total = positive_count + negative_count
-        if total == 0:
-            return 0.5  # Нейтральная
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            computed = scorer.score_batch([texts[i] for i in missing])
+            for i, score in zip(missing, computed):
+                scores[i] = score
+                if self.cache is not None:
+                    self.cache.put(keys[i], score)
         
-        return positive_count / total
+        metrics.inc("kms_sentiment_texts_total", len(texts))
+        return scores
 
 class KnowledgeBuilder:
     """Построитель знаний"""
@@ -63,6 +226,7 @@ class KnowledgeBuilder:
     def __init__(self):
         self.relations: List[Relation] = []
     
+    @instrumented()
     def build_relations(self, entities: List[Entity], text: str) -> List[Relation]:
         """Построить отношения между сущностями"""
         relations = []
@@ -80,9 +244,66 @@ class KnowledgeBuilder:
                         )
                         relations.append(relation)
         
-        print(f"Построено {len(relations)} отношений")
+        metrics.inc("kms_relations_built_total", len(relations))
+        logger.info("Построено %d отношений", len(relations))
         return relations
     
+    def build_relations_stream(self, entities: Iterable[Entity],
+                               window: int = 1000) -> Iterator[Relation]:
+        """Строить отношения по мере поступления сущностей
+        
+        Связываются сущности, начала которых отстоят не более чем на window
+        символов; сущности должны идти по возрастанию properties["start"].
+        В памяти - только сущности текущего окна.
+        """
+        recent: deque = deque()
+        total = 0
+        for entity in entities:
+            start = entity.properties.get("start", 0)
+            while recent and recent[0][0] < start - window:
+                recent.popleft()
+            for _, other in recent:
+                if other.name == entity.name and other.entity_type == entity.entity_type:
+                    continue
+                for source, target in ((other, entity), (entity, other)):
+                    yield Relation(
+                        source_entity_id=source.id,
+                        target_entity_id=target.id,
+                        relation_type=RelationType.RELATED_TO,
+                        strength=0.8
+                    )
+                    total += 1
+            recent.append((start, entity))
+        
+        metrics.inc("kms_relations_built_total", total)
+        logger.info("Построено %d отношений (потоково)", total)
+    
+    @instrumented()
+    def create_knowledge_graph_stream(self, name: str, nlp_service: NLPService,
+                                      chunks: Iterable[TextChunk],
+                                      window: int = 1000) -> KnowledgeGraph:
+        """Граф знаний большого документа без загрузки текста целиком"""
+        entities: List[Entity] = []
+        relations: List[Relation] = []
+        
+        def collect(stream: Iterable[Entity]) -> Iterator[Entity]:
+            for entity in stream:
+                entities.append(entity)
+                yield entity
+        
+        relations.extend(self.build_relations_stream(
+            collect(nlp_service.extract_entities_stream(chunks)), window))
+        return self.create_knowledge_graph(name, entities, relations)
+    
+    @instrumented()
+    def merge_into_graph(self, storage_service, graph_id: str, nlp_service: NLPService,
+                         text: str) -> GraphChange:
+        """Дополнить сохраненный граф сущностями и отношениями нового документа"""
+        entities = nlp_service.extract_entities(text)
+        relations = self.build_relations(entities, text)
+        return storage_service.merge_graph(graph_id, entities, relations)
+    
+    @instrumented()
     def create_knowledge_graph(self, name: str, 
                               entities: List[Entity], 
                               relations: List[Relation]) -> KnowledgeGraph:
@@ -93,12 +314,13 @@ class KnowledgeBuilder:
             relations=relations
         )
         
-        print(f"Создан граф знаний: {name}")
+        logger.info("Создан граф знаний: %s", name)
         return graph
 
 class HypothesisGenerator:
     """Генератор гипотез"""
     
+    @instrumented()
     def generate_hypotheses(self, graph: KnowledgeGraph) -> List[str]:
         """Сгенерировать гипотезы на основе графа знаний"""
         hypotheses = []
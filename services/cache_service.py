@@ -0,0 +1,164 @@
+"""
+Кэширование результатов по хэшу содержимого: LRU в памяти и общий дисковый уровень
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+NLP_CACHE_SIZE_ENV = "KMS_NLP_CACHE_SIZE"
+NLP_CACHE_PATH_ENV = "KMS_NLP_CACHE_PATH"
+
+_MISSING = object()
+
+
+def content_hash(text: str) -> str:
+    """Хэш содержимого текста"""
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш с вытеснением давно не использованных записей"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """Кэш в SQLite-файле, общий для нескольких процессов"""
+
+    def __init__(self, path: str, max_entries: int = 200000, prune_every: int = 1000):
+        import sqlite3
+
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                # Время обращения обновляется при попадании: вытесняются давно не читанные
+                self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?",
+                                   (time.time(), key))
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)",
+                (key, payload, time.time()))
+            self._puts += 1
+            if self._puts % self.prune_every == 0:
+                self._prune()
+
+    def _prune(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NLPResultCache:
+    """Кэш результатов NLP: память + необязательный диск, ключ - хэш текста"""
+
+    def __init__(self, max_size: int = 10000, disk_path: Optional[str] = None):
+        self.memory = LRUCache(max_size)
+        self.disk = DiskCache(disk_path) if disk_path else None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["NLPResultCache"]:
+        """Кэш по настройкам окружения; размер 0 отключает кэширование"""
+        max_size = int(os.environ.get(NLP_CACHE_SIZE_ENV, "10000"))
+        if max_size <= 0:
+            return None
+        return cls(max_size=max_size, disk_path=os.environ.get(NLP_CACHE_PATH_ENV) or None)
+
+    @staticmethod
+    def make_key(kind: str, fingerprint: str, text: str) -> str:
+        return f"{kind}:{fingerprint}:{content_hash(text)}"
+
+    def get(self, key: str, kind: str) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.put(key, value)
+        if value is _MISSING:
+            self.misses += 1
+            metrics.inc("kms_nlp_cache_misses_total", labels={"kind": kind})
+            return None
+        self.hits += 1
+        metrics.inc("kms_nlp_cache_hits_total", labels={"kind": kind})
+        return value
+
+    def put(self, key: str, value: Any):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self.memory)}
@@ -0,0 +1,94 @@
+"""
+Потоковое чтение больших текстов перекрывающимися фрагментами
+"""
+import mmap
+import os
+from dataclasses import dataclass
+from typing import Iterator
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # символов (байтов для файлов)
+DEFAULT_OVERLAP = 512         # должен превышать длину самой длинной сущности
+
+
+@dataclass
+class TextChunk:
+    """Фрагмент текста с контекстом слева и справа"""
+    offset: int      # глобальная позиция text[0] в документе (в символах)
+    text: str        # контекст слева + собственная часть + контекст справа
+    start: int       # начало собственной части внутри text
+    end: int         # конец собственной части внутри text
+    is_last: bool = False
+
+    @property
+    def core(self) -> str:
+        """Собственная часть фрагмента (без перекрытий)"""
+        return self.text[self.start:self.end]
+
+
+def iter_text_chunks(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     overlap: int = DEFAULT_OVERLAP) -> Iterator[TextChunk]:
+    """Разбить строку на фрагменты с перекрытием"""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size должен быть положительным")
+    length = len(text)
+    core_start = 0
+    while True:
+        core_end = min(core_start + chunk_size, length)
+        left = max(0, core_start - overlap)
+        right = min(length, core_end + overlap)
+        yield TextChunk(
+            offset=left,
+            text=text[left:right],
+            start=core_start - left,
+            end=core_end - left,
+            is_last=core_end >= length
+        )
+        if core_end >= length:
+            return
+        core_start = core_end
+
+
+def _char_boundary(data, pos: int) -> int:
+    """Сдвинуть позицию назад к началу символа UTF-8"""
+    while 0 < pos < len(data) and (data[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def iter_file_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     overlap: int = DEFAULT_OVERLAP) -> Iterator[TextChunk]:
+    """Читать UTF-8 файл через mmap фрагментами; в памяти только текущий фрагмент"""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size должен быть положительным")
+    if os.path.getsize(path) == 0:
+        yield TextChunk(offset=0, text="", start=0, end=0, is_last=True)
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        core_start = 0
+        chars_before = 0  # символов до начала собственной части
+        while True:
+            core_end = size if core_start + chunk_size >= size else \
+                _char_boundary(data, core_start + chunk_size)
+            if core_end <= core_start:  # фрагмент меньше одного символа
+                core_end = _char_boundary(data, min(size, core_start + chunk_size + 4))
+            left = _char_boundary(data, max(0, core_start - overlap))
+            right = size if core_end + overlap >= size else _char_boundary(data, core_end + overlap)
+
+            left_text = data[left:core_start].decode("utf-8", errors="replace")
+            core_text = data[core_start:core_end].decode("utf-8", errors="replace")
+            right_text = data[core_end:right].decode("utf-8", errors="replace")
+            is_last = core_end >= size
+
+            yield TextChunk(
+                offset=chars_before - len(left_text),
+                text=left_text + core_text + right_text,
+                start=len(left_text),
+                end=len(left_text) + len(core_text),
+                is_last=is_last
+            )
+            if is_last:
+                return
+            chars_before += len(core_text)
+            core_start = core_end
@@ -1,16 +1,114 @@
-﻿from datetime import datetime
-from typing import List, Dict, Any, Optional
-from models.data_models import RawData, TransformedData, Entity, Relation, KnowledgeGraph, Connection
-from models.enums import DataSourceType, StorageType, EntityType, RelationType
+﻿import functools
+import logging
+import threading
+from bisect import bisect_right, insort
+from collections import Counter, deque
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Deque, Iterable, Iterator, Optional, Tuple
+from models.data_models import RawData, TransformedData, Entity, Relation, KnowledgeGraph, Connection, GraphChange
+from models.enums import DataSourceType, StorageType, EntityType, RelationType, GraphChangeType
+from services.metrics_service import instrumented, metrics
+from services.aggregate_service import DOCUMENT_TIME_KEYS, AggregateStore
+from services.chunking_service import DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, TextChunk, iter_file_chunks
+from services.graph_index_service import GraphIndex
+from services.graph_query_service import TraversalResult, neighborhood as query_neighborhood, \
+    shortest_path as query_shortest_path
+
+logger = logging.getLogger(__name__)
+
+GraphKey = Tuple[datetime, str]
+
+def graph_order(graph: KnowledgeGraph) -> GraphKey:
+    """Порядок графов в постраничной выдаче: по времени создания, затем по ID"""
+    return graph.created_at, str(graph.id)
+
+def summary_order(summary: Dict[str, Any]) -> GraphKey:
+    """Ключ graph_order для показателей графа (graph_summary)"""
+    return summary["created_at"], str(summary["id"])
+
+def graph_cursor(key: GraphKey) -> str:
+    """Курсор страницы графов для URL"""
+    return f"{key[0].isoformat()}|{key[1]}"
+
+def parse_graph_cursor(text: str) -> Optional[GraphKey]:
+    """Ключ graph_order из курсора; неверный курсор - с начала"""
+    created_at, _, graph_id = (text or "").partition("|")
+    try:
+        return datetime.fromisoformat(created_at), graph_id
+    except ValueError:
+        return None
+
+def document_order(doc: TransformedData) -> str:
+    """Порядок документов в постраничной выдаче"""
+    return str(doc.id)
+
+def graph_summary(graph: KnowledgeGraph) -> Dict[str, Any]:
+    """Показатели графа без списков сущностей и отношений"""
+    return {
+        "id": graph.id,
+        "name": graph.name,
+        "entities": len(graph.entities),
+        "relations": len(graph.relations),
+        "created_at": graph.created_at
+    }
+
+class KeysetIndex:
+    """Отсортированные ключи элементов для выдачи страниц после ключа (keyset)
+
+    Страница стоит O(log n + limit) и не зависит от ее номера; добавление
+    элементов между запросами страниц не сдвигает следующие страницы.
+    """
+    
+    def __init__(self, key: Callable[[Any], Any]):
+        self.key = key
+        self._keys: List[Any] = []
+        self._key_of: Dict[Any, Any] = {}
+        self._ids: Dict[Any, Any] = {}
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def add(self, item_id: Any, item: Any):
+        key = self.key(item)
+        previous = self._key_of.get(item_id)
+        if previous == key:
+            return
+        if previous is not None:
+            del self._keys[bisect_right(self._keys, previous) - 1]
+            del self._ids[previous]
+        insort(self._keys, key)
+        self._key_of[item_id] = key
+        self._ids[key] = item_id
+    
+    def rebuild(self, items: Dict[Any, Any]):
+        self._key_of = {item_id: self.key(item) for item_id, item in items.items()}
+        self._ids = {key: item_id for item_id, key in self._key_of.items()}
+        self._keys = sorted(self._ids)
+    
+    def page(self, after: Any = None, limit: int = 20) -> List[Any]:
+        """ID элементов с ключом больше after (с начала, если after=None)"""
+        start = 0 if after is None else bisect_right(self._keys, after)
+        return [self._ids[key] for key in self._keys[start:start + limit]]
+
+def synchronized(method):
+    """Выполнять метод под блокировкой объекта (self._lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class DataExtractor:
     """Извлекает данные из источников"""
     
     def __init__(self, connection: Connection):
         self.connection = connection
     
+    @instrumented()
     def extract(self) -> List[RawData]:
         """Извлечь данные из источника"""
-        print(f"Извлечение данных из {self.connection.source_type.value}")
+        logger.info("Извлечение данных из %s", self.connection.source_type.value)
         
         # Имитация извлечения данных
         data = RawData(
@@ -21,6 +119,15 @@ class DataExtractor:
         
         return [data]
     
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    overlap: int = DEFAULT_OVERLAP) -> Iterator[TextChunk]:
+        """Читать файловый источник фрагментами (путь - в connection_string)"""
+        if self.connection.source_type != DataSourceType.FILE:
+            raise ValueError(f"Потоковое чтение поддерживается только для FILE, "
+                             f"а не {self.connection.source_type.value}")
+        logger.info("Потоковое чтение %s", self.connection.connection_string)
+        return iter_file_chunks(self.connection.connection_string, chunk_size, overlap)
+    
     def test_connection(self) -> bool:
         """Проверить подключение"""
         try:
@@ -37,9 +144,10 @@ class DataTransformer:
     def __init__(self):
         self.rules: List[str] = []
     
+    @instrumented()
     def transform(self, raw_data: RawData) -> TransformedData:
         """Трансформировать сырые данные"""
-        print(f"Трансформация данных {raw_data.id}")
+        logger.debug("Трансформация данных %s", raw_data.id)
         
         # Простая трансформация
         transformed = TransformedData(
@@ -66,9 +174,10 @@ class DataLoader:
         self.storage_type = storage_type
         self.data_store: Dict[str, Any] = {}
     
+    @instrumented()
     def load(self, data: TransformedData) -> bool:
         """Загрузить данные"""
-        print(f"Загрузка данных {data.id} в {self.storage_type.value}")
+        logger.debug("Загрузка данных %s в %s", data.id, self.storage_type.value)
         
         # Имитация загрузки
         self.data_store[data.id] = data
@@ -81,24 +190,37 @@ class DataLoader:
 class ETLService:
     """Оркестратор ETL-процессов"""
     
-    def __init__(self):
+    def __init__(self, profiler=None, storage_service=None):
         self.extractors: List[DataExtractor] = []
         self.transformer = DataTransformer()
         self.loaders: Dict[StorageType, DataLoader] = {}
+        self.profiler = profiler
+        # Хранилище, в которое дублируются загруженные документы (обновляет агрегаты)
+        self.storage_service = storage_service
+        self.last_profile_id: Optional[str] = None
     
     def add_source(self, connection: Connection):
         """Добавить источник данных"""
         extractor = DataExtractor(connection)
         self.extractors.append(extractor)
-        print(f"Добавлен источник: {connection.connection_string}")
+        logger.info("Добавлен источник: %s", connection.connection_string)
     
     def add_loader(self, storage_type: StorageType):
         """Добавить загрузчик"""
         loader = DataLoader(storage_type)
         self.loaders[storage_type] = loader
     
-    def run_etl(self) -> Dict[str, Any]:
-        """Запустить ETL-процесс"""
+    @instrumented()
+    def run_etl(self, profile: bool = False) -> Dict[str, Any]:
+        """Запустить ETL-процесс (profile=True - с профилированием)"""
+        if self.profiler is None or not self.profiler.should_profile(profile):
+            return self._run_etl()
+        
+        with self.profiler.profile("ETLService.run_etl") as session:
+            self.last_profile_id = session.profile_id
+            return self._run_etl()
+    
+    def _run_etl(self) -> Dict[str, Any]:
         results = {
             "extracted": 0,
             "transformed": 0,
@@ -129,13 +251,18 @@ class ETLService:
                     success = self.loaders[storage_type].load(data)
                     if success:
                         results["loaded"] += 1
+                        if self.storage_service is not None:
+                            self.storage_service.save_document(data)
             
-            print(f"ETL завершен: {results}")
+            for stage in ("extracted", "transformed", "loaded"):
+                metrics.inc("kms_etl_records_total", results[stage], {"stage": stage})
+            logger.info("ETL завершен: %s", results)
             return results
             
         except Exception as e:
             results["errors"].append(str(e))
-            print(f"Ошибка ETL: {e}")
+            metrics.inc("kms_etl_errors_total")
+            logger.error("Ошибка ETL: %s", e)
             return results
 
 class StorageService:
@@ -144,17 +271,236 @@ class StorageService:
     def __init__(self):
         self.graphs: Dict[str, KnowledgeGraph] = {}
         self.documents: Dict[str, TransformedData] = {}
+        # Готовые поисковые индексы (bytes/array), сохраняемые в снимок
+        self.indexes: Dict[str, Any] = {}
+        # Читатель снимка, пока индексы ссылаются на его mmap
+        self._snapshot_reader = None
+        # Счетчики для дашборда и отчетов, обновляемые при каждой записи
+        self.aggregates = AggregateStore()
+        # Индексы графов для точечных изменений (строятся при первом изменении графа)
+        self._graph_indexes: Dict[str, GraphIndex] = {}
+        # Журнал изменений каждого графа: последние change_log_size записей
+        self.change_logs: Dict[str, Deque[GraphChange]] = {}
+        self.graph_versions: Dict[str, int] = {}
+        self.change_log_size = 1000
+        # Порядок графов и документов для постраничной выдачи
+        self._graph_order = KeysetIndex(graph_order)
+        self._document_order = KeysetIndex(document_order)
+        # Запись и обход графов из нескольких потоков веб-сервера
+        self._lock = threading.RLock()
     
+    @instrumented()
+    @synchronized
     def save_graph(self, graph: KnowledgeGraph) -> str:
-        """Сохранить граф знаний"""
+        """Сохранить граф знаний (целиком заменяет граф с тем же ID)"""
         self.graphs[graph.id] = graph
-        print(f"Граф сохранен: {graph.name}")
+        self._graph_order.add(graph.id, graph)
+        self._graph_indexes.pop(graph.id, None)
+        self.aggregates.add_graph(graph)
+        self._log_change(GraphChange(graph_id=graph.id, change_type=GraphChangeType.REPLACE))
+        logger.info("Граф сохранен: %s", graph.name)
         return graph.id
     
+    # ---------- Точечные изменения графа ----------
+    
+    def _graph_index(self, graph_id: str) -> GraphIndex:
+        graph = self.graphs.get(graph_id)
+        if graph is None:
+            raise LookupError(f"Граф не найден: {graph_id}")
+        index = self._graph_indexes.get(graph_id)
+        if index is None or index.graph is not graph:
+            index = GraphIndex(graph)
+            self._graph_indexes[graph_id] = index
+        return index
+    
+    def _log_change(self, change: GraphChange) -> GraphChange:
+        version = self.graph_versions.get(change.graph_id, 0) + 1
+        self.graph_versions[change.graph_id] = version
+        change.version = version
+        log = self.change_logs.get(change.graph_id)
+        if log is None:
+            log = self.change_logs[change.graph_id] = deque(maxlen=self.change_log_size)
+        log.append(change)
+        metrics.inc("kms_graph_changes_total", labels={"change_type": change.change_type.value})
+        return change
+    
+    def _apply_delta(self, index: GraphIndex, change: GraphChange,
+                     added_entities: Iterable[Entity] = (), removed_entities: Iterable[Entity] = (),
+                     added_relations: Iterable[Relation] = (),
+                     removed_relations: Iterable[Relation] = ()) -> GraphChange:
+        """Обновить агрегаты по изменившимся элементам и записать изменение в журнал"""
+        entity_types: Counter = Counter()
+        relation_types: Counter = Counter()
+        for entity in added_entities:
+            entity_types[entity.entity_type.value] += 1
+            change.added_entities.append(entity.id)
+        for entity in removed_entities:
+            entity_types[entity.entity_type.value] -= 1
+            change.removed_entities.append(entity.id)
+        for relation in added_relations:
+            relation_types[relation.relation_type.value] += 1
+            change.added_relations.append(relation.id)
+        for relation in removed_relations:
+            relation_types[relation.relation_type.value] -= 1
+            change.removed_relations.append(relation.id)
+        
+        self.aggregates.apply_graph_delta(
+            index.graph,
+            Counter({key: count for key, count in entity_types.items() if count}),
+            Counter({key: count for key, count in relation_types.items() if count})
+        )
+        return self._log_change(change)
+    
+    @instrumented()
+    @synchronized
+    def add_entities(self, graph_id: str, entities: Iterable[Entity]) -> GraphChange:
+        """Добавить сущности в граф (сущности с уже имеющимся ID пропускаются)"""
+        index = self._graph_index(graph_id)
+        added = []
+        for entity in entities:
+            if entity.id not in index.entity_pos:
+                index.add_entity(entity)
+                added.append(entity)
+        change = GraphChange(graph_id=graph_id, change_type=GraphChangeType.ADD_ENTITIES)
+        return self._apply_delta(index, change, added_entities=added)
+    
+    @instrumented()
+    @synchronized
+    def remove_entities(self, graph_id: str, entity_ids: Iterable[str]) -> GraphChange:
+        """Удалить сущности вместе с их отношениями"""
+        index = self._graph_index(graph_id)
+        entities, relations = index.remove_entities(entity_ids)
+        change = GraphChange(graph_id=graph_id, change_type=GraphChangeType.REMOVE_ENTITIES)
+        return self._apply_delta(index, change, removed_entities=entities, removed_relations=relations)
+    
+    @instrumented()
+    @synchronized
+    def add_relations(self, graph_id: str, relations: Iterable[Relation]) -> GraphChange:
+        """Добавить отношения; концы должны быть в графе, дубликаты пропускаются"""
+        index = self._graph_index(graph_id)
+        relations = list(relations)
+        missing = sorted({entity_id for r in relations
+                          for entity_id in (r.source_entity_id, r.target_entity_id)
+                          if entity_id not in index.entity_pos}, key=str)
+        if missing:
+            raise ValueError(f"Сущности не найдены в графе {graph_id}: "
+                             f"{', '.join(map(str, missing))}")
+        
+        added = []
+        for relation in relations:
+            if relation.id in index.relation_pos or index.find_relation(relation) is not None:
+                continue
+            index.add_relation(relation)
+            added.append(relation)
+        change = GraphChange(graph_id=graph_id, change_type=GraphChangeType.ADD_RELATIONS)
+        return self._apply_delta(index, change, added_relations=added)
+    
+    @instrumented()
+    @synchronized
+    def remove_relations(self, graph_id: str, relation_ids: Iterable[str]) -> GraphChange:
+        """Удалить отношения по ID"""
+        index = self._graph_index(graph_id)
+        removed = [index.remove_relation(relation_id) for relation_id in relation_ids
+                   if relation_id in index.relation_pos]
+        change = GraphChange(graph_id=graph_id, change_type=GraphChangeType.REMOVE_RELATIONS)
+        return self._apply_delta(index, change, removed_relations=removed)
+    
+    @instrumented()
+    @synchronized
+    def merge_graph(self, graph_id: str, entities: Iterable[Entity],
+                    relations: Iterable[Relation] = ()) -> GraphChange:
+        """Объединить новый пакет извлечения с графом
+        
+        Сущности сопоставляются по имени (без учета регистра) и типу, отношения
+        переназначаются на найденные сущности и пропускаются, если такое отношение
+        (источник, цель, тип) уже есть. Стоимость зависит только от размера пакета.
+        """
+        index = self._graph_index(graph_id)
+        change = GraphChange(graph_id=graph_id, change_type=GraphChangeType.MERGE)
+        mapping: Dict[str, str] = {}
+        added_entities = []
+        for entity in entities:
+            existing = entity.id if entity.id in index.entity_pos else index.find_entity(entity)
+            if existing is None:
+                index.add_entity(entity)
+                added_entities.append(entity)
+                mapping[entity.id] = entity.id
+            else:
+                mapping[entity.id] = existing
+                if existing != entity.id:
+                    change.merged_entities[entity.id] = existing
+        
+        added_relations = []
+        for relation in relations:
+            source = mapping.get(relation.source_entity_id, relation.source_entity_id)
+            target = mapping.get(relation.target_entity_id, relation.target_entity_id)
+            if source not in index.entity_pos or target not in index.entity_pos:
+                logger.debug("Отношение %s пропущено: нет сущности в графе", relation.id)
+                continue
+            if source == target and relation.source_entity_id != relation.target_entity_id:
+                continue  # обе сущности объединены в одну
+            if (source, target) != (relation.source_entity_id, relation.target_entity_id):
+                relation = replace(relation, source_entity_id=source, target_entity_id=target)
+            if relation.id in index.relation_pos or index.find_relation(relation) is not None:
+                continue
+            index.add_relation(relation)
+            added_relations.append(relation)
+        
+        logger.info("Граф %s: добавлено %d сущностей, %d отношений, объединено %d сущностей",
+                    graph_id, len(added_entities), len(added_relations), len(change.merged_entities))
+        return self._apply_delta(index, change, added_entities=added_entities,
+                                 added_relations=added_relations)
+    
+    # ---------- Запросы к графу ----------
+    
+    @instrumented()
+    @synchronized
+    def neighborhood(self, graph_id: str, entity: str, hops: int = 1, **options) -> TraversalResult:
+        """Окрестность сущности (ID или имя) в hops шагов по индексу смежности
+        
+        options: relation_types, entity_types, direction ("out"/"in"/"both"), limit, timeout
+        """
+        return query_neighborhood(self._graph_index(graph_id), entity, hops, **options)
+    
+    @instrumented()
+    @synchronized
+    def shortest_path(self, graph_id: str, source: str, target: str, **options) -> TraversalResult:
+        """Кратчайший путь между сущностями (options: max_hops и фильтры обхода)"""
+        return query_shortest_path(self._graph_index(graph_id), source, target, **options)
+    
+    @synchronized
+    def get_changes(self, graph_id: str, since_version: int = 0) -> List[GraphChange]:
+        """Изменения графа после указанной версии (из хранимого хвоста журнала)"""
+        return [change for change in self.change_logs.get(graph_id, ())
+                if change.version > since_version]
+    
     def get_graph(self, graph_id: str) -> Optional[KnowledgeGraph]:
         """Получить граф по ID"""
         return self.graphs.get(graph_id)
     
+    def _page(self, index: KeysetIndex, items: Dict[Any, Any], after: Any, limit: int) -> list:
+        if len(index) != len(items):  # элементы добавлены в словарь напрямую
+            index.rebuild(items)
+        return [items[item_id] for item_id in index.page(after, limit)]
+    
+    @synchronized
+    def list_graphs(self, after: Optional[GraphKey] = None, limit: int = 20) -> List[KnowledgeGraph]:
+        """Страница графов в порядке graph_order после ключа after"""
+        return self._page(self._graph_order, self.graphs, after, limit)
+    
+    @synchronized
+    def graph_summaries(self, after: Optional[GraphKey] = None,
+                        limit: int = 100) -> List[Dict[str, Any]]:
+        """Страница показателей графов (без сущностей и отношений)"""
+        return [graph_summary(graph) for graph in self.list_graphs(after, limit)]
+    
+    @synchronized
+    def list_documents(self, after: Optional[str] = None, limit: int = 20) -> List[TransformedData]:
+        """Страница документов в порядке document_order после ключа after"""
+        return self._page(self._document_order, self.documents, after, limit)
+    
+    @instrumented()
+    @synchronized
     def find_entities(self, entity_type: Optional[EntityType] = None) -> List[Entity]:
         """Найти сущности по типу"""
         entities = []
@@ -164,7 +510,48 @@ class StorageService:
                     entities.append(entity)
         return entities
     
+    @instrumented()
+    @synchronized
     def save_document(self, data: TransformedData) -> str:
-        """Сохранить документ"""
+        """Сохранить документ (без времени создания в метаданных отмечается время сохранения)"""
+        if not any(key in data.metadata for key in DOCUMENT_TIME_KEYS):
+            data.metadata["saved_at"] = datetime.now().isoformat()
         self.documents[data.id] = data
+        self._document_order.add(data.id, data)
+        self.aggregates.add_document(data)
         return data.id
+    
+    @synchronized
+    def rebuild_aggregates(self):
+        """Пересчитать агрегаты и порядок выдачи по всему хранилищу (после массовой загрузки)"""
+        self._graph_order.rebuild(self.graphs)
+        self._document_order.rebuild(self.documents)
+        self.aggregates.clear()
+        for graph in self.graphs.values():
+            self.aggregates.add_graph(graph)
+        for doc in self.documents.values():
+            self.aggregates.add_document(doc)
+    
+    @synchronized
+    def save_snapshot(self, path: str, compress: bool = False) -> str:
+        """Сохранить хранилище и индексы в бинарный снимок"""
+        from services.snapshot_service import dump_storage
+        dump_storage(self, path, indexes=self.indexes, compress=compress)
+        return path
+    
+    @classmethod
+    def load_snapshot(cls, path: str) -> "StorageService":
+        """Создать хранилище из бинарного снимка"""
+        from services.snapshot_service import load_storage
+        storage, indexes, reader = load_storage(path, cls)
+        storage.indexes.update(indexes)
+        storage._snapshot_reader = reader
+        storage.rebuild_aggregates()
+        return storage
+    
+    def close(self):
+        """Освободить индексы, отображенные из снимка (mmap)"""
+        reader, self._snapshot_reader = self._snapshot_reader, None
+        if reader is not None:
+            self.indexes.clear()
+            reader.close()
@@ -0,0 +1,140 @@
+"""
+Индекс графа знаний для точечных изменений без перестроения графа
+"""
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from models.data_models import Entity, KnowledgeGraph, Relation
+
+EntityKey = Tuple[str, str]
+RelationKey = Tuple[str, str, str]
+
+
+def entity_key(entity: Entity) -> EntityKey:
+    """Ключ дедупликации сущности: имя без учета регистра и тип"""
+    return entity.name.lower(), entity.entity_type.value
+
+
+def relation_key(relation: Relation) -> RelationKey:
+    """Ключ дедупликации отношения: источник, цель и тип"""
+    return relation.source_entity_id, relation.target_entity_id, relation.relation_type.value
+
+
+class GraphIndex:
+    """Позиции элементов в списках графа, ключи дедупликации и смежность
+
+    Удаление выполняется перестановкой с последним элементом, поэтому
+    порядок graph.entities и graph.relations после удалений не сохраняется.
+    Ключ дедупликации указывает на все элементы с этим ключом (в порядке
+    добавления): после удаления первого из них ключ указывает на следующий.
+    """
+
+    def __init__(self, graph: KnowledgeGraph):
+        self.graph = graph
+        self.entity_pos: Dict[str, int] = {}
+        self.relation_pos: Dict[str, int] = {}
+        self.entity_keys: Dict[EntityKey, Dict[str, None]] = {}
+        self.relation_keys: Dict[RelationKey, Dict[str, None]] = {}
+        self.outgoing: Dict[str, Set[str]] = {}
+        self.incoming: Dict[str, Set[str]] = {}
+        for position, entity in enumerate(graph.entities):
+            self._index_entity(entity, position)
+        for position, relation in enumerate(graph.relations):
+            self._index_relation(relation, position)
+
+    def _index_entity(self, entity: Entity, position: int):
+        self.entity_pos[entity.id] = position
+        self.entity_keys.setdefault(entity_key(entity), {})[entity.id] = None
+
+    def _index_relation(self, relation: Relation, position: int):
+        self.relation_pos[relation.id] = position
+        self.relation_keys.setdefault(relation_key(relation), {})[relation.id] = None
+        self.outgoing.setdefault(relation.source_entity_id, set()).add(relation.id)
+        self.incoming.setdefault(relation.target_entity_id, set()).add(relation.id)
+
+    # ---------- Запросы ----------
+
+    def entity(self, entity_id: str) -> Optional[Entity]:
+        position = self.entity_pos.get(entity_id)
+        return self.graph.entities[position] if position is not None else None
+
+    def relation(self, relation_id: str) -> Optional[Relation]:
+        position = self.relation_pos.get(relation_id)
+        return self.graph.relations[position] if position is not None else None
+
+    def find_entity(self, entity: Entity) -> Optional[str]:
+        """ID сущности графа с тем же ключом дедупликации"""
+        return self.entity_by_key(entity_key(entity))
+
+    def entity_by_key(self, key: EntityKey) -> Optional[str]:
+        """ID первой из сущностей графа с этим ключом"""
+        return next(iter(self.entity_keys.get(key, ())), None)
+
+    def find_relation(self, relation: Relation) -> Optional[str]:
+        """ID отношения графа с тем же ключом дедупликации"""
+        return next(iter(self.relation_keys.get(relation_key(relation), ())), None)
+
+    def incident_relations(self, entity_id: str) -> Set[str]:
+        """ID отношений, входящих в сущность и исходящих из нее"""
+        return self.outgoing.get(entity_id, set()) | self.incoming.get(entity_id, set())
+
+    # ---------- Изменения ----------
+
+    def add_entity(self, entity: Entity):
+        self.graph.entities.append(entity)
+        self._index_entity(entity, len(self.graph.entities) - 1)
+
+    def add_relation(self, relation: Relation):
+        self.graph.relations.append(relation)
+        self._index_relation(relation, len(self.graph.relations) - 1)
+
+    def remove_entity(self, entity_id: str) -> Entity:
+        """Удалить сущность; инцидентные отношения удаляются заранее"""
+        entity = self._swap_remove(self.graph.entities, self.entity_pos, entity_id)
+        self._discard_key(self.entity_keys, entity_key(entity), entity_id)
+        self.outgoing.pop(entity_id, None)
+        self.incoming.pop(entity_id, None)
+        return entity
+
+    def remove_relation(self, relation_id: str) -> Relation:
+        relation = self._swap_remove(self.graph.relations, self.relation_pos, relation_id)
+        self._discard_key(self.relation_keys, relation_key(relation), relation_id)
+        self._discard(self.outgoing, relation.source_entity_id, relation_id)
+        self._discard(self.incoming, relation.target_entity_id, relation_id)
+        return relation
+
+    @staticmethod
+    def _swap_remove(items: list, positions: Dict[str, int], item_id: str):
+        position = positions.pop(item_id)
+        item = items[position]
+        last = items.pop()
+        if last is not item:
+            items[position] = last
+            positions[last.id] = position
+        return item
+
+    @staticmethod
+    def _discard(adjacency: Dict[str, Set[str]], entity_id: str, relation_id: str):
+        ids = adjacency.get(entity_id)
+        if ids is not None:
+            ids.discard(relation_id)
+            if not ids:
+                del adjacency[entity_id]
+
+    @staticmethod
+    def _discard_key(keys: Dict[Any, Dict[str, None]], key: Any, item_id: str):
+        ids = keys.get(key)
+        if ids is not None:
+            ids.pop(item_id, None)
+            if not ids:
+                del keys[key]
+
+    def remove_entities(self, entity_ids: Iterable[str]) -> Tuple[list, list]:
+        """Удалить сущности вместе с инцидентными отношениями"""
+        entities, relations = [], []
+        for entity_id in entity_ids:
+            if entity_id not in self.entity_pos:
+                continue
+            for relation_id in list(self.incident_relations(entity_id)):
+                relations.append(self.remove_relation(relation_id))
+            entities.append(self.remove_entity(entity_id))
+        return entities, relations
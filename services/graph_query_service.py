@@ -0,0 +1,224 @@
+"""
+Запросы к графу знаний: окрестность в k шагов и кратчайший путь
+"""
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+from models.data_models import Entity, Relation
+from models.enums import EntityType, RelationType
+from models.ids import parse_id
+from services.graph_index_service import GraphIndex
+
+DIRECTIONS = ("out", "in", "both")
+DEFAULT_LIMIT = 1000
+MAX_HOPS = 6
+_CLOCK_EVERY = 256  # проверять таймаут раз в столько просмотренных ребер
+
+
+@dataclass
+class TraversalResult:
+    """Подграф, найденный обходом"""
+    graph_id: str
+    entities: List[Entity] = field(default_factory=list)
+    relations: List[Relation] = field(default_factory=list)
+    # ID сущности -> число шагов от начальной
+    depths: Dict[str, int] = field(default_factory=dict)
+    truncated: bool = False   # достигнут limit
+    timed_out: bool = False   # прерван по таймауту
+    elapsed: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "graph_id": str(self.graph_id),
+            "entities": [{"id": str(e.id), "name": e.name, "type": e.entity_type.value,
+                          "depth": self.depths.get(e.id)} for e in self.entities],
+            "relations": [{"id": str(r.id), "source": str(r.source_entity_id),
+                           "target": str(r.target_entity_id), "type": r.relation_type.value,
+                           "strength": r.strength}
+                          for r in self.relations],
+            "truncated": self.truncated,
+            "timed_out": self.timed_out,
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+        }
+
+
+class _Traversal:
+    """Фильтры и ограничение по времени одного запроса"""
+
+    def __init__(self, index: GraphIndex, relation_types: Optional[Collection[RelationType]],
+                 entity_types: Optional[Collection[EntityType]], direction: str,
+                 timeout: Optional[float]):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Неизвестное направление обхода: {direction}")
+        self.index = index
+        self.relation_types = frozenset(relation_types) if relation_types else None
+        self.entity_types = frozenset(entity_types) if entity_types else None
+        self.direction = direction
+        self.started = time.monotonic()
+        self.deadline = None if timeout is None else self.started + timeout
+        self.timed_out = False
+        self._edges = 0
+
+    def expired(self) -> bool:
+        self._edges += 1
+        if self.deadline is not None and self._edges % _CLOCK_EVERY == 0 \
+                and time.monotonic() > self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def neighbors(self, entity_id: str, reverse: bool = False) -> Iterator[Tuple[Relation, str]]:
+        """Отношения и соседние сущности, прошедшие фильтры"""
+        index = self.index
+        direction = self.direction
+        if reverse and direction != "both":
+            direction = "in" if direction == "out" else "out"
+
+        sides = []
+        if direction in ("out", "both"):
+            sides.append((index.outgoing.get(entity_id, ()), True))
+        if direction in ("in", "both"):
+            sides.append((index.incoming.get(entity_id, ()), False))
+
+        for relation_ids, forward in sides:
+            for relation_id in relation_ids:
+                relation = index.relation(relation_id)
+                if self.relation_types is not None and relation.relation_type not in self.relation_types:
+                    continue
+                other = relation.target_entity_id if forward else relation.source_entity_id
+                if self.entity_types is not None and \
+                        index.entity(other).entity_type not in self.entity_types:
+                    continue
+                yield relation, other
+
+    def result(self, graph_id: str, **fields) -> TraversalResult:
+        return TraversalResult(graph_id=graph_id, timed_out=self.timed_out,
+                               elapsed=time.monotonic() - self.started, **fields)
+
+
+def resolve_entity(index: GraphIndex, ref: str) -> str:
+    """ID сущности по ID (в том числе строковому) или имени (без учета регистра)"""
+    entity_id = parse_id(ref)
+    if entity_id in index.entity_pos:
+        return entity_id
+    name = ref.lower()
+    for entity_type in EntityType:
+        entity_id = index.entity_by_key((name, entity_type.value))
+        if entity_id is not None:
+            return entity_id
+    raise LookupError(f"Сущность не найдена: {ref}")
+
+
+def neighborhood(index: GraphIndex, entity: str, hops: int = 1,
+                 relation_types: Optional[Collection[RelationType]] = None,
+                 entity_types: Optional[Collection[EntityType]] = None,
+                 direction: str = "both", limit: int = DEFAULT_LIMIT,
+                 timeout: Optional[float] = None) -> TraversalResult:
+    """Сущности не дальше hops шагов от заданной и отношения между ними"""
+    traversal = _Traversal(index, relation_types, entity_types, direction, timeout)
+    start = resolve_entity(index, entity)
+    hops = max(0, min(hops, MAX_HOPS))
+    depths = {start: 0}
+    relations: Dict[str, Relation] = {}
+    truncated = False
+    queue = deque([start])
+    expanded = set()
+
+    while queue and not truncated and not traversal.timed_out:
+        current = queue.popleft()
+        depth = depths[current]
+        if depth >= hops:
+            continue
+        for relation, other in traversal.neighbors(current):
+            if traversal.expired():
+                break
+            if other not in depths:
+                if len(depths) >= limit:
+                    truncated = True
+                    break
+                depths[other] = depth + 1
+                queue.append(other)
+            relations[relation.id] = relation
+        else:
+            expanded.add(current)
+
+    # Отношения между найденными сущностями, которые обход не раскрывал (последний шаг, лимит)
+    for current in depths.keys() - expanded:
+        for relation, other in traversal.neighbors(current):
+            if traversal.expired():
+                break
+            if other in depths:
+                relations[relation.id] = relation
+
+    return traversal.result(
+        index.graph.id,
+        entities=[index.entity(entity_id) for entity_id in depths],
+        relations=list(relations.values()),
+        depths=depths,
+        truncated=truncated
+    )
+
+
+def shortest_path(index: GraphIndex, source: str, target: str, max_hops: int = MAX_HOPS,
+                  relation_types: Optional[Collection[RelationType]] = None,
+                  entity_types: Optional[Collection[EntityType]] = None,
+                  direction: str = "both", timeout: Optional[float] = None) -> TraversalResult:
+    """Кратчайший путь двунаправленным поиском в ширину; пустой результат - пути нет"""
+    traversal = _Traversal(index, relation_types, entity_types, direction, timeout)
+    source_id = resolve_entity(index, source)
+    target_id = resolve_entity(index, target)
+
+    # Для каждой достигнутой сущности - (предыдущая сущность, отношение) и глубина
+    parents = [{source_id: None}, {target_id: None}]
+    depths = [{source_id: 0}, {target_id: 0}]
+    frontiers = [[source_id], [target_id]]
+    meeting = source_id if source_id == target_id else None
+
+    def length(entity_id: str) -> int:
+        return depths[0][entity_id] + depths[1][entity_id]
+
+    while meeting is None and frontiers[0] and frontiers[1] and not traversal.timed_out:
+        if depths[0][frontiers[0][0]] + depths[1][frontiers[1][0]] >= max_hops:
+            break
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1  # расширяем меньший фронт
+        next_frontier = []
+        for current in frontiers[side]:
+            for relation, other in traversal.neighbors(current, reverse=side == 1):
+                if traversal.expired():
+                    break
+                if other in parents[side]:
+                    continue
+                parents[side][other] = (current, relation)
+                depths[side][other] = depths[side][current] + 1
+                next_frontier.append(other)
+                # Уровень дорабатывается до конца, чтобы выбрать самую короткую встречу
+                if other in parents[1 - side] and (meeting is None or length(other) < length(meeting)):
+                    meeting = other
+            if traversal.timed_out:
+                break
+        frontiers[side] = next_frontier
+
+    if meeting is None:
+        return traversal.result(index.graph.id)
+
+    # Сборка пути: от начала до точки встречи и от нее до цели
+    path = [meeting]
+    relations: List[Relation] = []
+    node = meeting
+    while parents[0][node] is not None:
+        node, relation = parents[0][node]
+        path.insert(0, node)
+        relations.insert(0, relation)
+    node = meeting
+    while parents[1][node] is not None:
+        node, relation = parents[1][node]
+        path.append(node)
+        relations.append(relation)
+
+    return traversal.result(
+        index.graph.id,
+        entities=[index.entity(entity_id) for entity_id in path],
+        relations=relations,
+        depths={entity_id: depth for depth, entity_id in enumerate(path)}
+    )
@@ -0,0 +1,258 @@
+"""
+Инструментирование сервисов: счетчики, таймеры, гистограммы и логирование
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LOG_LEVEL_ENV = "KMS_LOG_LEVEL"
+METRICS_ENV = "KMS_METRICS"
+
+# Границы корзин гистограмм длительности (секунды)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def configure_logging(level: Optional[str] = None) -> logging.Logger:
+    """Настроить логирование сервисов; уровень OFF отключает вывод"""
+    level_name = (level or os.environ.get(LOG_LEVEL_ENV, "INFO")).upper()
+    logger = logging.getLogger("services")
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    if level_name == "OFF":
+        logger.setLevel(logging.CRITICAL + 1)
+    else:
+        logger.setLevel(getattr(logging, level_name, logging.INFO))
+    return logger
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class MetricsSink:
+    """Приемник наблюдений (подключаемый)"""
+
+    def record(self, kind: str, name: str, value: float, labels: LabelKey):
+        """Принять одно наблюдение метрики"""
+        raise NotImplementedError
+
+
+class LoggingSink(MetricsSink):
+    """Приемник, пишущий наблюдения в лог на уровне DEBUG"""
+
+    def __init__(self, logger_name: str = "services.metrics"):
+        self.logger = logging.getLogger(logger_name)
+
+    def record(self, kind: str, name: str, value: float, labels: LabelKey):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s %s%s %s", kind, name, _format_labels(labels), value)
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.enabled = os.environ.get(METRICS_ENV, "on").lower() not in ("0", "off", "false")
+        self.sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], _Histogram] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Задать описание метрики для экспорта"""
+        self._help[name] = help_text
+
+    def add_sink(self, sink: MetricsSink):
+        """Подключить приемник наблюдений"""
+        self.sinks.append(sink)
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, Any]] = None):
+        """Увеличить счетчик"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        self._emit("counter", name, value, key[1])
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """Установить значение датчика"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+        self._emit("gauge", name, value, key[1])
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """Добавить наблюдение в гистограмму"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+        self._emit("histogram", name, value, key[1])
+
+    @contextmanager
+    def timer(self, name: str, labels: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+        """Замерить длительность блока кода"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def _emit(self, kind: str, name: str, value: float, labels: LabelKey):
+        for sink in self.sinks:
+            sink.record(kind, name, value, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Получить текущие значения всех метрик"""
+        with self._lock:
+            return {
+                "counters": {(n, k): v for (n, k), v in self._counters.items()},
+                "gauges": {(n, k): v for (n, k), v in self._gauges.items()},
+                "histograms": {
+                    (n, k): {"count": h.count, "sum": h.sum, "buckets": h.cumulative()}
+                    for (n, k), h in self._histograms.items()
+                },
+            }
+
+    def reset(self):
+        """Сбросить все метрики"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """Экспорт метрик в текстовом формате Prometheus"""
+        data = self.snapshot()
+        lines: List[str] = []
+
+        def header(name: str, kind: str, seen: set):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        seen: set = set()
+        for (name, key), value in sorted(data["counters"].items()):
+            header(name, "counter", seen)
+            lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for (name, key), value in sorted(data["gauges"].items()):
+            header(name, "gauge", seen)
+            lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for (name, key), hist in sorted(data["histograms"].items()):
+            header(name, "histogram", seen)
+            for bound, count in hist["buckets"]:
+                labels = _format_labels(key, (("le", _format_value(bound)),))
+                lines.append(f"{name}_bucket{labels} {count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(hist['sum'])}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Реестр по умолчанию, общий для всех сервисов процесса
+metrics = MetricsRegistry()
+metrics.describe("kms_service_call_seconds", "Длительность вызовов методов сервисов")
+metrics.describe("kms_service_calls_total", "Количество вызовов методов сервисов")
+metrics.describe("kms_service_errors_total", "Количество исключений в методах сервисов")
+
+
+def instrumented(name: Optional[str] = None,
+                 registry: Optional[MetricsRegistry] = None) -> Callable:
+    """Декоратор: счетчик вызовов, ошибок и гистограмма длительности метода"""
+
+    def decorator(func: Callable) -> Callable:
+        method = name or func.__qualname__
+        labels = {"method": method}
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            reg = registry or metrics
+            if not reg.enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                reg.inc("kms_service_errors_total", labels=labels)
+                raise
+            finally:
+                reg.inc("kms_service_calls_total", labels=labels)
+                reg.observe("kms_service_call_seconds", time.perf_counter() - start, labels)
+
+        return wrapper
+
+    return decorator
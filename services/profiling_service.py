@@ -0,0 +1,253 @@
+"""
+Профилирование запросов и ETL-запусков по требованию
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# off - профилирование выключено; header - только запросы с флагом; all - все запросы
+PROFILING_ENV = "KMS_PROFILING"
+PROFILE_HEADER = "X-Profile"
+
+# cProfile активен не более чем в одном сеансе процесса: с Python 3.12 второй
+# одновременный Profile().enable() падает с ValueError (общий sys.monitoring)
+_cprofile_lock = threading.Lock()
+
+
+@dataclass
+class ProfileRecord:
+    """Результат профилирования одного запроса или ETL-запуска"""
+    id: str
+    label: str
+    mode: str
+    started_at: datetime = field(default_factory=datetime.now)
+    duration: float = 0.0
+    samples: int = 0
+    top_functions: List[Dict[str, Any]] = field(default_factory=list)
+    collapsed_stacks: Dict[str, int] = field(default_factory=dict)
+
+    def collapsed(self) -> str:
+        """Стеки в свернутом формате (flamegraph.pl, speedscope)"""
+        return "\n".join(f"{stack} {count}"
+                         for stack, count in sorted(self.collapsed_stacks.items()))
+
+    def summary(self) -> Dict[str, Any]:
+        """Краткое описание для списка профилей"""
+        return {
+            "id": self.id,
+            "label": self.label,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(self.duration, 6),
+            "samples": self.samples,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Полное описание профиля"""
+        return {
+            **self.summary(),
+            "top_functions": self.top_functions,
+            "collapsed_stacks": self.collapsed_stacks,
+        }
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class _StackSampler(threading.Thread):
+    """Фоновый поток, периодически снимающий стек целевого потока"""
+
+    def __init__(self, target_ident: int, interval: float):
+        super().__init__(name="kms-profiler-sampler", daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class ProfileSession:
+    """Активный сеанс профилирования текущего потока"""
+
+    def __init__(self, service: "ProfilingService", label: str, profile_id: str):
+        self.service = service
+        self.label = label
+        self.profile_id = profile_id
+        self._profiler = None
+        self._sampler: Optional[_StackSampler] = None
+        self.mode = service.mode
+        self._started = 0.0
+        self._started_at = datetime.now()
+
+    def start(self) -> "ProfileSession":
+        mode = self.service.mode
+        if mode in ("cprofile", "both"):
+            if _cprofile_lock.acquire(blocking=False):
+                import cProfile
+                self._profiler = cProfile.Profile()
+            else:
+                # cProfile занят другим сеансом: этот профилируется только выборкой стеков
+                logger.debug("cProfile занят, сеанс %s без cProfile", self.profile_id)
+                mode = self.mode = "sampling"
+        if mode in ("sampling", "both"):
+            self._start_sampler()
+        self._started = time.perf_counter()
+        self._started_at = datetime.now()
+        if self._profiler is not None:
+            try:
+                self._profiler.enable()
+            except ValueError as e:  # профилировщик включен в обход сервиса
+                logger.warning("cProfile недоступен: %s", e)
+                self._profiler = None
+                _cprofile_lock.release()
+                self.mode = "sampling"
+                if self._sampler is None:
+                    self._start_sampler()
+        return self
+
+    def _start_sampler(self):
+        self._sampler = _StackSampler(threading.get_ident(), self.service.interval)
+        self._sampler.start()
+
+    def stop(self) -> ProfileRecord:
+        profiler = self._profiler
+        if profiler is not None:
+            profiler.disable()
+            self._profiler = None
+            _cprofile_lock.release()
+        duration = time.perf_counter() - self._started
+        stacks = self._sampler.stop() if self._sampler is not None else Counter()
+
+        record = ProfileRecord(
+            id=self.profile_id,
+            label=self.label,
+            mode=self.mode,
+            started_at=self._started_at,
+            duration=duration,
+            samples=sum(stacks.values()),
+            collapsed_stacks=dict(stacks),
+        )
+        if profiler is not None:
+            record.top_functions = self._top_functions(profiler)
+        else:
+            record.top_functions = self._top_from_samples(stacks)
+
+        self.service._store(record)
+        return record
+
+    def _top_functions(self, profiler) -> List[Dict[str, Any]]:
+        import pstats
+        stats = pstats.Stats(profiler).stats
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({func})",
+                "calls": nc,
+                "primitive_calls": cc,
+                "total_time": round(tt, 6),
+                "cumulative_time": round(ct, 6),
+            })
+        rows.sort(key=lambda r: r["cumulative_time"], reverse=True)
+        return rows[:self.service.top_n]
+
+    def _top_from_samples(self, stacks: Counter) -> List[Dict[str, Any]]:
+        self_samples: Counter = Counter()
+        for stack, count in stacks.items():
+            self_samples[stack.rsplit(";", 1)[-1]] += count
+        return [{"function": name, "samples": count}
+                for name, count in self_samples.most_common(self.service.top_n)]
+
+
+class ProfilingService:
+    """Профилирование по требованию с хранением последних профилей"""
+
+    MODES = ("cprofile", "sampling", "both")
+
+    def __init__(self, policy: Optional[str] = None, mode: str = "both",
+                 capacity: int = 50, interval: float = 0.005, top_n: int = 25):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+        self.policy = (policy or os.environ.get(PROFILING_ENV, "off")).lower()
+        self.enabled = self.policy in ("header", "all")
+        self.mode = mode
+        self.capacity = capacity
+        self.interval = interval
+        self.top_n = top_n
+        self._records: "OrderedDict[str, ProfileRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def should_profile(self, requested: bool = False) -> bool:
+        """Нужно ли профилировать операцию"""
+        if not self.enabled:
+            return False
+        if getattr(self._local, "active", False):
+            return False  # вложенные операции попадают в профиль внешней
+        return self.policy == "all" or requested
+
+    def start(self, label: str, profile_id: Optional[str] = None) -> ProfileSession:
+        """Начать профилирование текущего потока"""
+        self._local.active = True
+        return ProfileSession(self, label, profile_id or uuid4().hex).start()
+
+    def stop(self, session: ProfileSession) -> ProfileRecord:
+        """Завершить профилирование и сохранить результат"""
+        try:
+            return session.stop()
+        finally:
+            self._local.active = False
+
+    @contextmanager
+    def profile(self, label: str, profile_id: Optional[str] = None) -> Iterator[ProfileSession]:
+        """Профилировать блок кода"""
+        session = self.start(label, profile_id)
+        try:
+            yield session
+        finally:
+            self.stop(session)
+
+    def _store(self, record: ProfileRecord):
+        with self._lock:
+            self._records[record.id] = record
+            self._records.move_to_end(record.id)
+            while len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+        logger.info("Профиль %s (%s): %.3f с", record.id, record.label, record.duration)
+
+    def get_profile(self, profile_id: str) -> Optional[ProfileRecord]:
+        """Получить профиль по ID"""
+        with self._lock:
+            return self._records.get(profile_id)
+
+    def recent_profiles(self, limit: int = 20) -> List[ProfileRecord]:
+        """Последние профили, новые первыми"""
+        with self._lock:
+            records = list(self._records.values())
+        return records[::-1][:limit]
@@ -0,0 +1,292 @@
+"""
+Фоновое формирование отчетов: очередь заданий и пул исполнителей
+"""
+import atexit
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from models.enums import JobStatus
+from models.user_models import ReportJob
+from services.data_service import graph_order, summary_order
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Тип отчета -> описание (для формы и API)
+REPORT_TYPES = {
+    "SUMMARY": "Сводный: общее число графов, сущностей, отношений и документов",
+    "ENTITIES_BY_TYPE": "Аналитический: распределение по типам, источникам и дням",
+    "GRAPHS": "Сравнительный: показатели каждого графа знаний",
+    "ENTITIES": "Полный список сущностей",
+}
+
+Rows = Iterator[Dict[str, Any]]
+# Графов за одно обращение к хранилищу (у шардированного - за один обмен с шардами)
+PAGE_SIZE = 100
+Progress = Callable[[float], None]
+Builder = Callable[[Dict[str, Any], Progress], Rows]
+
+
+def _read_spool(path: str) -> Rows:
+    """Строки готового отчета из файла NDJSON"""
+    with open(path, encoding="utf-8") as spool:
+        for line in spool:
+            yield json.loads(line)
+
+
+class ReportJobService:
+    """Очередь заданий на отчеты с пулом фоновых исполнителей"""
+
+    def __init__(self, storage_service, report_service, max_workers: int = 2,
+                 max_jobs: int = 200, spool_dir: Optional[str] = None):
+        self.storage_service = storage_service
+        self.report_service = report_service
+        self.max_jobs = max_jobs
+        # Строки готовых отчетов пишутся в файлы; экспорт читает их, не пересчитывая отчет
+        self._own_spool = spool_dir is None
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="kms-reports-")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        if self._own_spool:
+            atexit.register(self._remove_spool)
+        self.jobs: "OrderedDict[str, ReportJob]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="kms-report")
+        self._changed = threading.Condition()
+        # Тип отчета -> колонки и генератор строк
+        self._builders: Dict[str, Tuple[List[str], Builder]] = {
+            "SUMMARY": (["metric", "value"], self._build_summary),
+            "ENTITIES_BY_TYPE": (["kind", "type", "count"], self._build_by_type),
+            "GRAPHS": (["graph_id", "name", "entities", "relations", "density", "created_at"],
+                       self._build_graphs),
+            "ENTITIES": (["graph_id", "entity_id", "name", "type", "confidence"],
+                         self._build_entities),
+        }
+
+    def submit(self, title: str, report_type: str, user_id: str,
+               parameters: Optional[Dict[str, Any]] = None) -> ReportJob:
+        """Поставить отчет в очередь; возвращает задание сразу"""
+        report_type = report_type.upper()
+        if report_type not in self._builders:
+            raise ValueError(f"Неизвестный тип отчета: {report_type}")
+
+        job = ReportJob(
+            title=title or REPORT_TYPES[report_type],
+            report_type=report_type,
+            parameters=dict(parameters or {}),
+            created_by=user_id
+        )
+        evicted = []
+        with self._changed:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_jobs:
+                evicted.append(self.jobs.popitem(last=False)[0])
+        for job_id in evicted:
+            self._discard_spool(job_id)
+        metrics.inc("kms_report_jobs_total", labels={"report_type": report_type})
+        self._executor.submit(self._run, job)
+        logger.info("Отчет поставлен в очередь: %s (%s)", job.title, job.id)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ReportJob]:
+        """Получить задание по ID"""
+        with self._changed:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self, user_id: Optional[str] = None, limit: int = 20) -> List[ReportJob]:
+        """Последние задания, новые первыми"""
+        with self._changed:
+            jobs = [job for job in reversed(self.jobs.values())
+                    if user_id is None or job.created_by == user_id]
+        return jobs[:limit]
+
+    def describe(self, job: ReportJob) -> Dict[str, Any]:
+        """Состояние задания для API"""
+        return {
+            "id": str(job.id),
+            "title": job.title,
+            "report_type": job.report_type,
+            "status": job.status.value,
+            "progress": round(job.progress, 3),
+            "error": job.error,
+            "rows": job.report.content["row_count"] if job.report else None,
+            "created_at": job.created_at.isoformat(),
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ReportJob]:
+        """Дождаться завершения задания"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None or job.status in (JobStatus.DONE, JobStatus.FAILED):
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return job
+                self._changed.wait(remaining)
+
+    def iter_status(self, job_id: str, timeout: float = 300.0) -> Iterator[Dict[str, Any]]:
+        """Поток изменений состояния задания до его завершения"""
+        deadline = time.monotonic() + timeout
+        last = None
+        while True:
+            with self._changed:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return
+                state = self.describe(job)
+                remaining = deadline - time.monotonic()
+                if state == last:
+                    if remaining <= 0:
+                        return
+                    self._changed.wait(min(1.0, remaining))
+                    continue
+            yield state
+            last = state
+            if job.status in (JobStatus.DONE, JobStatus.FAILED):
+                return
+
+    def iter_export(self, job_id: str, export_format: str,
+                    chunk_rows: int = 500) -> Iterator[str]:
+        """Потоковый экспорт готового отчета (формат проверяется сразу)"""
+        job = self.get_job(job_id)
+        if job is None or job.report is None:
+            raise LookupError(f"Отчет не готов: {job_id}")
+        return self.report_service.iter_export(job.report, export_format, chunk_rows)
+
+    def shutdown(self, wait: bool = True):
+        """Остановить пул исполнителей (и удалить файлы строк, если каталог свой)"""
+        self._executor.shutdown(wait=wait)
+        if self._own_spool:
+            self._remove_spool()
+
+    def _spool_path(self, job_id) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.ndjson")
+
+    def _discard_spool(self, job_id):
+        try:
+            os.remove(self._spool_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _remove_spool(self):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def _update(self, job: ReportJob, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            self._changed.notify_all()
+
+    def _run(self, job: ReportJob):
+        self._update(job, status=JobStatus.RUNNING)
+        started = time.perf_counter()
+
+        def report_progress(value: float):
+            if value - job.progress >= 0.01:  # не будим ожидающих на каждый граф
+                self._update(job, progress=value)
+
+        try:
+            columns, build = self._builders[job.report_type]
+            parameters = dict(job.parameters)
+            path = self._spool_path(job.id)
+            row_count = 0
+            with open(path, "w", encoding="utf-8") as spool:
+                for row in build(parameters, report_progress):
+                    spool.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                    row_count += 1
+            report = self.report_service.generate_report(
+                title=job.title,
+                content={"columns": columns, "row_count": row_count,
+                         "rows": lambda: _read_spool(path)},
+                user_id=job.created_by,
+                format="TABLE"
+            )
+            self._update(job, report=report, status=JobStatus.DONE, progress=1.0,
+                         finished_at=datetime.now())
+            if self.get_job(job.id) is None:  # вытеснено, пока формировалось
+                self._discard_spool(job.id)
+        except Exception as e:
+            logger.exception("Ошибка формирования отчета %s", job.id)
+            self._discard_spool(job.id)
+            self._update(job, status=JobStatus.FAILED, error=str(e),
+                         finished_at=datetime.now())
+        finally:
+            metrics.observe("kms_report_job_seconds", time.perf_counter() - started,
+                            {"report_type": job.report_type})
+
+    # ---------- Агрегации ----------
+
+    def _pages(self, fetch: Callable[[Any, int], List[Any]], key: Callable[[Any], Any]) -> Iterator[Any]:
+        # Следующая страница - после ключа последнего элемента (без смещения)
+        after = None
+        while True:
+            page = fetch(after, PAGE_SIZE)
+            yield from page
+            if len(page) < PAGE_SIZE:
+                return
+            after = key(page[-1])
+
+    def _iter_graphs(self) -> Iterator[Any]:
+        """Графы хранилища постранично (хранилище не копируется целиком)"""
+        return self._pages(self.storage_service.list_graphs, graph_order)
+
+    def _iter_graph_summaries(self) -> Iterator[Dict[str, Any]]:
+        """Показатели графов постранично, без сущностей и отношений"""
+        return self._pages(self.storage_service.graph_summaries, summary_order)
+
+    def _graph_count(self) -> int:
+        return max(1, self.storage_service.aggregates.count("graphs"))
+
+    def _build_summary(self, parameters: Dict[str, Any], progress: Progress) -> Rows:
+        for key, value in self.storage_service.aggregates.totals().items():
+            yield {"metric": key, "value": value}
+
+    def _build_by_type(self, parameters: Dict[str, Any], progress: Progress) -> Rows:
+        aggregates = self.storage_service.aggregates.snapshot(include_graphs=False)
+        for kind, key in (("entity", "entities_by_type"), ("relation", "relations_by_type"),
+                          ("document_source", "documents_by_source")):
+            for t, c in Counter(aggregates[key]).most_common():
+                yield {"kind": kind, "type": t, "count": c}
+        for day, counts in sorted(aggregates["by_day"].items()):
+            for key, c in sorted(counts.items()):
+                yield {"kind": f"day:{key}", "type": day, "count": c}
+
+    def _build_graphs(self, parameters: Dict[str, Any], progress: Progress) -> Rows:
+        total = self._graph_count()
+        for i, summary in enumerate(self._iter_graph_summaries(), 1):
+            yield {
+                "graph_id": str(summary["id"]),
+                "name": summary["name"],
+                "entities": summary["entities"],
+                "relations": summary["relations"],
+                "density": round(summary["relations"] / summary["entities"], 3) if summary["entities"] else 0.0,
+                "created_at": summary["created_at"].isoformat()
+            }
+            progress(min(1.0, i / total))
+
+    def _build_entities(self, parameters: Dict[str, Any], progress: Progress) -> Rows:
+        total = self._graph_count()
+        entity_type = parameters.get("entity_type")
+        for i, graph in enumerate(self._iter_graphs(), 1):
+            for entity in graph.entities:
+                if entity_type and entity.entity_type.value != entity_type:
+                    continue
+                yield {
+                    "graph_id": str(graph.id),
+                    "entity_id": str(entity.id),
+                    "name": entity.name,
+                    "type": entity.entity_type.value,
+                    "confidence": entity.confidence
+                }
+            progress(min(1.0, i / total))
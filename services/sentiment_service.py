@@ -0,0 +1,159 @@
+"""
+Оценка тональности по словарю: токенизация, стемминг, отрицания, пакетный расчет
+"""
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Слово -> вес (положительный или отрицательный); слова приводятся к основе
+DEFAULT_LEXICON: Dict[str, float] = {
+    "успех": 1.0, "успешный": 1.0, "хороший": 1.0, "отличный": 1.5, "рекомендовать": 1.0,
+    "рекомендую": 1.0, "рекомендуем": 1.0,
+    "эффективный": 1.0, "прекрасный": 1.5, "удачный": 1.0, "надежный": 0.8,
+    "выгодный": 0.8, "прибыль": 0.8, "рост": 0.6, "качественный": 0.8,
+    "улучшение": 0.8, "улучшить": 0.8, "довольный": 1.0, "лучший": 1.0, "стабильный": 0.6,
+    "проблема": -1.0, "проблем": -1.0, "риск": -0.8, "плохой": -1.0, "ошибка": -1.0, "ошибок": -1.0,
+    "негативный": -1.0, "сбой": -1.0, "провал": -1.5, "убыток": -1.0, "кризис": -1.0,
+    "задержка": -0.7, "жалоба": -0.8, "худший": -1.0, "хуже": -1.0, "угроза": -1.0,
+    "потеря": -0.8, "отказ": -0.8, "дефект": -0.8, "слабый": -0.6, "авария": -1.2,
+}
+
+NEGATIONS = frozenset({"не", "нет", "ни", "без", "никогда", "нельзя"})
+INTENSIFIERS = {"очень": 1.5, "крайне": 1.8, "весьма": 1.3, "особенно": 1.3, "слегка": 0.5}
+NEGATION_SCOPE = 3
+
+# Окончания от длинных к коротким; основа не короче _MIN_STEM символов
+_ENDINGS = sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ость", "ости",
+    "ение", "ения", "ить", "ать", "ять", "еть", "уть", "ешь", "ишь", "ете", "ите",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ую", "юю", "ом", "ем",
+    "ам", "ям", "ах", "ях", "ов", "ев", "ет", "ит", "ут", "ют", "ат", "ят",
+    "о", "а", "я", "ы", "и", "е", "у", "ю", "ь", "й",
+), key=len, reverse=True)
+_MIN_STEM = 3
+
+_TOKEN_RE = re.compile(r"[а-яёa-z]+|[.!?;:,]", re.IGNORECASE)
+_CLAUSE_BREAKS = frozenset(".!?;:,")
+
+
+def stem_ru(word: str) -> str:
+    """Упрощенный стеммер: отбрасывает одно окончание"""
+    word = word.lower().replace("ё", "е")
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова в нижнем регистре и знаки, завершающие фразу"""
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+class LexiconSentimentScorer:
+    """Тональность как скалярное произведение разреженного вектора текста на веса словаря"""
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None):
+        self.vocabulary: Dict[str, int] = {}
+        self.weights = array("d")
+        for word, weight in (lexicon if lexicon is not None else DEFAULT_LEXICON).items():
+            stem = stem_ru(word)
+            column = self.vocabulary.get(stem)
+            if column is None:
+                self.vocabulary[stem] = len(self.weights)
+                self.weights.append(weight)
+            else:
+                self.weights[column] = weight
+        self._stems: Dict[str, str] = {}
+
+    def _stem(self, token: str) -> str:
+        stem = self._stems.get(token)
+        if stem is None:
+            stem = stem_ru(token)
+            if len(self._stems) < 100000:
+                self._stems[token] = stem
+        return stem
+
+    def vectorize(self, text: str) -> List[Tuple[int, float]]:
+        """Разреженный вектор текста: (колонка словаря, множитель с учетом отрицаний)"""
+        entries = []
+        negation_left = 0
+        boost = 1.0
+        for token in tokenize(text):
+            if token in _CLAUSE_BREAKS:
+                negation_left = 0
+                boost = 1.0
+                continue
+            if token in NEGATIONS:
+                negation_left = NEGATION_SCOPE
+                continue
+            if token in INTENSIFIERS:
+                boost *= INTENSIFIERS[token]
+                continue
+
+            column = self.vocabulary.get(self._stem(token))
+            if column is not None:
+                entries.append((column, -boost if negation_left else boost))
+                boost = 1.0
+            if negation_left:
+                negation_left -= 1
+        return entries
+
+    @staticmethod
+    def _to_score(positive: float, negative: float) -> float:
+        total = positive + negative
+        if total == 0:
+            return 0.5  # Нейтральная
+        return positive / total
+
+    def score(self, text: str) -> float:
+        """Доля положительной тональности в [0, 1]; 0.5 - нейтральная"""
+        positive = negative = 0.0
+        weights = self.weights
+        for column, value in self.vectorize(text):
+            contribution = weights[column] * value
+            if contribution > 0:
+                positive += contribution
+            else:
+                negative -= contribution
+        return self._to_score(positive, negative)
+
+    def score_batch(self, texts: Sequence[str]) -> List[float]:
+        """Пакетная оценка: одна разреженная матрица на все тексты"""
+        rows = array("q")
+        columns = array("q")
+        values = array("d")
+        for row, text in enumerate(texts):
+            for column, value in self.vectorize(text):
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+
+        try:
+            import numpy as np
+        except ImportError:
+            return self._reduce_python(len(texts), rows, columns, values)
+
+        if not values:
+            return [0.5] * len(texts)
+        contributions = np.frombuffer(self.weights, dtype=np.float64)[np.frombuffer(columns, dtype=np.int64)]
+        contributions *= np.frombuffer(values, dtype=np.float64)
+        row_ids = np.frombuffer(rows, dtype=np.int64)
+        positive = np.bincount(row_ids, weights=np.clip(contributions, 0, None), minlength=len(texts))
+        negative = np.bincount(row_ids, weights=np.clip(-contributions, 0, None), minlength=len(texts))
+        total = positive + negative
+        scores = np.divide(positive, total, out=np.full(len(texts), 0.5), where=total > 0)
+        return scores.tolist()
+
+    def _reduce_python(self, count: int, rows: Iterable[int], columns: Iterable[int],
+                       values: Iterable[float]) -> List[float]:
+        positive = [0.0] * count
+        negative = [0.0] * count
+        weights = self.weights
+        for row, column, value in zip(rows, columns, values):
+            contribution = weights[column] * value
+            if contribution > 0:
+                positive[row] += contribution
+            else:
+                negative[row] -= contribution
+        return [self._to_score(p, n) for p, n in zip(positive, negative)]
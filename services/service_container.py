@@ -0,0 +1,98 @@
+"""
+Ленивое создание сервисов при первом обращении
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Реестр фабрик сервисов с отложенной инициализацией"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ServiceContainer"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        # Имя сервиса -> описание ошибки последней неудачной попытки создания
+        self.failures: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[["ServiceContainer"], Any]):
+        """Зарегистрировать фабрику сервиса"""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """Получить сервис, создав его при первом обращении"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                if name not in self._factories:
+                    raise KeyError(f"Сервис не зарегистрирован: {name}")
+                started = time.perf_counter()
+                try:
+                    instance = self._factories[name](self)
+                except Exception as e:
+                    self.failures[name] = f"{type(e).__name__}: {e}"
+                    logger.exception("Не удалось создать сервис %s", name)
+                    raise
+                self._instances[name] = instance
+                self.failures.pop(name, None)
+                logger.info("Сервис %s создан за %.1f мс", name,
+                            (time.perf_counter() - started) * 1000)
+            return instance
+
+    def set(self, name: str, instance: Any):
+        """Подменить экземпляр сервиса"""
+        with self._lock:
+            self._instances[name] = instance
+
+    def is_initialized(self, name: str) -> bool:
+        """Создан ли уже сервис"""
+        return name in self._instances
+
+    def health(self, require: Iterable[str] = ()) -> Dict[str, str]:
+        """Состояние сервисов: ok, not created или ошибка создания
+
+        Сервисы из require создаются, если еще не созданы (проверка готовности).
+        """
+        for name in require:
+            try:
+                self.get(name)
+            except Exception:
+                pass  # ошибка уже записана в failures
+        with self._lock:
+            return {name: "ok" if name in self._instances
+                    else self.failures.get(name, "not created")
+                    for name in self._factories}
+
+    def proxy(self, name: str) -> "LazyService":
+        """Прокси, создающий сервис при первом обращении к атрибуту"""
+        return LazyService(self, name)
+
+
+class LazyService:
+    """Прокси к сервису из контейнера"""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: ServiceContainer, name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._container.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._container.get(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        state = "создан" if self._container.is_initialized(self._name) else "не создан"
+        return f"<LazyService {self._name} ({state})>"
@@ -0,0 +1,334 @@
+"""
+Шардированное хранилище: графы и документы распределены по процессам
+"""
+import argparse
+import atexit
+import heapq
+import logging
+import os
+import sys
+import threading
+import zlib
+from itertools import islice
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.data_models import Entity, GraphChange, KnowledgeGraph, Relation, TransformedData
+from models.enums import EntityType
+from services.aggregate_service import AggregateStore
+from services.data_service import GraphKey, document_order, graph_order, summary_order
+from services.graph_query_service import TraversalResult
+from services.metrics_service import instrumented
+
+logger = logging.getLogger(__name__)
+
+SHARDS_ENV = "KMS_SHARDS"
+SHARD_NODES_ENV = "KMS_SHARD_NODES"
+SHARD_AUTHKEY_ENV = "KMS_SHARD_AUTHKEY"
+
+# Методы StorageService, которые шард выполняет по запросу координатора
+SHARD_OPERATIONS = {"save_graph", "get_graph", "find_entities", "save_document",
+                    "add_entities", "remove_entities", "add_relations", "remove_relations",
+                    "merge_graph", "get_changes", "neighborhood", "shortest_path",
+                    "list_graphs", "graph_summaries", "list_documents"}
+
+# Исключения, которые передаются координатору с сохранением типа
+# (веб-интерфейс отвечает на них 404 и 400, а не 500)
+_REMOTE_ERRORS = {"LookupError": LookupError, "ValueError": ValueError}
+
+
+class ShardError(Exception):
+    """Ошибка выполнения операции на шарде"""
+
+
+def shard_for(key: str, num_shards: int) -> int:
+    """Номер шарда для ключа (стабилен между процессами)"""
+    return zlib.crc32(str(key).encode("utf-8")) % num_shards
+
+
+class _ShardServer:
+    """Обработчик запросов одного шарда"""
+
+    def __init__(self):
+        from services.data_service import StorageService
+        from services.ui_service import SearchService
+
+        self.storage = StorageService()
+        self.search = SearchService(self.storage, None)
+        self.lock = threading.RLock()
+
+    def handle(self, op: str, args: Sequence[Any], kwargs: Dict[str, Any]) -> Any:
+        with self.lock:
+            if op == "search_hits":
+                return self.search.search_hits(*args, **kwargs)
+            if op == "graphs":
+                return dict(self.storage.graphs)
+            if op == "documents":
+                return dict(self.storage.documents)
+            if op == "counts":
+                return self.storage.aggregates.totals()
+            if op == "aggregates":
+                return self.storage.aggregates.snapshot(*args, **kwargs)
+            if op in SHARD_OPERATIONS:
+                return getattr(self.storage, op)(*args, **kwargs)
+        raise ShardError(f"Неизвестная операция шарда: {op}")
+
+    def serve_connection(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    op, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", self.handle(op, args, kwargs)))
+                except LookupError as e:
+                    conn.send(("LookupError", str(e.args[0]) if e.args else ""))
+                except ValueError as e:
+                    conn.send(("ValueError", str(e)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def serve_shard(address: Any = None, authkey: Optional[bytes] = None,
+                ready: Optional[Connection] = None, family: Optional[str] = None):
+    """Запустить шард: принимает подключения и выполняет операции хранилища"""
+    server = _ShardServer()
+    with Listener(address, family=family, authkey=authkey) as listener:
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        logger.info("Шард слушает %s", listener.address)
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=server.serve_connection, args=(conn,), daemon=True).start()
+
+
+class _ShardClient:
+    """Подключение координатора к одному шарду"""
+
+    def __init__(self, address: Any, authkey: Optional[bytes]):
+        self.address = address
+        self.conn = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+
+    def send(self, op: str, *args, **kwargs):
+        self.conn.send((op, args, kwargs))
+
+    def receive(self) -> Any:
+        return self.unpack(self.conn.recv())
+
+    def unpack(self, reply: Tuple[str, Any]) -> Any:
+        """Результат ответа шарда или исключение того же вида, что и на шарде"""
+        status, result = reply
+        if status == "ok":
+            return result
+        if status in _REMOTE_ERRORS:
+            raise _REMOTE_ERRORS[status](result)
+        raise ShardError(f"Шард {self.address}: {result}")
+
+    def call(self, op: str, *args, **kwargs) -> Any:
+        with self.lock:
+            self.send(op, *args, **kwargs)
+            return self.receive()
+
+
+class ShardedStorageService:
+    """Хранилище с hash-партиционированием графов и документов по шардам"""
+
+    def __init__(self, num_shards: int = 4, addresses: Optional[List[Any]] = None,
+                 authkey: Optional[bytes] = None):
+        self.authkey = authkey or os.environ.get(SHARD_AUTHKEY_ENV, "").encode() or os.urandom(16)
+        self.indexes: Dict[str, Any] = {}
+        self._processes = []
+
+        if addresses is None:
+            addresses = [self._spawn_shard() for _ in range(num_shards)]
+        self.shards = [_ShardClient(address, self.authkey) for address in addresses]
+        atexit.register(self.close)
+        logger.info("Шардированное хранилище: %d шардов", len(self.shards))
+
+    def _spawn_shard(self) -> Any:
+        ctx = get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        family = "AF_UNIX" if hasattr(os, "fork") and sys.platform != "win32" else "AF_INET"
+        process = ctx.Process(target=serve_shard, args=(None, self.authkey, child_conn, family),
+                              daemon=True)
+        process.start()
+        child_conn.close()
+        address = parent_conn.recv()
+        parent_conn.close()
+        self._processes.append(process)
+        return address
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shards)
+
+    def _shard(self, key: str) -> _ShardClient:
+        return self.shards[shard_for(key, len(self.shards))]
+
+    def _scatter(self, op: str, *args, **kwargs) -> List[Any]:
+        """Отправить операцию на все шарды параллельно и собрать ответы"""
+        for shard in self.shards:  # фиксированный порядок блокировок
+            shard.lock.acquire()
+        sent: List[_ShardClient] = []
+        try:
+            try:
+                for shard in self.shards:
+                    shard.send(op, *args, **kwargs)
+                    sent.append(shard)
+            finally:
+                # Ответы читаются со всех шардов до разбора: иначе после ошибки на одном
+                # шарде непрочитанные ответы остальных достались бы следующим вызовам
+                replies = [shard.conn.recv() for shard in sent]
+        finally:
+            for shard in self.shards:
+                shard.lock.release()
+        return [shard.unpack(reply) for shard, reply in zip(self.shards, replies)]
+
+    @instrumented()
+    def save_graph(self, graph: KnowledgeGraph) -> str:
+        """Сохранить граф на шарде по его ID"""
+        return self._shard(graph.id).call("save_graph", graph)
+
+    def get_graph(self, graph_id: str) -> Optional[KnowledgeGraph]:
+        """Получить граф с шарда"""
+        return self._shard(graph_id).call("get_graph", graph_id)
+
+    @instrumented()
+    def add_entities(self, graph_id: str, entities: Iterable[Entity]) -> GraphChange:
+        """Добавить сущности в граф на его шарде"""
+        return self._shard(graph_id).call("add_entities", graph_id, list(entities))
+
+    @instrumented()
+    def remove_entities(self, graph_id: str, entity_ids: Iterable[str]) -> GraphChange:
+        """Удалить сущности графа на его шарде"""
+        return self._shard(graph_id).call("remove_entities", graph_id, list(entity_ids))
+
+    @instrumented()
+    def add_relations(self, graph_id: str, relations: Iterable[Relation]) -> GraphChange:
+        """Добавить отношения в граф на его шарде"""
+        return self._shard(graph_id).call("add_relations", graph_id, list(relations))
+
+    @instrumented()
+    def remove_relations(self, graph_id: str, relation_ids: Iterable[str]) -> GraphChange:
+        """Удалить отношения графа на его шарде"""
+        return self._shard(graph_id).call("remove_relations", graph_id, list(relation_ids))
+
+    @instrumented()
+    def merge_graph(self, graph_id: str, entities: Iterable[Entity],
+                    relations: Iterable[Relation] = ()) -> GraphChange:
+        """Объединить пакет извлечения с графом на его шарде (передается только пакет)"""
+        return self._shard(graph_id).call("merge_graph", graph_id, list(entities), list(relations))
+
+    def get_changes(self, graph_id: str, since_version: int = 0) -> List[GraphChange]:
+        """Журнал изменений графа с его шарда"""
+        return self._shard(graph_id).call("get_changes", graph_id, since_version)
+
+    @instrumented()
+    def neighborhood(self, graph_id: str, entity: str, hops: int = 1, **options) -> TraversalResult:
+        """Окрестность сущности: обход выполняется на шарде графа"""
+        return self._shard(graph_id).call("neighborhood", graph_id, entity, hops, **options)
+
+    @instrumented()
+    def shortest_path(self, graph_id: str, source: str, target: str, **options) -> TraversalResult:
+        """Кратчайший путь: поиск выполняется на шарде графа"""
+        return self._shard(graph_id).call("shortest_path", graph_id, source, target, **options)
+
+    @instrumented()
+    def save_document(self, data: TransformedData) -> str:
+        """Сохранить документ на шарде по его ID"""
+        return self._shard(data.id).call("save_document", data)
+
+    @instrumented()
+    def find_entities(self, entity_type: Optional[EntityType] = None) -> List[Entity]:
+        """Найти сущности по типу на всех шардах"""
+        return [entity for part in self._scatter("find_entities", entity_type) for entity in part]
+
+    @instrumented()
+    def scatter_search(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Поиск на всех шардах со слиянием локальных топ-k"""
+        parts = self._scatter("search_hits", text, limit)
+        return heapq.nlargest(limit, (hit for part in parts for hit in part),
+                              key=lambda hit: hit["relevance"])
+
+    def counts(self) -> Dict[str, int]:
+        """Итоговые счетчики по всем шардам"""
+        totals: Dict[str, int] = {}
+        for part in self._scatter("counts"):
+            for key, value in part.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    @property
+    def aggregates(self) -> AggregateStore:
+        """Агрегаты, объединенные со всех шардов (без разбивки по графам)"""
+        return AggregateStore.merged(self._scatter("aggregates", include_graphs=False))
+
+    def _merged_page(self, op: str, key, after, limit: int) -> List[Any]:
+        # Каждый шард отдает не больше limit элементов после ключа, страница - из их слияния
+        parts = self._scatter(op, after, limit)
+        return list(islice(heapq.merge(*parts, key=key), limit))
+
+    def list_graphs(self, after: Optional[GraphKey] = None, limit: int = 20) -> List[KnowledgeGraph]:
+        """Страница графов со всех шардов после ключа graph_order (не больше limit с шарда)"""
+        return self._merged_page("list_graphs", graph_order, after, limit)
+
+    def graph_summaries(self, after: Optional[GraphKey] = None,
+                        limit: int = 100) -> List[Dict[str, Any]]:
+        """Страница показателей графов без сущностей и отношений"""
+        return self._merged_page("graph_summaries", summary_order, after, limit)
+
+    def list_documents(self, after: Optional[str] = None, limit: int = 20) -> List[TransformedData]:
+        """Страница документов со всех шардов после ключа document_order"""
+        return self._merged_page("list_documents", document_order, after, limit)
+
+    @property
+    def graphs(self) -> Dict[str, KnowledgeGraph]:
+        """Все графы (полная копия со всех шардов; для страниц - list_graphs)"""
+        merged: Dict[str, KnowledgeGraph] = {}
+        for part in self._scatter("graphs"):
+            merged.update(part)
+        return merged
+
+    @property
+    def documents(self) -> Dict[str, TransformedData]:
+        """Все документы (полная копия со всех шардов; для страниц - list_documents)"""
+        merged: Dict[str, TransformedData] = {}
+        for part in self._scatter("documents"):
+            merged.update(part)
+        return merged
+
+    def close(self):
+        """Остановить локальные шарды и закрыть подключения
+
+        Шарды останавливает только процесс, который их запустил: по сети
+        остановить шард нельзя.
+        """
+        for shard in self.shards:
+            shard.conn.close()
+        for process in self._processes:
+            process.terminate()
+            process.join(timeout=1)
+        self.shards = []
+        self._processes = []
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    """Разобрать адрес узла вида host:port"""
+    host, _, port = value.strip().rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+if __name__ == "__main__":
+    # Отдельный узел-шард: python -m services.shard_service --listen 0.0.0.0:7001
+    parser = argparse.ArgumentParser(description="Узел шардированного хранилища")
+    parser.add_argument("--listen", required=True, help="host:port")
+    options = parser.parse_args()
+    key = os.environ.get(SHARD_AUTHKEY_ENV)
+    if not key:
+        parser.error(f"Задайте общий ключ в переменной {SHARD_AUTHKEY_ENV}")
+    logging.basicConfig(level=logging.INFO)
+    serve_shard(parse_address(options.listen), key.encode())
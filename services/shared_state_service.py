@@ -0,0 +1,696 @@
+"""
+Общее состояние для нескольких процессов веб-сервера: один писатель, снимки и журнал изменений
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from models.data_models import Entity, GraphChange, KnowledgeGraph, Relation, TransformedData
+from models.enums import EntityType
+from services.aggregate_service import AggregateStore
+from services.data_service import GraphKey, StorageService
+from services.graph_query_service import TraversalResult
+from services.metrics_service import instrumented, metrics
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_DIR_ENV = "KMS_SHARED_STATE_DIR"
+SHARED_STATE_WRITER_ENV = "KMS_SHARED_STATE_WRITER"
+SHARED_STATE_AUTHKEY_ENV = "KMS_SHARED_STATE_AUTHKEY"
+
+CURRENT_FILE = "CURRENT"
+HISTORIES_FILE = "histories.json"
+AUTHKEY_FILE = "authkey"
+SOCKET_FILE = "writer.sock"
+
+# Срок, на который процесс захватывает однократное действие (claim), секунд
+CLAIM_LEASE = 120.0
+
+# Методы StorageService, которые выполняет только писатель
+WRITE_OPERATIONS = {"save_graph", "save_document", "add_entities", "remove_entities",
+                    "add_relations", "remove_relations", "merge_graph", "get_changes"}
+
+# Запись журнала: версия и длина, затем операция (pickle)
+_RECORD_HEADER = struct.Struct(">QI")
+
+Change = Tuple[int, bytes]
+
+
+class SharedStateError(Exception):
+    """Ошибка обмена с процессом-писателем"""
+
+
+def writer_address(directory: str) -> Any:
+    """Адрес писателя: KMS_SHARED_STATE_WRITER (host:port) или сокет в каталоге состояния"""
+    value = os.environ.get(SHARED_STATE_WRITER_ENV)
+    if value:
+        host, _, port = value.strip().rpartition(":")
+        return host or "127.0.0.1", int(port)
+    return os.path.join(directory, SOCKET_FILE)
+
+
+def _address_family(address: Any) -> str:
+    return "AF_UNIX" if isinstance(address, str) else "AF_INET"
+
+
+def read_current(directory: str) -> Optional[Dict[str, Any]]:
+    """Указатель на последний опубликованный снимок"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(path: str, data: Any):
+    """Записать JSON атомарно: во временный файл, затем os.replace"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def apply_change(storage: StorageService, payload: bytes):
+    """Повторить на хранилище операцию из журнала"""
+    op, args, kwargs = pickle.loads(payload)
+    getattr(storage, op)(*args, **kwargs)
+
+
+def read_journal(path: str, offset: int = 0,
+                 end: Optional[int] = None) -> Iterator[Tuple[int, bytes, int]]:
+    """Записи журнала с позиции offset: версия, операция и позиция следующей записи
+
+    Недописанная запись в конце файла пропускается.
+    """
+    with open(path, "rb") as journal:
+        journal.seek(offset)
+        while end is None or offset < end:
+            header = journal.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            version, length = _RECORD_HEADER.unpack(header)
+            payload = journal.read(length)
+            if len(payload) < length:
+                return
+            offset += _RECORD_HEADER.size + length
+            yield version, payload, offset
+
+
+def _load_authkey(directory: str, create: bool = False) -> bytes:
+    key = os.environ.get(SHARED_STATE_AUTHKEY_ENV)
+    if key:
+        return key.encode()
+    path = os.path.join(directory, AUTHKEY_FILE)
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(16).hex().encode())
+    with open(path, "rb") as f:
+        return f.read().strip()
+
+
+class SharedStateWriter:
+    """Единственный писатель: применяет изменения и публикует их журналом
+
+    Каждая операция записи сохраняется как запись журнала с номером версии.
+    Изменения публикуются не чаще раза в publish_delay секунд: новые записи
+    дописываются в журнал текущего снимка, затем атомарно (os.replace) обновляется
+    CURRENT, и читатели применяют к своей копии только новые записи. Полный
+    снимок пишется, когда журнал дорастает до размера снимка (compact_ratio), а
+    последние recent_changes записей писатель отдает читателям и до публикации.
+    История чат-бота хранится в histories.json и переживает перезапуск писателя.
+    """
+
+    def __init__(self, directory: str, publish_delay: float = 0.2, keep: int = 3,
+                 compress: bool = False, compact_ratio: float = 1.0,
+                 recent_changes: int = 1000):
+        self.directory = directory
+        self.publish_delay = publish_delay
+        self.keep = keep
+        self.compress = compress
+        self.compact_ratio = compact_ratio
+        self.recent_changes = recent_changes
+        # Выполненные однократные действия и текущие захваты: имя -> (владелец, срок)
+        self.claims: Set[str] = set()
+        self._leases: Dict[str, Tuple[Any, float]] = {}
+        self.histories: Dict[str, List[Dict[str, Any]]] = {}
+        self._histories_dirty = False
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, HISTORIES_FILE), encoding="utf-8") as f:
+                self.histories = json.load(f)
+        except FileNotFoundError:
+            pass
+
+        # Опубликованный снимок и его журнал
+        self._snapshot: Optional[str] = None
+        self._snapshot_size = 0
+        self._base_version = 0
+        self._journal: Optional[str] = None
+        self._journal_size = 0
+        current = read_current(directory)
+        if current is not None:
+            self.storage = StorageService.load_snapshot(os.path.join(directory, current["path"]))
+            self.claims = set(current.get("claims", []))
+            self.version = self.published = current["version"]
+            self._snapshot = current["path"]
+            self._snapshot_size = os.path.getsize(os.path.join(directory, self._snapshot))
+            self._base_version = current.get("base_version", self.version)
+            self._journal = current.get("journal")
+            if self._journal:
+                self._replay_journal()
+            logger.info("Состояние восстановлено из версии %d", self.version)
+        else:
+            self.storage = StorageService()
+            self.version = self.published = 0
+
+        # Записи для следующей публикации и последние записи для читателей
+        self._pending: List[Change] = []
+        self._recent: Deque[Change] = deque()
+        self._recent_floor = self.version
+        self._changed = threading.Condition()
+        self._publish_lock = threading.Lock()
+        self._publisher = threading.Thread(target=self._publish_loop, name="kms-publisher",
+                                           daemon=True)
+        self._publisher.start()
+
+    def handle(self, op: str, args: Sequence[Any], kwargs: Dict[str, Any],
+               owner: Any = None) -> Tuple[Any, int]:
+        """Выполнить операцию; возвращает результат и версию, в которой он будет виден
+
+        owner - подключение, от имени которого захватываются однократные действия.
+        """
+        if op == "version":
+            return self.published, self.version
+        if op == "changes":
+            return self._changes_since(args[0]), self.version
+        if op == "publish":
+            return self.publish(), self.version
+        if op == "get_history":
+            with self._changed:
+                return list(self.histories.get(args[0], [])), self.version
+        if op == "append_history":
+            user_id, entries = args
+            with self._changed:
+                self.histories.setdefault(user_id, []).extend(entries)
+                self._histories_dirty = True
+                self._changed.notify_all()
+            return None, self.version
+        if op == "claim":
+            return self._claim(args[0], args[1] if len(args) > 1 else CLAIM_LEASE, owner), \
+                self.version
+        if op == "complete_claim":
+            with self._changed:
+                self._leases.pop(args[0], None)
+                if args[0] not in self.claims:
+                    self.claims.add(args[0])
+                    self._mark_changed()
+            return None, self.version
+        if op not in WRITE_OPERATIONS:
+            raise SharedStateError(f"Неизвестная операция: {op}")
+        if op == "get_changes":
+            return self.storage.get_changes(*args, **kwargs), self.version
+
+        # Запись журнала - операция с аргументами после выполнения, поэтому повтор
+        # дает то же состояние (например, с отметкой saved_at у документа)
+        with self.storage._lock:
+            result = getattr(self.storage, op)(*args, **kwargs)
+            payload = pickle.dumps((op, args, kwargs), pickle.HIGHEST_PROTOCOL)
+            with self._changed:
+                self._mark_changed()
+                version = self.version
+                self._pending.append((version, payload))
+                self._recent.append((version, payload))
+                while len(self._recent) > self.recent_changes:
+                    self._recent_floor = self._recent.popleft()[0]
+        return result, version
+
+    def _changes_since(self, since: int) -> Optional[List[Change]]:
+        """Записи новее since; None - писатель их уже не хранит (ждать публикации)"""
+        with self._changed:
+            if since < self._recent_floor:
+                return None
+            return [change for change in self._recent if change[0] > since]
+
+    def _replay_journal(self):
+        """Применить журнал опубликованного снимка (и записи, не попавшие в CURRENT)"""
+        path = os.path.join(self.directory, self._journal)
+        offset = 0
+        try:
+            for version, payload, offset in read_journal(path):
+                apply_change(self.storage, payload)
+                self.version = max(self.version, version)
+        except FileNotFoundError:
+            pass
+        else:
+            with open(path, "r+b") as journal:
+                journal.truncate(offset)  # недописанная запись
+        self._journal_size = offset
+
+    def _claim(self, name: str, lease: float, owner: Any) -> bool:
+        """Захватить действие, если оно не выполнено и не захвачено другим владельцем
+
+        Действие считается выполненным только после complete_claim; захват
+        снимается по истечении срока или при отключении владельца.
+        """
+        now = time.monotonic()
+        with self._changed:
+            if name in self.claims:
+                return False
+            holder = self._leases.get(name)
+            if holder is not None and holder[0] is not owner and holder[1] > now:
+                return False
+            self._leases[name] = (owner, now + lease)
+            return True
+
+    def release_claims(self, owner: Any):
+        """Снять незавершенные захваты владельца (подключение закрыто)"""
+        with self._changed:
+            for name in [name for name, (holder, _) in self._leases.items() if holder is owner]:
+                del self._leases[name]
+                logger.warning("Действие %s не завершено: захват снят", name)
+
+    def _mark_changed(self):
+        self.version += 1
+        self._changed.notify_all()
+
+    def _publish_loop(self):
+        while True:
+            with self._changed:
+                while self.published >= self.version and not self._histories_dirty:
+                    self._changed.wait()
+            time.sleep(self.publish_delay)  # объединяем серию изменений в один снимок
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Ошибка публикации снимка")
+                time.sleep(1.0)
+
+    def publish(self) -> int:
+        """Дописать новые записи в журнал (или записать снимок) и переключить CURRENT"""
+        with self._publish_lock:
+            self._save_histories()
+            started = time.perf_counter()
+            with self.storage._lock:
+                with self._changed:
+                    version = self.version
+                    claims = sorted(self.claims)
+                    changes, self._pending = self._pending, []
+                if version <= self.published:
+                    return self.published
+                compact = self._journal is None or \
+                    self._journal_size >= self._snapshot_size * self.compact_ratio
+                if compact:
+                    self._write_snapshot(version)
+            if not compact:
+                self._append_journal(changes)
+
+            pointer = {"version": version, "path": self._snapshot,
+                       "base_version": self._base_version, "journal": self._journal,
+                       "journal_size": self._journal_size, "claims": claims,
+                       "published_at": time.time()}
+            _write_json(os.path.join(self.directory, CURRENT_FILE), pointer)
+
+            with self._changed:
+                self.published = max(self.published, version)
+                self._changed.notify_all()
+            if compact:
+                self._remove_old_snapshots(self._snapshot)
+            metrics.observe("kms_shared_state_publish_seconds", time.perf_counter() - started,
+                            {"kind": "snapshot" if compact else "journal"})
+            logger.info("Опубликована версия %d (%s)", version,
+                        "снимок" if compact else f"записей журнала: {len(changes)}")
+            return version
+
+    def _write_snapshot(self, version: int):
+        """Полный снимок (под блокировкой хранилища) и пустой журнал к нему"""
+        name = f"snapshot-{version:010d}.kms"
+        path = os.path.join(self.directory, name)
+        self.storage.save_snapshot(path, compress=self.compress)
+        journal = name[:-len(".kms")] + ".journal"
+        open(os.path.join(self.directory, journal), "wb").close()
+        self._snapshot, self._snapshot_size = name, os.path.getsize(path)
+        self._journal, self._journal_size = journal, 0
+        self._base_version = version
+
+    def _append_journal(self, changes: List[Change]):
+        with open(os.path.join(self.directory, self._journal), "ab") as journal:
+            for version, payload in changes:
+                journal.write(_RECORD_HEADER.pack(version, len(payload)))
+                journal.write(payload)
+            self._journal_size = journal.tell()
+
+    def _save_histories(self):
+        with self._changed:
+            if not self._histories_dirty:
+                return
+            histories = {user_id: list(entries) for user_id, entries in self.histories.items()}
+            self._histories_dirty = False
+        _write_json(os.path.join(self.directory, HISTORIES_FILE), histories)
+
+    def _remove_old_snapshots(self, current: str):
+        # Читатели держат старый снимок через mmap; на POSIX удаление файла им не мешает
+        snapshots = sorted(name for name in os.listdir(self.directory)
+                           if name.startswith("snapshot-") and name.endswith(".kms"))
+        for name in snapshots[:-self.keep]:
+            if name != current:
+                for path in (name, name[:-len(".kms")] + ".journal"):
+                    try:
+                        os.remove(os.path.join(self.directory, path))
+                    except OSError:
+                        pass
+
+    def serve_connection(self, conn: Connection):
+        with conn:
+            try:
+                while True:
+                    try:
+                        op, args, kwargs = conn.recv()
+                    except (EOFError, OSError):
+                        return
+                    try:
+                        conn.send(("ok", self.handle(op, args, kwargs, owner=conn)))
+                    except Exception as e:
+                        conn.send(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                self.release_claims(conn)
+
+    def serve_forever(self, address: Any = None):
+        """Принимать подключения рабочих процессов"""
+        address = address or writer_address(self.directory)
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)  # сокет от предыдущего запуска
+        authkey = _load_authkey(self.directory, create=True)
+        with Listener(address, family=_address_family(address), authkey=authkey) as listener:
+            logger.info("Писатель общего состояния слушает %s", listener.address)
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+
+
+class SharedStorageService:
+    """Хранилище рабочего процесса: локальная копия состояния, запись через писателя
+
+    Процесс один раз загружает снимок, а затем раз в check_interval секунд читает
+    CURRENT и применяет к своей копии новые записи журнала. Полная загрузка
+    нужна только при старте или если процесс отстал больше, чем на один снимок.
+    Запись отправляется писателю, и процесс сразу забирает у него записи новее
+    своей версии, поэтому следующее чтение видит запись без ожидания публикации
+    (если писатель их уже не хранит - ждет публикации не дольше consistency_timeout).
+    После потери соединения (перезапуск писателя) процесс подключается заново.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 0.5,
+                 consistency_timeout: float = 2.0, connect_timeout: float = 10.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.consistency_timeout = consistency_timeout
+        self.connect_timeout = connect_timeout
+        self._local = StorageService()
+        self._version = 0
+        self._required_version = 0
+        self._checked_at = 0.0
+        # Снимок, от которого применяется журнал, и прочитанная часть журнала
+        self._base: Optional[str] = None
+        self._journal_offset = 0
+        self._state_lock = threading.RLock()
+        self._conn_lock = threading.Lock()
+        self._closed = False
+        self._conn = self._connect(connect_timeout)
+        self._refresh(force=True)
+
+    def _connect(self, timeout: float) -> Connection:
+        address = writer_address(self.directory)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(address, family=_address_family(address),
+                              authkey=_load_authkey(self.directory))
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise SharedStateError(
+                        f"Писатель общего состояния недоступен ({address}): запустите "
+                        f"python -m services.shared_state_service --dir {self.directory}") from e
+                time.sleep(0.1)
+
+    def _exchange(self, message: Tuple[str, tuple, Dict[str, Any]]) -> Any:
+        self._conn.send(message)
+        return self._conn.recv()
+
+    def _reconnect(self):
+        """Подключиться к писателю заново (под _conn_lock)"""
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+        self._conn = self._connect(self.connect_timeout)
+        metrics.inc("kms_shared_state_reconnects_total")
+        status, payload = self._exchange(("version", (), {}))
+        if status == "ok" and payload[1] < self._version:
+            # Писатель перезапущен без неопубликованных записей, которые процесс уже применил
+            logger.warning("Версия писателя %d меньше локальной %d: полная перезагрузка",
+                           payload[1], self._version)
+            with self._state_lock:
+                self._base = None
+                self._version = 0
+                self._checked_at = 0.0
+        logger.info("Соединение с писателем общего состояния восстановлено")
+
+    def _call(self, op: str, *args, **kwargs) -> Any:
+        with self._conn_lock:
+            if self._closed:
+                raise SharedStateError("Соединение с писателем закрыто")
+            message = (op, args, kwargs)
+            try:
+                status, payload = self._exchange(message)
+            except (EOFError, OSError) as e:
+                # Повтор после переподключения: операции записи идемпотентны по ID
+                logger.warning("Соединение с писателем потеряно (%s), переподключение", e)
+                self._reconnect()
+                status, payload = self._exchange(message)
+        if status != "ok":
+            raise SharedStateError(payload)
+        result, version = payload
+        return result, version
+
+    def _write(self, op: str, *args, **kwargs) -> Any:
+        result, version = self._call(op, *args, **kwargs)
+        self._required_version = max(self._required_version, version)
+        self._checked_at = 0.0
+        return result
+
+    # ---------- Версии и применение журнала ----------
+
+    @property
+    def version(self) -> int:
+        """Версия состояния, из которого читает процесс"""
+        return self._version
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval \
+                and self._version >= self._required_version:
+            return
+        if self._version < self._required_version:
+            self._pull_changes()
+        deadline = now + self.consistency_timeout
+        while True:
+            self._checked_at = time.monotonic()
+            current = read_current(self.directory)
+            if current is not None and current["version"] > self._version:
+                self._advance(current)
+            if self._version >= self._required_version or time.monotonic() >= deadline:
+                return
+            time.sleep(0.02)
+
+    def _pull_changes(self):
+        """Забрать у писателя записи новее своей версии (своя запись видна сразу)"""
+        changes, version = self._call("changes", self._version)
+        if changes is None:
+            return  # писатель их уже не хранит - дождемся публикации
+        with self._state_lock:
+            if all(self._apply(change_version, payload) for change_version, payload in changes):
+                self._version = max(self._version, version)
+
+    def _apply(self, version: int, payload: bytes) -> bool:
+        """Применить запись, если она новее своей версии; False - копия разошлась с писателем"""
+        if version <= self._version:
+            return True
+        try:
+            apply_change(self._local, payload)
+        except Exception:
+            logger.exception("Ошибка применения записи %d: полная перезагрузка", version)
+            self._base = None
+            self._version = 0
+            return False
+        self._version = version
+        metrics.inc("kms_shared_state_changes_applied_total")
+        return True
+
+    def _advance(self, current: Dict[str, Any]):
+        with self._state_lock:
+            if current["version"] <= self._version:
+                return
+            base_version = current.get("base_version", current["version"])
+            if current["path"] != self._base:
+                if self._base is None or self._version < base_version:
+                    path = os.path.join(self.directory, current["path"])
+                    try:
+                        storage = StorageService.load_snapshot(path)
+                    except FileNotFoundError:
+                        return  # снимок уже заменен более новым - возьмем его при следующей проверке
+                    self._local = storage  # подмена ссылки атомарна для читающих потоков
+                    self._version = base_version
+                    metrics.inc("kms_shared_state_swaps_total")
+                    logger.info("Загружен снимок общего состояния версии %d", base_version)
+                # Процесс не старше снимка: дальше читается журнал нового снимка
+                self._base = current["path"]
+                self._journal_offset = 0
+
+            journal = current.get("journal")
+            if journal:
+                path = os.path.join(self.directory, journal)
+                try:
+                    for version, payload, offset in read_journal(path, self._journal_offset,
+                                                                 current["journal_size"]):
+                        if not self._apply(version, payload):
+                            return
+                        self._journal_offset = offset
+                except FileNotFoundError:
+                    return  # журнал удален вместе со старым снимком
+            self._version = max(self._version, current["version"])
+
+    @property
+    def storage(self) -> StorageService:
+        """Локальная копия общего состояния"""
+        self._refresh()
+        return self._local
+
+    # ---------- Чтение ----------
+
+    @property
+    def graphs(self) -> Dict[str, KnowledgeGraph]:
+        return self.storage.graphs
+
+    @property
+    def documents(self) -> Dict[str, TransformedData]:
+        return self.storage.documents
+
+    @property
+    def indexes(self) -> Dict[str, Any]:
+        return self.storage.indexes
+
+    @property
+    def aggregates(self) -> AggregateStore:
+        return self.storage.aggregates
+
+    def get_graph(self, graph_id: str) -> Optional[KnowledgeGraph]:
+        return self.storage.get_graph(graph_id)
+
+    def find_entities(self, entity_type: Optional[EntityType] = None) -> List[Entity]:
+        return self.storage.find_entities(entity_type)
+
+    def list_graphs(self, after: Optional[GraphKey] = None, limit: int = 20) -> List[KnowledgeGraph]:
+        return self.storage.list_graphs(after, limit)
+
+    def graph_summaries(self, after: Optional[GraphKey] = None,
+                        limit: int = 100) -> List[Dict[str, Any]]:
+        return self.storage.graph_summaries(after, limit)
+
+    def list_documents(self, after: Optional[str] = None, limit: int = 20) -> List[TransformedData]:
+        return self.storage.list_documents(after, limit)
+
+    def neighborhood(self, graph_id: str, entity: str, hops: int = 1, **options) -> TraversalResult:
+        return self.storage.neighborhood(graph_id, entity, hops, **options)
+
+    def shortest_path(self, graph_id: str, source: str, target: str, **options) -> TraversalResult:
+        return self.storage.shortest_path(graph_id, source, target, **options)
+
+    # ---------- Запись (через писателя) ----------
+
+    @instrumented()
+    def save_graph(self, graph: KnowledgeGraph) -> str:
+        return self._write("save_graph", graph)
+
+    @instrumented()
+    def save_document(self, data: TransformedData) -> str:
+        return self._write("save_document", data)
+
+    @instrumented()
+    def add_entities(self, graph_id: str, entities: Iterable[Entity]) -> GraphChange:
+        return self._write("add_entities", graph_id, list(entities))
+
+    @instrumented()
+    def remove_entities(self, graph_id: str, entity_ids: Iterable[str]) -> GraphChange:
+        return self._write("remove_entities", graph_id, list(entity_ids))
+
+    @instrumented()
+    def add_relations(self, graph_id: str, relations: Iterable[Relation]) -> GraphChange:
+        return self._write("add_relations", graph_id, list(relations))
+
+    @instrumented()
+    def remove_relations(self, graph_id: str, relation_ids: Iterable[str]) -> GraphChange:
+        return self._write("remove_relations", graph_id, list(relation_ids))
+
+    @instrumented()
+    def merge_graph(self, graph_id: str, entities: Iterable[Entity],
+                    relations: Iterable[Relation] = ()) -> GraphChange:
+        return self._write("merge_graph", graph_id, list(entities), list(relations))
+
+    def get_changes(self, graph_id: str, since_version: int = 0) -> List[GraphChange]:
+        """Журнал изменений хранится у писателя"""
+        return self._call("get_changes", graph_id, since_version)[0]
+
+    def claim(self, name: str, lease: float = CLAIM_LEASE) -> bool:
+        """Захватить однократное действие на все процессы (например, загрузку демо-данных)
+
+        После выполнения нужно вызвать complete_claim; если процесс завершится
+        раньше или не уложится в lease секунд, действие сможет захватить другой.
+        """
+        return self._write("claim", name, lease)
+
+    def complete_claim(self, name: str):
+        """Отметить захваченное действие выполненным"""
+        self._write("complete_claim", name)
+
+    def publish(self) -> int:
+        """Опубликовать накопленные изменения немедленно"""
+        return self._write("publish")
+
+    # ---------- История чат-бота ----------
+
+    def append_history(self, user_id: str, entries: List[Dict[str, Any]]):
+        self._call("append_history", user_id, entries)
+
+    def get_history(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._call("get_history", user_id)[0]
+
+    def close(self):
+        with self._conn_lock:
+            self._closed = True
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Писатель: python -m services.shared_state_service --dir /var/lib/kms
+    parser = argparse.ArgumentParser(description="Писатель общего состояния веб-сервера")
+    parser.add_argument("--dir", default=os.environ.get(SHARED_STATE_DIR_ENV),
+                        help=f"каталог снимков (по умолчанию ${SHARED_STATE_DIR_ENV})")
+    parser.add_argument("--listen", help="host:port вместо сокета в каталоге")
+    parser.add_argument("--publish-delay", type=float, default=0.2)
+    options = parser.parse_args()
+    if not options.dir:
+        parser.error("Укажите каталог состояния (--dir)")
+    if options.listen:
+        os.environ[SHARED_STATE_WRITER_ENV] = options.listen
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    SharedStateWriter(options.dir, publish_delay=options.publish_delay).serve_forever()
@@ -0,0 +1,480 @@
+"""
+Бинарные снимки хранилища: версионированный колоночный формат
+"""
+import base64
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import UUID
+
+from models import enums
+from models.data_models import Entity, Relation, KnowledgeGraph, TransformedData
+from models.enums import EntityType, RelationType, StorageType
+from models.ids import CompactId, parse_id
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"KMSSNAP\0"
+# Версия 2: колонки идентификаторов типа "Q" для CompactId (версия 1 - только строки)
+# Версия 3: типизированный JSON содержимого документов и свойств сущностей
+SNAPSHOT_VERSION = 3
+
+# Заголовок: сигнатура, версия формата, флаги, число секций
+_HEADER = struct.Struct("<8sHHI")
+# Запись таблицы секций (после имени): тип, смещение, длина на диске, исходная длина
+_SECTION = struct.Struct("<cQQQ")
+_NAME_LEN = struct.Struct("<H")
+
+FLAG_COMPRESSED = 0x1
+NO_STRING = 0xFFFFFFFF
+NO_ID = 0  # пустой CompactId в колонке "Q"
+INDEX_PREFIX = "index."
+# Ключ служебного объекта типизированного JSON: {"$kms": "datetime", "v": "..."}
+JSON_TAG = "$kms"
+
+_ALIGN = 8
+
+
+class SnapshotError(Exception):
+    """Ошибка чтения или записи снимка"""
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder != "little" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class SnapshotWriter:
+    """Запись снимка: таблица строк и колонки фиксированного типа"""
+
+    def __init__(self, compress: bool = False, level: int = 6):
+        self.compress = compress
+        self.level = level
+        self._strings: Dict[str, int] = {}
+        self._sections: List[Tuple[str, bytes, bytes]] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        """Номер строки в таблице строк (повторы хранятся один раз)"""
+        if value is None:
+            return NO_STRING
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+        return index
+
+    def add_column(self, name: str, typecode: str, values) -> None:
+        """Добавить числовую колонку (array.array typecode)"""
+        column = values if isinstance(values, array) else array(typecode, values)
+        self._sections.append((name, typecode.encode(), _to_little_endian(column)))
+
+    def add_ids(self, name: str, values: List[Any]) -> None:
+        """Колонка идентификаторов: числа, если все они CompactId, иначе номера строк"""
+        if values and all(type(v) is CompactId or v is None for v in values):
+            self.add_column(name, "Q", (NO_ID if v is None else v for v in values))
+        else:
+            self.add_column(name, "I", (self.intern(None if v is None else str(v)) for v in values))
+
+    def add_blob(self, name: str, data: Union[bytes, bytearray, memoryview]) -> None:
+        """Добавить произвольные байты (например, готовый индекс)"""
+        self._sections.append((name, b"B", bytes(data)))
+
+    def _string_sections(self) -> List[Tuple[str, bytes, bytes]]:
+        offsets = array("Q", [0])
+        blob = bytearray()
+        for value in self._strings:  # порядок вставки совпадает с номерами
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+        return [("strings.offsets", b"Q", _to_little_endian(offsets)),
+                ("strings.data", b"B", bytes(blob))]
+
+    def write(self, path: str) -> int:
+        """Записать снимок атомарно; возвращает размер файла"""
+        sections = self._string_sections() + self._sections
+        payloads = []
+        for name, typecode, raw in sections:
+            data = zlib.compress(raw, self.level) if self.compress else raw
+            payloads.append((name.encode("utf-8"), typecode, data, len(raw)))
+
+        table_size = sum(_NAME_LEN.size + len(n) + _SECTION.size for n, _, _, _ in payloads)
+        offset = _HEADER.size + table_size
+        entries = []
+        for name, typecode, data, raw_len in payloads:
+            offset += -offset % _ALIGN
+            entries.append((name, typecode, offset, len(data), raw_len))
+            offset += len(data)
+
+        flags = FLAG_COMPRESSED if self.compress else 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, len(entries)))
+            for name, typecode, start, length, raw_len in entries:
+                f.write(_NAME_LEN.pack(len(name)) + name)
+                f.write(_SECTION.pack(typecode, start, length, raw_len))
+            for (_, _, data, _), (_, _, start, _, _) in zip(payloads, entries):
+                f.write(b"\0" * (start - f.tell()))
+                f.write(data)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        return size
+
+
+class SnapshotReader:
+    """Чтение снимка через mmap; несжатые колонки не копируются"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"Пустой файл снимка: {path}")
+        self._view = memoryview(self._mmap)
+        # Выданные memoryview: освобождаются в close(), иначе mmap не закрыть
+        self._views: List[memoryview] = []
+        self.sections: Dict[str, Tuple[str, int, int, int]] = {}
+        self._read_table()
+        self._strings: Optional[List[str]] = None
+
+    def _read_table(self):
+        if len(self._mmap) < _HEADER.size:
+            raise SnapshotError(f"Поврежденный снимок: {self.path}")
+        magic, version, flags, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"Неизвестный формат снимка: {self.path}")
+        if version > SNAPSHOT_VERSION:
+            raise SnapshotError(f"Неподдерживаемая версия снимка: {version}")
+        self.version = version
+        self.flags = flags
+
+        pos = _HEADER.size
+        for _ in range(count):
+            (name_len,) = _NAME_LEN.unpack_from(self._mmap, pos)
+            pos += _NAME_LEN.size
+            name = bytes(self._mmap[pos:pos + name_len]).decode("utf-8")
+            pos += name_len
+            typecode, start, length, raw_len = _SECTION.unpack_from(self._mmap, pos)
+            pos += _SECTION.size
+            self.sections[name] = (typecode.decode(), start, length, raw_len)
+
+    def _raw(self, name: str) -> Union[bytes, memoryview]:
+        if name not in self.sections:
+            raise SnapshotError(f"Секция не найдена: {name}")
+        _, start, length, raw_len = self.sections[name]
+        data = self._view[start:start + length]
+        if length != raw_len or self.flags & FLAG_COMPRESSED:
+            return zlib.decompress(data)
+        return data
+
+    def _track(self, view: memoryview) -> memoryview:
+        self._views.append(view)
+        return view
+
+    def column(self, name: str) -> memoryview:
+        """Колонка как типизированный memoryview (действует до close())"""
+        typecode = self.sections[name][0] if name in self.sections else "B"
+        data = self._raw(name)
+        if sys.byteorder != "little" and typecode != "B":
+            values = array(typecode, bytes(data))
+            values.byteswap()
+            return memoryview(values)
+        if isinstance(data, memoryview):
+            self._track(data)
+        return self._track(memoryview(data).cast(typecode))
+
+    def blob(self, name: str) -> memoryview:
+        """Секция как байты без копирования (действует до close())"""
+        data = self._raw(name)
+        return self._track(data) if isinstance(data, memoryview) else memoryview(data)
+
+    def ids(self, name: str) -> List[Any]:
+        """Колонка идентификаторов (CompactId или строки - по типу секции)"""
+        column = self.column(name)
+        try:
+            if column.format == "Q":
+                return [None if v == NO_ID else CompactId(v) for v in column]
+            # Строковые ID; CompactId из смешанной колонки восстанавливаются разбором
+            strings = self.strings()
+            return [None if v == NO_STRING else parse_id(strings[v]) for v in column]
+        finally:
+            column.release()
+
+    def strings(self) -> List[str]:
+        """Таблица строк"""
+        if self._strings is None:
+            offsets = self.column("strings.offsets")
+            raw = self._raw("strings.data")
+            data = bytes(raw)
+            if isinstance(raw, memoryview):
+                raw.release()
+            self._strings = [sys.intern(data[offsets[i]:offsets[i + 1]].decode("utf-8"))
+                             for i in range(len(offsets) - 1)]
+            offsets.release()
+        return self._strings
+
+    def close(self):
+        """Освободить выданные memoryview и закрыть файл"""
+        if self._mmap.closed:
+            return
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _encode(value: Any) -> Any:
+    """Значение в JSON-совместимый вид; типы, которых нет в JSON, помечаются тегом"""
+    if isinstance(value, Enum):
+        if getattr(enums, type(value).__name__, None) is not type(value):
+            raise SnapshotError(f"Перечисление {type(value).__name__} не сохраняется в снимок")
+        return {JSON_TAG: "enum", "type": type(value).__name__, "v": value.value}
+    if value is None or isinstance(value, (bool, str, float)):
+        return value
+    if isinstance(value, CompactId):
+        return {JSON_TAG: "id", "v": str(value)}
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        if JSON_TAG not in value and all(type(key) is str for key in value):
+            return {key: _encode(item) for key, item in value.items()}
+        return {JSON_TAG: "dict", "v": [[_encode(key), _encode(item)] for key, item in value.items()]}
+    if isinstance(value, datetime):
+        return {JSON_TAG: "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {JSON_TAG: "date", "v": value.isoformat()}
+    if isinstance(value, tuple):
+        return {JSON_TAG: "tuple", "v": [_encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {JSON_TAG: "set", "v": [_encode(item) for item in value]}
+    if isinstance(value, (bytes, bytearray)):
+        return {JSON_TAG: "bytes", "v": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Decimal):
+        return {JSON_TAG: "decimal", "v": str(value)}
+    if isinstance(value, UUID):
+        return {JSON_TAG: "uuid", "v": str(value)}
+    raise SnapshotError(f"Значение типа {type(value).__name__} не сохраняется в снимок")
+
+
+_DECODERS = {
+    "enum": lambda obj: getattr(enums, obj["type"])(obj["v"]),
+    "id": lambda obj: CompactId.parse(obj["v"]),
+    "dict": lambda obj: {key: item for key, item in obj["v"]},
+    "datetime": lambda obj: datetime.fromisoformat(obj["v"]),
+    "date": lambda obj: date.fromisoformat(obj["v"]),
+    "tuple": lambda obj: tuple(obj["v"]),
+    "set": lambda obj: set(obj["v"]),
+    "bytes": lambda obj: base64.b64decode(obj["v"]),
+    "decimal": lambda obj: Decimal(obj["v"]),
+    "uuid": lambda obj: UUID(obj["v"]),
+}
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    tag = obj.get(JSON_TAG)
+    if tag is None:
+        return obj
+    decoder = _DECODERS.get(tag)
+    if decoder is None:
+        raise SnapshotError(f"Неизвестный тип значения в снимке: {tag}")
+    return decoder(obj)
+
+
+def _dump_json(value: Any) -> str:
+    return json.dumps(_encode(value), ensure_ascii=False, sort_keys=True)
+
+
+def _load_json(text: str) -> Any:
+    return json.loads(text, object_hook=_decode_object)
+
+
+def dump_storage(storage, path: str, indexes: Optional[Dict[str, Any]] = None,
+                 compress: bool = False) -> int:
+    """Сохранить графы, документы и индексы хранилища в снимок"""
+    writer = SnapshotWriter(compress=compress)
+    s = writer.intern
+
+    graphs = list(storage.graphs.values())
+    graph_ids: List[Any] = []
+    graph_names = array("I")
+    graph_created = array("d")
+    entity_bounds = array("Q", [0])
+    relation_bounds = array("Q", [0])
+
+    entity_ids: List[Any] = []
+    entity_cols = {k: array("I") for k in ("name", "type", "properties")}
+    entity_confidence = array("d")
+    relation_ids = {k: [] for k in ("id", "source", "target")}
+    relation_types = array("I")
+    relation_strength = array("d")
+
+    for graph in graphs:
+        graph_ids.append(graph.id)
+        graph_names.append(s(graph.name))
+        graph_created.append(graph.created_at.timestamp())
+        for entity in graph.entities:
+            entity_ids.append(entity.id)
+            entity_cols["name"].append(s(entity.name))
+            entity_cols["type"].append(s(entity.entity_type.value))
+            entity_cols["properties"].append(
+                s(_dump_json(entity.properties)) if entity.properties else NO_STRING)
+            entity_confidence.append(entity.confidence)
+        for relation in graph.relations:
+            relation_ids["id"].append(relation.id)
+            relation_ids["source"].append(relation.source_entity_id)
+            relation_ids["target"].append(relation.target_entity_id)
+            relation_types.append(s(relation.relation_type.value))
+            relation_strength.append(relation.strength)
+        entity_bounds.append(len(entity_confidence))
+        relation_bounds.append(len(relation_strength))
+
+    document_ids = {k: [] for k in ("id", "source_id")}
+    document_cols = {k: array("I") for k in ("format", "storage_type", "content", "metadata")}
+    for doc in storage.documents.values():
+        document_ids["id"].append(doc.id)
+        document_ids["source_id"].append(doc.source_id)
+        document_cols["format"].append(s(doc.format))
+        document_cols["storage_type"].append(s(doc.storage_type.value))
+        document_cols["content"].append(s(_dump_json(doc.content)))
+        document_cols["metadata"].append(s(_dump_json(doc.metadata)))
+
+    writer.add_ids("graphs.id", graph_ids)
+    writer.add_column("graphs.name", "I", graph_names)
+    writer.add_column("graphs.created_at", "d", graph_created)
+    writer.add_column("graphs.entity_bounds", "Q", entity_bounds)
+    writer.add_column("graphs.relation_bounds", "Q", relation_bounds)
+    writer.add_ids("entities.id", entity_ids)
+    for name, column in entity_cols.items():
+        writer.add_column(f"entities.{name}", "I", column)
+    writer.add_column("entities.confidence", "d", entity_confidence)
+    for name, values in relation_ids.items():
+        writer.add_ids(f"relations.{name}", values)
+    writer.add_column("relations.type", "I", relation_types)
+    writer.add_column("relations.strength", "d", relation_strength)
+    for name, values in document_ids.items():
+        writer.add_ids(f"documents.{name}", values)
+    for name, column in document_cols.items():
+        writer.add_column(f"documents.{name}", "I", column)
+
+    for name, data in (indexes or {}).items():
+        if isinstance(data, array):
+            writer.add_column(INDEX_PREFIX + name, data.typecode, data)
+        else:
+            writer.add_blob(INDEX_PREFIX + name, data)
+
+    size = writer.write(path)
+    logger.info("Снимок записан: %s (%d графов, %d документов, %d байт)",
+                path, len(graphs), len(storage.documents), size)
+    return size
+
+
+def load_storage(path: str, storage_cls=None
+                 ) -> Tuple[Any, Dict[str, memoryview], Optional[SnapshotReader]]:
+    """Загрузить хранилище и индексы из снимка
+
+    Индексы - memoryview поверх mmap; возвращаемый читатель нужно закрыть
+    (SnapshotReader.close), когда индексы больше не нужны. Без индексов
+    файл закрывается сразу и вместо читателя возвращается None.
+    """
+    if storage_cls is None:
+        from services.data_service import StorageService
+        storage_cls = StorageService
+
+    reader = SnapshotReader(path)
+    strings = reader.strings()
+
+    def column(name: str) -> memoryview:
+        return reader.column(name)
+
+    entity_types = {t.value: t for t in EntityType}
+    relation_types = {t.value: t for t in RelationType}
+    storage_types = {t.value: t for t in StorageType}
+
+    e_id = reader.ids("entities.id")
+    e_name, e_type, e_props = (column(f"entities.{k}") for k in ("name", "type", "properties"))
+    e_conf = column("entities.confidence")
+    r_id, r_src, r_tgt = (reader.ids(f"relations.{k}") for k in ("id", "source", "target"))
+    r_type = column("relations.type")
+    r_strength = column("relations.strength")
+    entity_bounds = column("graphs.entity_bounds")
+    relation_bounds = column("graphs.relation_bounds")
+    created = column("graphs.created_at")
+
+    graph_names = column("graphs.name")
+    storage = storage_cls()
+    for g, (gid, gname) in enumerate(zip(reader.ids("graphs.id"), graph_names)):
+        entities = [
+            Entity(
+                id=e_id[i],
+                name=strings[e_name[i]],
+                entity_type=entity_types[strings[e_type[i]]],
+                confidence=e_conf[i],
+                properties=_load_json(strings[e_props[i]]) if e_props[i] != NO_STRING else {},
+            )
+            for i in range(entity_bounds[g], entity_bounds[g + 1])
+        ]
+        relations = [
+            Relation(
+                id=r_id[i],
+                source_entity_id=r_src[i],
+                target_entity_id=r_tgt[i],
+                relation_type=relation_types[strings[r_type[i]]],
+                strength=r_strength[i],
+            )
+            for i in range(relation_bounds[g], relation_bounds[g + 1])
+        ]
+        graph = KnowledgeGraph(
+            id=gid,
+            name=strings[gname],
+            entities=entities,
+            relations=relations,
+            created_at=datetime.fromtimestamp(created[g]),
+        )
+        storage.graphs[graph.id] = graph
+
+    d_cols = [column(f"documents.{k}") for k in ("format", "storage_type", "content", "metadata")]
+    d_ids = [reader.ids(f"documents.{k}") for k in ("id", "source_id")]
+    for d_id, d_src, d_fmt, d_st, d_content, d_meta in zip(*d_ids, *d_cols):
+        doc = TransformedData(
+            id=d_id,
+            source_id=d_src,
+            content=_load_json(strings[d_content]),
+            format=strings[d_fmt],
+            storage_type=storage_types[strings[d_st]],
+            metadata=_load_json(strings[d_meta]),
+        )
+        storage.documents[doc.id] = doc
+
+    for view in (e_name, e_type, e_props, e_conf, r_type, r_strength, entity_bounds, relation_bounds,
+                 created, graph_names, *d_cols):
+        view.release()
+
+    indexes = {name[len(INDEX_PREFIX):]: reader.column(name)
+               for name in reader.sections if name.startswith(INDEX_PREFIX)}
+    if not indexes:
+        reader.close()
+        reader = None
+
+    logger.info("Снимок загружен: %s (%d графов, %d документов)",
+                path, len(storage.graphs), len(storage.documents))
+    return storage, indexes, reader
@@ -1,8 +1,21 @@
-﻿from typing import List, Dict, Any, Optional
+﻿import csv
+import heapq
+import io
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 from models.user_models import User, UserQuery, SearchResult, Report
 from models.data_models import KnowledgeGraph
-from models.enums import EntityType
+from models.enums import EntityType, RelationType
+from services.graph_query_service import DEFAULT_LIMIT, MAX_HOPS, TraversalResult
+from services.metrics_service import instrumented
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("CSV", "JSON", "NDJSON")
+
 class SearchService:
     """Сервис поиска"""
     
@@ -10,43 +23,49 @@ class SearchService:
         self.storage_service = storage_service
         self.analysis_service = analysis_service
     
-    def semantic_search(self, query: UserQuery) -> List[SearchResult]:
+    @instrumented()
+    def semantic_search(self, query: UserQuery, limit: int = 10) -> List[SearchResult]:
         """Семантический поиск"""
-        print(f"Семантический поиск: {query.text}")
+        logger.info("Семантический поиск: %s", query.text)
         
-        results = []
+        # Шардированное хранилище ищет на каждом шарде и сливает топ-k
+        scatter_search = getattr(self.storage_service, "scatter_search", None)
+        if scatter_search is not None:
+            hits = scatter_search(query.text, limit)
+        else:
+            hits = self.search_hits(query.text, limit)
+        
+        return [SearchResult(query_id=query.id, **hit) for hit in hits]
+    
+    def search_hits(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Топ-k совпадений в локальном хранилище (без привязки к запросу)"""
+        hits = []
         
         # Поиск в графах знаний
-        for graph_id, graph in self.storage_service.graphs.items():
-            relevance = self._calculate_relevance(graph, query.text)
+        for graph_id, graph in list(self.storage_service.graphs.items()):
+            relevance = self._calculate_relevance(graph, text)
             if relevance > 0:
-                result = SearchResult(
-                    query_id=query.id,
-                    title=graph.name,
-                    snippet=f"Граф знаний с {len(graph.entities)} сущностями",
-                    relevance=relevance,
-                    data_type="GRAPH",
-                    source="knowledge_base"
-                )
-                results.append(result)
+                hits.append({
+                    "title": graph.name,
+                    "snippet": f"Граф знаний с {len(graph.entities)} сущностями",
+                    "relevance": relevance,
+                    "data_type": "GRAPH",
+                    "source": "knowledge_base"
+                })
         
         # Поиск в документах
-        for doc_id, doc in self.storage_service.documents.items():
-            if query.text.lower() in str(doc.content).lower():
-                result = SearchResult(
-                    query_id=query.id,
-                    title=f"Документ {doc.id[:8]}",
-                    snippet=str(doc.content)[:100] + "...",
-                    relevance=0.7,
-                    data_type="DOCUMENT",
-                    source="document_store"
-                )
-                results.append(result)
-        
-        # Сортировка по релевантности
-        results.sort(key=lambda x: x.relevance, reverse=True)
-        
-        return results[:10]  # Возвращаем топ-10 результатов
+        for doc_id, doc in list(self.storage_service.documents.items()):
+            if text.lower() in str(doc.content).lower():
+                hits.append({
+                    "title": f"Документ {doc.id}",
+                    "snippet": str(doc.content)[:100] + "...",
+                    "relevance": 0.7,
+                    "data_type": "DOCUMENT",
+                    "source": "document_store"
+                })
+        
+        # Топ-k по релевантности (порядок равных сохраняется)
+        return heapq.nlargest(limit, hits, key=lambda hit: hit["relevance"])
     
     def _calculate_relevance(self, graph: KnowledgeGraph, query: str) -> float:
         """Рассчитать релевантность графа запросу"""
@@ -74,6 +93,7 @@ class SearchService:
         
         return min(relevance, 1.0)  # Ограничиваем максимум 1.0
     
+    @instrumented()
     def suggest_queries(self, partial_query: str) -> List[str]:
         """Предложить варианты запросов"""
         suggestions = [
@@ -92,10 +112,44 @@ class SearchService:
             filtered.extend(suggestions[:3-len(filtered)])
         
         return filtered
+    
+    @instrumented()
+    def explore_neighborhood(self, graph_id: str, entity: str, hops: int = 2,
+                             relation_types: Optional[Iterable[Any]] = None,
+                             entity_types: Optional[Iterable[Any]] = None,
+                             direction: str = "both", limit: int = DEFAULT_LIMIT,
+                             timeout: Optional[float] = 1.0) -> TraversalResult:
+        """Что находится в hops шагах от сущности; типы можно передать строками"""
+        return self.storage_service.neighborhood(
+            graph_id, entity, hops,
+            relation_types=self._enum_values(RelationType, relation_types),
+            entity_types=self._enum_values(EntityType, entity_types),
+            direction=direction, limit=limit, timeout=timeout
+        )
+    
+    @instrumented()
+    def find_path(self, graph_id: str, source: str, target: str, max_hops: int = MAX_HOPS,
+                  relation_types: Optional[Iterable[Any]] = None,
+                  entity_types: Optional[Iterable[Any]] = None,
+                  direction: str = "both", timeout: Optional[float] = 1.0) -> TraversalResult:
+        """Кратчайшая цепочка связей между двумя сущностями графа"""
+        return self.storage_service.shortest_path(
+            graph_id, source, target, max_hops=max_hops,
+            relation_types=self._enum_values(RelationType, relation_types),
+            entity_types=self._enum_values(EntityType, entity_types),
+            direction=direction, timeout=timeout
+        )
+    
+    @staticmethod
+    def _enum_values(enum_cls, values: Optional[Iterable[Any]]) -> Optional[List[Any]]:
+        if not values:
+            return None
+        return [v if isinstance(v, enum_cls) else enum_cls(str(v).strip().upper()) for v in values]
 
 class ReportService:
     """Сервис генерации отчетов"""
     
+    @instrumented()
     def generate_report(self, title: str, content: Any, 
                        user_id: str, format: str = "TEXT") -> Report:
         """Сгенерировать отчет"""
@@ -106,33 +160,113 @@ class ReportService:
             created_by=user_id
         )
         
-        print(f"Сгенерирован отчет: {title}")
+        logger.info("Сгенерирован отчет: %s", title)
         return report
     
+    @instrumented()
     def export_report(self, report: Report, export_format: str) -> Dict[str, Any]:
         """Экспортировать отчет в другой формат"""
         return {
-            "report_id": report.id,
+            "report_id": str(report.id),
             "title": report.title,
             "format": export_format,
-            "content": f"Экспортированный отчет: {report.title}",
+            "content": "".join(self.iter_export(report, export_format)),
             "exported_at": datetime.now().isoformat()
         }
+    
+    def iter_export(self, report: Report, export_format: str,
+                    chunk_rows: int = 500) -> Iterator[str]:
+        """Потоковый экспорт отчета частями (CSV, JSON, NDJSON)
+        
+        Формат проверяется при вызове, а не при первом чтении потока.
+        """
+        export_format = export_format.upper()
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат экспорта: {export_format}")
+        return self._iter_export(report, export_format, chunk_rows)
+    
+    def _iter_export(self, report: Report, export_format: str,
+                     chunk_rows: int) -> Iterator[str]:
+        columns, rows = self._report_table(report)
+        if export_format == "CSV":
+            yield from self._iter_csv(columns, rows, chunk_rows)
+        elif export_format == "NDJSON":
+            yield from self._iter_ndjson(rows, chunk_rows)
+        else:
+            yield from self._iter_json(report, columns, rows, chunk_rows)
+    
+    def _report_table(self, report: Report) -> Tuple[List[str], Iterable[Dict[str, Any]]]:
+        """Колонки и строки отчета (rows может быть функцией, порождающей строки)"""
+        content = report.content
+        if isinstance(content, dict) and "rows" in content:
+            rows = content["rows"]
+            return list(content.get("columns", [])), rows() if callable(rows) else rows
+        return ["content"], [{"content": content}]
+    
+    def _iter_csv(self, columns, rows, chunk_rows) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    def _iter_ndjson(self, rows, chunk_rows) -> Iterator[str]:
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(row, ensure_ascii=False, default=str))
+            if len(chunk) >= chunk_rows:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+    
+    def _iter_json(self, report, columns, rows, chunk_rows) -> Iterator[str]:
+        header = {
+            "report_id": str(report.id),
+            "title": report.title,
+            "created_by": report.created_by,
+            "created_at": report.created_at.isoformat(),
+            "columns": columns
+        }
+        yield json.dumps(header, ensure_ascii=False)[:-1] + ', "rows": ['
+        first = True
+        chunk = []
+        for row in rows:
+            chunk.append(("" if first else ",") + json.dumps(row, ensure_ascii=False, default=str))
+            first = False
+            if len(chunk) >= chunk_rows:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk) + "]}"
 
 class ChatbotService:
     """Чат-бот для интерфейса"""
     
-    def __init__(self, search_service):
+    def __init__(self, search_service, history_store=None):
         self.search_service = search_service
         self.conversation_history: Dict[str, List[Dict]] = {}
+        # Общее хранилище истории для нескольких процессов (append_history/get_history)
+        self.history_store = history_store
+        self._lock = threading.Lock()
+    
+    def _append_history(self, user_id: str, entry: Dict):
+        if self.history_store is not None:
+            self.history_store.append_history(user_id, [entry])
+            return
+        with self._lock:
+            self.conversation_history.setdefault(user_id, []).append(entry)
     
+    @instrumented()
     def process_message(self, user_id: str, message: str) -> str:
         """Обработать сообщение пользователя"""
         # Сохраняем историю
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-        
-        self.conversation_history[user_id].append({
+        self._append_history(user_id, {
             "role": "user",
             "message": message,
             "timestamp": datetime.now().isoformat()
@@ -157,7 +291,7 @@ class ChatbotService:
             response = "Я понял ваш запрос. Уточните, пожалуйста, что именно вас интересует?"
         
         # Сохраняем ответ
-        self.conversation_history[user_id].append({
+        self._append_history(user_id, {
             "role": "assistant",
             "message": response,
             "timestamp": datetime.now().isoformat()
@@ -167,4 +301,7 @@ class ChatbotService:
     
     def get_conversation_history(self, user_id: str) -> List[Dict]:
         """Получить историю разговора"""
-        return self.conversation_history.get(user_id, [])
+        if self.history_store is not None:
+            return self.history_store.get_history(user_id)
+        with self._lock:
+            return list(self.conversation_history.get(user_id, []))
@@ -0,0 +1,26 @@
+"""
+Общие настройки тестов: корень репозитория в sys.path, тихие логи сервисов
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("KMS_LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture
+def web_app():
+    """Модуль веб-интерфейса (сервисы создаются при первом обращении)"""
+    from web_interface import app as web_app
+    return web_app
+
+
+@pytest.fixture
+def client(web_app):
+    """Тестовый клиент с выполненным входом"""
+    client = web_app.app.test_client()
+    client.post('/login', data={'username': 'tester', 'password': 'tester'})
+    return client
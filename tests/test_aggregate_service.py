@@ -0,0 +1,83 @@
+"""
+Тесты материализованных агрегатов: совпадение с пересчетом после любых изменений
+"""
+from datetime import datetime
+
+from models.data_models import Entity, KnowledgeGraph, Relation, TransformedData
+from models.enums import EntityType, RelationType
+from services.aggregate_service import AggregateStore, document_day
+from services.data_service import StorageService
+
+
+def _graph(created_at=datetime(2024, 3, 1, 12)):
+    a = Entity(name="A", entity_type=EntityType.PERSON)
+    b = Entity(name="B", entity_type=EntityType.ORGANIZATION)
+    return KnowledgeGraph(name="g", entities=[a, b], created_at=created_at, relations=[
+        Relation(source_entity_id=a.id, target_entity_id=b.id, relation_type=RelationType.RELATED_TO)])
+
+
+def _rebuilt(storage):
+    store = AggregateStore()
+    for graph in storage.graphs.values():
+        store.add_graph(graph)
+    for doc in storage.documents.values():
+        store.add_document(doc)
+    return store.snapshot()
+
+
+def test_resave_after_in_place_mutation_does_not_drift():
+    storage = StorageService()
+    graph = _graph()
+    storage.save_graph(graph)
+
+    graph.entities.append(Entity(name="C", entity_type=EntityType.LOCATION))
+    graph.entities.pop(0)
+    storage.save_graph(graph)
+    storage.save_graph(graph)
+
+    assert storage.aggregates.totals()["graphs"] == 1
+    assert storage.aggregates.snapshot() == _rebuilt(storage)
+    assert storage.aggregates.snapshot()["entities_by_type"] == {"ORGANIZATION": 1, "LOCATION": 1}
+
+
+def test_deltas_match_full_recount():
+    storage = StorageService()
+    graph = _graph()
+    storage.save_graph(graph)
+    storage.add_entities(graph.id, [Entity(name="D", entity_type=EntityType.PERSON)])
+    storage.remove_entities(graph.id, [graph.entities[1].id])
+
+    assert storage.aggregates.snapshot() == _rebuilt(storage)
+    assert storage.aggregates.graph_summary(graph.id) == {
+        "name": "g", "entities": 2, "relations": 0, "created_at": graph.created_at.isoformat()}
+
+    storage.save_graph(_graph())
+    assert storage.aggregates.snapshot() == _rebuilt(storage)
+
+
+def test_remove_graph_subtracts_stored_counts():
+    store = AggregateStore()
+    graph = _graph()
+    store.add_graph(graph)
+    graph.entities.clear()
+    store.remove_graph(graph.id)
+
+    snapshot = store.snapshot()
+    assert snapshot["totals"] == {}
+    assert snapshot["entities_by_type"] == {}
+    assert snapshot["by_day"] == {}
+    assert snapshot["by_graph"] == {}
+
+
+def test_documents_use_creation_day_like_graphs():
+    storage = StorageService()
+    storage.save_graph(_graph())
+    doc = TransformedData(metadata={"source": "file", "transformed_at": "2024-03-01T08:00:00"})
+    storage.save_document(doc)
+    storage.save_document(TransformedData(metadata={"source": "api"}))
+
+    assert storage.aggregates.day_summary(datetime(2024, 3, 1).date()) == {
+        "graphs": 1, "entities": 2, "documents": 1}
+    assert storage.aggregates.snapshot() == _rebuilt(storage)
+    assert document_day(doc) == "2024-03-01"
+    assert document_day(TransformedData()) == datetime.now().date().isoformat()
@@ -0,0 +1,90 @@
+"""
+Тесты кэша результатов NLP: LRU, дисковый уровень, повторная обработка документа
+"""
+import time
+
+from models.data_models import Entity
+from models.enums import EntityType
+from services.analysis_service import NLPService
+from services.cache_service import DiskCache, LRUCache, NLPResultCache
+from services.chunking_service import iter_text_chunks
+
+TEXT = ("Иван Петров из ООО «Ромашка» приехал в г. Москва 12.03.2024. "
+        "Проект обсуждали долго, риск признали низким. ") * 20
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_disk_cache_hit_refreshes_access_time(tmp_path):
+    cache = DiskCache(str(tmp_path / "nlp.sqlite"), max_entries=2, prune_every=1)
+    try:
+        cache.put("old", [1])
+        time.sleep(0.01)
+        cache.put("new", [2])
+        time.sleep(0.01)
+        assert cache.get("old") == [1]
+        time.sleep(0.01)
+        cache.put("third", [3])
+
+        assert cache.get("old") == [1]
+        assert cache.get("new") is None
+        assert cache.get("third") == [3]
+    finally:
+        cache.close()
+
+
+def test_cached_entities_keep_properties(tmp_path):
+    disk_path = str(tmp_path / "nlp.sqlite")
+    nlp = NLPService(cache=NLPResultCache(disk_path=disk_path))
+    nlp._extract_entities = lambda text: [Entity(name="Иван Петров", entity_type=EntityType.PERSON,
+                                                 properties={"start": 0, "end": 11})]
+    first = nlp.extract_entities("Иван Петров")
+
+    fresh = NLPService(cache=NLPResultCache(disk_path=disk_path))
+    second = fresh.extract_entities("Иван Петров")
+    assert fresh.cache.stats()["hits"] == 1
+    assert [(e.name, e.entity_type, e.properties) for e in second] == \
+        [(e.name, e.entity_type, e.properties) for e in first]
+
+
+
+def test_memory_cache_is_not_changed_through_returned_entities():
+    nlp = NLPService(cache=NLPResultCache())
+    nlp._extract_entities = lambda text: [Entity(name="Иван Петров", entity_type=EntityType.PERSON,
+                                                 properties={"start": 0, "end": 11})]
+    first = nlp.extract_entities("Иван Петров")
+    first[0].properties["start"] = 99
+    second = nlp.extract_entities("Иван Петров")
+    second[0].properties["end"] = 99
+    assert nlp.extract_entities("Иван Петров")[0].properties == {"start": 0, "end": 11}
+
+def test_reingest_of_unchanged_document_skips_scanning():
+    nlp = NLPService(cache=NLPResultCache())
+    scans = []
+    scan_chunk = nlp._scan_chunk
+    nlp._scan_chunk = lambda *args: scans.append(1) or scan_chunk(*args)
+
+    def extract():
+        return [(e.name, e.entity_type, e.properties["start"])
+                for e in nlp.extract_entities_stream(iter_text_chunks(TEXT, 300, 60))]
+
+    first = extract()
+    scanned = len(scans)
+    assert scanned > 1
+    assert extract() == first
+    assert len(scans) == scanned
+
+    nlp.entity_patterns = dict(nlp.entity_patterns)
+    nlp.entity_patterns.pop(EntityType.DATE)
+    assert all(entity_type != EntityType.DATE for _, entity_type, _ in extract())
+    assert len(scans) > scanned
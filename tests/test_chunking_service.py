@@ -0,0 +1,83 @@
+"""
+Тесты обработки больших документов фрагментами: результат совпадает со сквозным проходом
+"""
+import re
+
+import pytest
+
+from models.enums import EntityType
+from services.analysis_service import KnowledgeBuilder, NLPService
+from services.chunking_service import iter_file_chunks, iter_text_chunks
+
+TEXT = "".join(
+    f"Запись {i}: Иван Петров и Анна Смирнова из ООО «Вектор {i}» были в г. Казань "
+    f"{i % 28 + 1:02d}.0{i % 9 + 1}.2024. Проект оценен, риск учтен.\n"
+    for i in range(60)
+)
+
+
+def _full_scan(nlp, text):
+    """Эталон: каждый шаблон по всему тексту, концепт - по первому вхождению"""
+    found = []
+    for entity_type, pattern in nlp.entity_patterns.items():
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            found.append((match.start(), match.group(), entity_type))
+    lowered = text.lower()
+    for keyword in nlp.concept_keywords:
+        index = lowered.find(keyword.lower())
+        if index != -1:
+            found.append((index, keyword.capitalize(), EntityType.CONCEPT))
+    return sorted(found, key=lambda item: (item[0], item[2].value))
+
+
+def _streamed(nlp, chunks):
+    return sorted(((e.properties["start"], e.name, e.entity_type)
+                   for e in nlp.extract_entities_stream(chunks)),
+                  key=lambda item: (item[0], item[2].value))
+
+
+@pytest.mark.parametrize("chunk_size", [50, 137, 1000, len(TEXT) + 10])
+def test_chunked_stream_equals_full_scan(chunk_size):
+    nlp = NLPService(use_cache=False)
+    assert _streamed(nlp, iter_text_chunks(TEXT, chunk_size, 80)) == _full_scan(nlp, TEXT)
+
+
+def test_chunks_cover_text_exactly_once():
+    chunks = list(iter_text_chunks(TEXT, 100, 30))
+    assert "".join(chunk.core for chunk in chunks) == TEXT
+    assert [chunk.is_last for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+    for chunk in chunks:
+        assert TEXT[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+
+
+def test_file_chunks_match_text_chunks(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text(TEXT, encoding="utf-8")
+
+    chunks = list(iter_file_chunks(str(path), 333, 120))
+    assert "".join(chunk.core for chunk in chunks) == TEXT
+    for chunk in chunks:
+        assert TEXT[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+
+    nlp = NLPService(use_cache=False)
+    assert _streamed(nlp, chunks) == _full_scan(nlp, TEXT)
+
+
+def test_empty_file_yields_one_chunk(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("", encoding="utf-8")
+    assert [chunk.is_last for chunk in iter_file_chunks(str(path))] == [True]
+
+
+def test_relations_stream_links_entities_within_window():
+    nlp = NLPService(use_cache=False)
+    entities = list(nlp.extract_entities_stream(iter_text_chunks(TEXT, 200, 80)))
+    relations = list(KnowledgeBuilder().build_relations_stream(iter(entities), window=40))
+
+    by_id = {entity.id: entity for entity in entities}
+    assert relations
+    for relation in relations:
+        source = by_id[relation.source_entity_id]
+        target = by_id[relation.target_entity_id]
+        assert abs(source.properties["start"] - target.properties["start"]) <= 40
+        assert (source.name, source.entity_type) != (target.name, target.entity_type)
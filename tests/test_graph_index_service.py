@@ -0,0 +1,87 @@
+"""
+Тесты индекса графа: удаление перестановкой, ключи дедупликации, объединение пакетов
+"""
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph, Relation
+from models.enums import EntityType, RelationType
+from services.data_service import StorageService
+from services.graph_index_service import GraphIndex, entity_key
+
+
+def _entity(name, entity_type=EntityType.PERSON):
+    return Entity(name=name, entity_type=entity_type)
+
+
+def _check_positions(index):
+    graph = index.graph
+    assert index.entity_pos == {e.id: i for i, e in enumerate(graph.entities)}
+    assert index.relation_pos == {r.id: i for i, r in enumerate(graph.relations)}
+
+
+def test_swap_remove_keeps_positions_consistent():
+    entities = [_entity(f"E{i}") for i in range(5)]
+    relations = [Relation(source_entity_id=entities[i].id, target_entity_id=entities[i + 1].id)
+                 for i in range(4)]
+    index = GraphIndex(KnowledgeGraph(entities=list(entities), relations=list(relations)))
+
+    removed_entities, removed_relations = index.remove_entities([entities[1].id, "missing"])
+    assert removed_entities == [entities[1]]
+    assert {r.id for r in removed_relations} == {relations[0].id, relations[1].id}
+    _check_positions(index)
+
+    index.remove_entity(entities[4].id)
+    _check_positions(index)
+    assert index.entity(entities[4].id) is None
+    assert index.incident_relations(entities[2].id) == {relations[2].id}
+
+
+def test_duplicate_key_falls_back_to_remaining_entity():
+    first, second = _entity("Иван Петров"), _entity("иван петров")
+    index = GraphIndex(KnowledgeGraph(entities=[first, second]))
+
+    assert index.find_entity(_entity("ИВАН ПЕТРОВ")) == first.id
+    index.remove_entity(first.id)
+    assert index.find_entity(_entity("Иван Петров")) == second.id
+    index.remove_entity(second.id)
+    assert index.find_entity(_entity("Иван Петров")) is None
+    assert entity_key(first) not in index.entity_keys
+
+
+def test_duplicate_relation_key_falls_back():
+    a, b = _entity("A"), _entity("B")
+    r1 = Relation(source_entity_id=a.id, target_entity_id=b.id, relation_type=RelationType.PART_OF)
+    r2 = Relation(source_entity_id=a.id, target_entity_id=b.id, relation_type=RelationType.PART_OF)
+    index = GraphIndex(KnowledgeGraph(entities=[a, b], relations=[r1, r2]))
+
+    index.remove_relation(r1.id)
+    assert index.find_relation(Relation(source_entity_id=a.id, target_entity_id=b.id,
+                                        relation_type=RelationType.PART_OF)) == r2.id
+
+
+def test_merge_after_removing_duplicate_matches_remaining():
+    storage = StorageService()
+    first, second = _entity("Анна Смирнова"), _entity("Анна Смирнова")
+    graph = KnowledgeGraph(entities=[first, second])
+    storage.save_graph(graph)
+
+    storage.remove_entities(graph.id, [first.id])
+    change = storage.merge_graph(graph.id, [_entity("анна смирнова")])
+
+    assert change.added_entities == []
+    assert list(change.merged_entities.values()) == [second.id]
+    assert [e.id for e in graph.entities] == [second.id]
+
+
+def test_relation_to_missing_entity_is_rejected():
+    storage = StorageService()
+    a, b, outside = _entity("A"), _entity("B"), _entity("Вне графа")
+    graph = KnowledgeGraph(entities=[a, b])
+    storage.save_graph(graph)
+
+    relations = [Relation(source_entity_id=a.id, target_entity_id=outside.id),
+                 Relation(source_entity_id=b.id, target_entity_id="missing")]
+    with pytest.raises(ValueError) as error:
+        storage.add_relations(graph.id, relations)
+    assert str(outside.id) in str(error.value) and "missing" in str(error.value)
+    assert graph.relations == []
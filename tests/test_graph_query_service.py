@@ -0,0 +1,120 @@
+"""
+Тесты запросов к графу: окрестность и кратчайший путь сверяются с простым обходом
+"""
+import random
+from collections import deque
+
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph, Relation
+from models.enums import EntityType, RelationType
+from services.graph_index_service import GraphIndex
+from services.graph_query_service import neighborhood, resolve_entity, shortest_path
+
+
+def _random_graph(seed, size=40, edges=60):
+    rng = random.Random(seed)
+    entities = [Entity(name=f"E{i}", entity_type=rng.choice([EntityType.PERSON, EntityType.CONCEPT]))
+                for i in range(size)]
+    relations = [Relation(source_entity_id=rng.choice(entities).id,
+                          target_entity_id=rng.choice(entities).id,
+                          relation_type=rng.choice([RelationType.RELATED_TO, RelationType.PART_OF]))
+                 for _ in range(edges)]
+    return KnowledgeGraph(name=f"random-{seed}", entities=entities, relations=relations)
+
+
+def _distances(graph, start, direction="both"):
+    """Эталонный поиск в ширину по списку отношений"""
+    adjacency = {}
+    for r in graph.relations:
+        if direction in ("out", "both"):
+            adjacency.setdefault(r.source_entity_id, []).append(r.target_entity_id)
+        if direction in ("in", "both"):
+            adjacency.setdefault(r.target_entity_id, []).append(r.source_entity_id)
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        for other in adjacency.get(current, ()):
+            if other not in distances:
+                distances[other] = distances[current] + 1
+                queue.append(other)
+    return distances
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("direction", ["out", "in", "both"])
+def test_neighborhood_matches_reference_bfs(seed, direction):
+    graph = _random_graph(seed)
+    index = GraphIndex(graph)
+    start = graph.entities[0].id
+
+    result = neighborhood(index, start, hops=2, direction=direction)
+    expected = {k: v for k, v in _distances(graph, start, direction).items() if v <= 2}
+    assert result.depths == expected
+    assert {e.id for e in result.entities} == set(expected)
+    # Все отношения между найденными сущностями, в том числе между сущностями последнего шага
+    assert {r.id for r in result.relations} == {
+        r.id for r in graph.relations
+        if r.source_entity_id in expected and r.target_entity_id in expected}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_shortest_path_length_matches_reference_bfs(seed):
+    graph = _random_graph(seed, edges=45)
+    index = GraphIndex(graph)
+    source = graph.entities[0].id
+    distances = _distances(graph, source)
+
+    for target in graph.entities[1:15]:
+        result = shortest_path(index, source, target.id, max_hops=40)
+        if target.id not in distances:
+            assert result.entities == []
+            continue
+        path = [e.id for e in result.entities]
+        assert len(result.relations) == distances[target.id]
+        assert path[0] == source and path[-1] == target.id
+        for (a, b), relation in zip(zip(path, path[1:]), result.relations):
+            assert {relation.source_entity_id, relation.target_entity_id} == {a, b}
+
+
+def _chain(length):
+    entities = [Entity(name=f"Узел {i}") for i in range(length)]
+    relations = [Relation(source_entity_id=a.id, target_entity_id=b.id)
+                 for a, b in zip(entities, entities[1:])]
+    return KnowledgeGraph(name="chain", entities=entities, relations=relations)
+
+
+def test_limits_filters_and_name_lookup():
+    graph = _chain(6)
+    index = GraphIndex(graph)
+    first, last = graph.entities[0], graph.entities[-1]
+
+    assert resolve_entity(index, "узел 0") == first.id
+    with pytest.raises(LookupError):
+        resolve_entity(index, "нет такой")
+    with pytest.raises(ValueError):
+        neighborhood(index, first.id, direction="sideways")
+
+    truncated = neighborhood(index, first.id, hops=5, limit=3)
+    assert truncated.truncated and len(truncated.entities) == 3
+    assert neighborhood(index, first.id, hops=5, direction="in").depths == {first.id: 0}
+    assert neighborhood(index, first.id, hops=5, relation_types=[RelationType.PART_OF]).depths == \
+        {first.id: 0}
+
+    assert len(shortest_path(index, first.id, last.id).relations) == 5
+    assert shortest_path(index, first.id, last.id, max_hops=4).entities == []
+    assert shortest_path(index, last.id, first.id, direction="out").entities == []
+    assert [e.id for e in shortest_path(index, first.id, first.id).entities] == [first.id]
+
+
+def test_graph_query_routes_report_errors(client, web_app):
+    graph = _chain(3)
+    web_app.storage_service.save_graph(graph)
+    url = f"/api/knowledge-graphs/{graph.id}"
+
+    ok = client.get(f"{url}/neighborhood?entity=Узел 1&hops=1")
+    assert ok.status_code == 200
+    assert client.get(f"{url}/neighborhood?entity=нет").status_code == 404
+    assert client.get("/api/knowledge-graphs/missing/neighborhood?entity=x").status_code == 404
+    assert client.get(f"{url}/path?source=Узел 0").status_code == 400
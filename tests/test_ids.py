@@ -0,0 +1,109 @@
+"""
+Тесты компактных идентификаторов: кодирование, разбор, номер узла, JSON
+"""
+import json
+import logging
+import os
+
+import pytest
+
+from models import ids
+from models.ids import CompactId, CompactIdGenerator, jsonable, parse_id
+
+
+def test_encode_and_parse_round_trip():
+    for value in (0, 1, 31, 32, 2 ** 53 + 1, 2 ** 63 - 1):
+        text = str(CompactId(value))
+        assert len(text) == 13
+        assert CompactId.parse(text) == value
+        assert CompactId.parse(text.lower()) == value
+    assert str(CompactId(0)) == "0000000000000"
+    assert CompactId.parse("0000000000O0I") == CompactId.parse("0000000000001")
+
+
+@pytest.mark.parametrize("text", ["", "123", "ZZZZZZZZZZZZZ", "000000000000U", "00000000000000"])
+def test_parse_rejects_invalid_text(text):
+    with pytest.raises(ValueError):
+        CompactId.parse(text)
+    assert parse_id(text) == text
+
+
+def test_generated_ids_are_monotonic_and_sortable_as_text():
+    generator = CompactIdGenerator(node=5)
+    generated = [generator() for _ in range(5000)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert [str(i) for i in generated] == sorted(str(i) for i in generated)
+    assert (generated[0] >> 12) & 1023 == 5
+    assert f"{generated[0]}" == str(generated[0]) and f"{generated[0]:d}" == str(int(generated[0]))
+
+
+def test_time_ordered_ids_differ_in_last_characters():
+    generator = CompactIdGenerator(node=1)
+    first, second = generator(), generator()
+    assert str(first)[:8] == str(second)[:8]
+    assert str(first)[-4:] != str(second)[-4:]
+
+
+def test_node_from_env_is_validated(monkeypatch):
+    monkeypatch.setenv(ids.ID_NODE_ENV, "7")
+    assert CompactIdGenerator().node == 7
+    monkeypatch.setenv(ids.ID_NODE_ENV, "5000")
+    with pytest.raises(ValueError):
+        CompactIdGenerator()
+    with pytest.raises(ValueError):
+        CompactIdGenerator(node=-1)
+
+
+def test_random_node_warns_in_multi_process_mode(monkeypatch, caplog):
+    monkeypatch.delenv(ids.ID_NODE_ENV, raising=False)
+    for name in ids.MULTI_PROCESS_ENVS:
+        monkeypatch.delenv(name, raising=False)
+    with caplog.at_level(logging.WARNING, logger="models.ids"):
+        assert 0 <= CompactIdGenerator().node <= 1023
+        assert not caplog.records
+        monkeypatch.setenv("KMS_SHARED_STATE_DIR", "/tmp/kms")
+        CompactIdGenerator()
+    assert ids.ID_NODE_ENV in caplog.text
+
+
+def test_set_node_and_reset_after_fork():
+    generator = CompactIdGenerator(node=3)
+    generator.set_node(900)
+    assert (generator() >> 12) & 1023 == 900
+    with pytest.raises(ValueError):
+        generator.set_node(1024)
+    generator.reset_node()
+    assert 0 <= generator.node <= 1023
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен fork")
+def test_forked_child_does_not_inherit_node():
+    parent = ids._generator.node
+    nodes = set()
+    for _ in range(3):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            os.write(write, str(ids._generator.node).encode())
+            os._exit(0)
+        os.close(write)
+        nodes.add(int(os.read(read, 16)))
+        os.close(read)
+        os.waitpid(pid, 0)
+    assert nodes != {parent}
+
+
+def test_jsonable_converts_ids_to_strings():
+    big = CompactId(2 ** 60 + 1)
+    data = {"id": big, big: [big, (big, 1)], "n": 5}
+    assert json.loads(json.dumps(jsonable(data))) == {
+        "id": str(big), str(big): [str(big), [str(big), 1]], "n": 5}
+
+
+def test_api_serializes_ids_as_strings(web_app):
+    big = CompactId(2 ** 60 + 1)
+    with web_app.app.test_request_context():
+        response = web_app.jsonify({"id": big, "ids": [big]})
+    assert json.loads(response.get_data(as_text=True)) == {"id": str(big), "ids": [str(big)]}
@@ -0,0 +1,114 @@
+"""
+Тесты нагрузочного теста: перцентили, SLO, сравнение прогонов, короткий локальный прогон
+"""
+import pytest
+
+from web_interface import load_test
+from web_interface.load_test import (EndpointStats, LoadTestConfig, check_slo, compare_reports,
+                                     parse_mix, parse_slo, percentile)
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 91) == 10
+    assert percentile(values, 99) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 0) == 1
+    assert percentile([], 99) == 0.0
+    assert percentile([0.5], 50) == 0.5
+    # 7 / 100 * 100 в float больше 7: ранг не должен сдвигаться
+    assert percentile(list(range(1, 101)), 7) == 7
+    assert [percentile(list(range(1, 101)), p) for p in range(1, 101)] == list(range(1, 101))
+
+
+def test_endpoint_stats_classify_statuses():
+    stats = EndpointStats()
+    for latency, status in ((0.001, 200), (0.002, 404), (0.003, 500), (0.004, None)):
+        stats.record(latency, status)
+    summary = stats.summary(elapsed=1.0)
+    assert (summary['errors'], summary['client_errors'], summary['error_rate']) == (2, 1, 0.5)
+    assert summary['statuses'] == {'200': 1, '404': 1, '500': 1, 'exception': 1}
+    assert summary['p50'] == 2.0 and summary['max'] == 4.0
+
+
+def _report(**endpoints):
+    base = {'requests': 100, 'p50': 1.0, 'p90': 2.0, 'p99': 5.0, 'error_rate': 0.0,
+            'throughput_rps': 100.0}
+    return {'endpoints': {name: {**base, **values} for name, values in endpoints.items()}}
+
+
+def test_slo_and_regressions():
+    report = _report(search={'p99': 250.0}, dashboard={})
+    slo = parse_slo("p99=500,search.p99=200,error_rate=0.01")
+    assert check_slo(report, slo) == ["search: p99=250.0 > 200.0"]
+    with pytest.raises(ValueError):
+        parse_slo("p42=1")
+
+    baseline = _report(search={}, dashboard={})
+    current = _report(search={'p99': 5.5, 'throughput_rps': 70.0},
+                      dashboard={'p50': 10.0, 'error_rate': 0.05})
+    assert compare_reports(baseline, current) == [
+        "search: throughput 100.0 -> 70.0 rps",
+        "dashboard: p50 1.0 -> 10.0 мс",
+        "dashboard: error_rate 0.0 -> 0.05",
+    ]
+
+
+def test_parse_mix():
+    assert parse_mix("search=3,dashboard") == {'search': 3.0, 'dashboard': 1.0}
+    assert parse_mix(None) == load_test.DEFAULT_MIX
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+
+
+def test_local_run_uses_package_import(web_app):
+    config = LoadTestConfig(mix={'search': 1, 'neighborhood': 1, 'aggregates': 1},
+                            concurrency=2, duration=None, requests=12, warmup=1,
+                            graphs=3, entities=5, documents=5)
+    original = web_app.container.get('storage')
+    try:
+        report = load_test.run_load_test(config)
+    finally:
+        web_app.container.set('storage', original)
+    assert sum(s['requests'] for s in report['endpoints'].values()) == 12
+    assert all(s['errors'] == 0 for s in report['endpoints'].values())
+
+
+class _FakeClient:
+    def login(self, username):
+        pass
+
+    def request(self, method, path, options):
+        return 200
+
+
+def test_worker_setup_failure_is_reported():
+    created = []
+
+    def client_factory():
+        created.append(None)
+        if len(created) == 1:
+            raise ConnectionError("нет соединения")
+        return _FakeClient()
+
+    config = LoadTestConfig(mix={'dashboard': 1}, concurrency=3, duration=None, requests=6,
+                            warmup=0)
+    report = load_test.LoadTest(config, client_factory, {'graphs': []}).run()
+    # Исполнитель без клиента не участвует в замере, остальные выполняют все запросы
+    assert len(report['setup_errors']) == 1 and report['setup_errors'][0].endswith("нет соединения")
+    assert report['endpoints']['dashboard']['requests'] == 6
+
+
+def test_run_does_not_change_config_mix(web_app):
+    mix = {'dashboard': 1, 'neighborhood': 1}
+    config = LoadTestConfig(mix=mix, concurrency=1, duration=None, requests=2, warmup=0,
+                            graphs=0, entities=1, documents=1)
+    original = web_app.container.get('storage')
+    try:
+        report = load_test.run_load_test(config)
+    finally:
+        web_app.container.set('storage', original)
+    assert config.mix == {'dashboard': 1, 'neighborhood': 1}
+    assert list(report['endpoints']) == ['dashboard']
@@ -0,0 +1,75 @@
+"""
+Тесты реестра метрик и декоратора instrumented
+"""
+from services.metrics_service import MetricsRegistry, MetricsSink, instrumented
+
+
+class _ListSink(MetricsSink):
+    def __init__(self):
+        self.records = []
+
+    def record(self, kind, name, value, labels):
+        self.records.append((kind, name, value, labels))
+
+
+def test_counters_gauges_and_histograms():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("requests", labels={"endpoint": "search"})
+    registry.inc("requests", 2, labels={"endpoint": "search"})
+    registry.set_gauge("graphs", 5)
+    registry.observe("latency", 0.05)
+    registry.observe("latency", 0.5)
+    registry.observe("latency", 5.0)
+
+    data = registry.snapshot()
+    assert data["counters"][("requests", (("endpoint", "search"),))] == 3
+    assert data["gauges"][("graphs", ())] == 5
+    histogram = data["histograms"][("latency", ())]
+    assert histogram["count"] == 3
+    assert histogram["buckets"] == [(0.1, 1), (1.0, 2), (float("inf"), 3)]
+
+
+def test_render_prometheus():
+    registry = MetricsRegistry(buckets=(1.0,))
+    registry.describe("requests", "Запросы")
+    registry.inc("requests", labels={"path": 'a"b'})
+    registry.observe("latency", 0.5)
+
+    text = registry.render_prometheus()
+    assert "# HELP requests Запросы" in text
+    assert "# TYPE requests counter" in text
+    assert 'requests{path="a\\"b"} 1' in text
+    assert 'latency_bucket{le="1"} 1' in text
+    assert 'latency_bucket{le="+Inf"} 1' in text
+    assert "latency_count 1" in text
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    registry.enabled = False
+    registry.inc("requests")
+    registry.observe("latency", 1.0)
+    assert registry.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def test_instrumented_counts_calls_and_errors():
+    registry = MetricsRegistry()
+    sink = _ListSink()
+    registry.add_sink(sink)
+
+    @instrumented("op", registry=registry)
+    def op(fail=False):
+        if fail:
+            raise ValueError("boom")
+        return 42
+
+    assert op() == 42
+    try:
+        op(fail=True)
+    except ValueError:
+        pass
+
+    counters = registry.snapshot()["counters"]
+    assert counters[("kms_service_calls_total", (("method", "op"),))] == 2
+    assert counters[("kms_service_errors_total", (("method", "op"),))] == 1
+    assert any(record[0] == "histogram" for record in sink.records)
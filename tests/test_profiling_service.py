@@ -0,0 +1,81 @@
+import threading
+
+from services.profiling_service import ProfilingService
+
+
+def test_profile_records_top_functions():
+    service = ProfilingService(policy="all", mode="cprofile")
+    with service.profile("block") as session:
+        sorted(range(10000), key=lambda x: -x)
+
+    record = service.get_profile(session.profile_id)
+    assert record.mode == "cprofile"
+    assert record.top_functions
+    assert service.recent_profiles()[0] is record
+
+
+def test_concurrent_sessions_share_cprofile_safely():
+    service = ProfilingService(policy="all", mode="both")
+    barrier = threading.Barrier(2)
+    modes = []
+    errors = []
+
+    def worker():
+        try:
+            with service.profile("concurrent") as session:
+                barrier.wait()
+                sum(range(100000))
+                barrier.wait()
+            modes.append(session.mode)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sorted(modes) == ["both", "sampling"]
+    # cProfile освобожден и снова доступен
+    with service.profile("after") as session:
+        pass
+    assert session.mode == "both"
+
+
+def test_nested_operations_are_not_profiled_separately():
+    service = ProfilingService(policy="header")
+    assert not service.should_profile()
+    with service.profile("outer"):
+        assert not service.should_profile(requested=True)
+    assert service.should_profile(requested=True)
+
+
+def test_etl_route_runs_with_profiler(web_app, client):
+    web_app.container.set('profiling', ProfilingService(policy="header", mode="cprofile"))
+    response = client.post('/api/etl', json={
+        'sources': [{'type': 'SQL', 'connection': 'localhost/db'}], 'profile': True})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['results']['loaded'] == 1
+    assert data['profile_id']
+    assert web_app.profiling_service.get_profile(data['profile_id']).label == "ETLService.run_etl"
+
+    response = client.post('/api/etl', json={'sources': [{'type': 'FTP'}]})
+    assert response.status_code == 400
+
+
+def test_etl_route_validates_sources_and_requires_login(web_app, client):
+    assert client.post('/api/etl', json={'sources': ['bad']}).status_code == 400
+    assert client.post('/api/etl', json={'sources': 'bad'}).status_code == 400
+    assert client.post('/api/etl', json=['bad']).status_code == 200
+    assert web_app.app.test_client().post('/api/etl', json={}).status_code == 401
+
+
+def test_request_profile_id_is_generated_by_server(web_app, client):
+    web_app.container.set('profiling', ProfilingService(policy="header", mode="sampling"))
+    response = client.get('/api/status', headers={'X-Profile': '1', 'X-Request-ID': 'chosen'})
+    profile_id = response.headers['X-Profile-Id']
+    assert profile_id != 'chosen'
+    assert web_app.profiling_service.get_profile(profile_id) is not None
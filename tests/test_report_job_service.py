@@ -0,0 +1,113 @@
+"""
+Тесты фоновых отчетов: строки пишутся в файл при формировании, экспорт проверяет формат сразу
+"""
+import json
+import os
+
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph
+from models.enums import EntityType, JobStatus
+from services.data_service import StorageService
+from services.report_job_service import PAGE_SIZE, ReportJobService
+from services.ui_service import ReportService
+
+
+@pytest.fixture
+def storage():
+    storage = StorageService()
+    for i in range(3):
+        storage.save_graph(KnowledgeGraph(name=f"g{i}", entities=[
+            Entity(name=f"p{i}", entity_type=EntityType.PERSON),
+            Entity(name=f"o{i}", entity_type=EntityType.ORGANIZATION)]))
+    return storage
+
+
+@pytest.fixture
+def jobs(storage):
+    service = ReportJobService(storage, ReportService(), max_workers=1)
+    yield service
+    service.shutdown()
+
+
+def test_export_reads_spooled_rows(jobs, storage):
+    job = jobs.submit("", "ENTITIES", "u1", {"entity_type": "PERSON"})
+    job = jobs.wait(job.id, timeout=5)
+
+    assert job.status == JobStatus.DONE
+    assert jobs.describe(job)["rows"] == 3
+    assert os.path.exists(jobs._spool_path(job.id))
+
+    # Экспорт не пересчитывает отчет: изменения хранилища не видны
+    storage.save_graph(KnowledgeGraph(name="late", entities=[
+        Entity(name="p9", entity_type=EntityType.PERSON)]))
+    lines = "".join(jobs.iter_export(job.id, "ndjson")).splitlines()
+    assert sorted(json.loads(line)["name"] for line in lines) == ["p0", "p1", "p2"]
+
+
+def test_evicted_and_shut_down_jobs_remove_spool(tmp_path, storage):
+    service = ReportJobService(storage, ReportService(), max_workers=1, max_jobs=1)
+    first = service.wait(service.submit("", "SUMMARY", "u1").id, timeout=5)
+    path = service._spool_path(first.id)
+    assert os.path.exists(path)
+    service.wait(service.submit("", "SUMMARY", "u1").id, timeout=5)
+    assert not os.path.exists(path)
+    service.shutdown()
+    assert not os.path.exists(service.spool_dir)
+
+    shared = ReportJobService(storage, ReportService(), max_workers=1, spool_dir=str(tmp_path))
+    job = shared.wait(shared.submit("", "SUMMARY", "u1").id, timeout=5)
+    shared.shutdown()
+    assert os.path.exists(shared._spool_path(job.id))
+
+
+def test_export_rejects_unknown_format_eagerly(jobs):
+    job = jobs.wait(jobs.submit("", "SUMMARY", "u1").id, timeout=5)
+    with pytest.raises(ValueError):
+        jobs.iter_export(job.id, "xml")
+    with pytest.raises(ValueError):
+        ReportService().iter_export(job.report, "pdf")
+    with pytest.raises(LookupError):
+        jobs.iter_export("missing", "csv")
+
+
+def test_csv_export_and_list_jobs(jobs):
+    first = jobs.wait(jobs.submit("", "GRAPHS", "u1").id, timeout=5)
+    second = jobs.wait(jobs.submit("", "SUMMARY", "u2").id, timeout=5)
+
+    csv_text = "".join(jobs.iter_export(first.id, "csv", chunk_rows=1))
+    assert csv_text.splitlines()[0] == "graph_id,name,entities,relations,density,created_at"
+    assert len(csv_text.splitlines()) == 4
+    assert [job.id for job in jobs.list_jobs()] == [second.id, first.id]
+    assert [job.id for job in jobs.list_jobs(user_id="u1")] == [first.id]
+    assert jobs.get_job(first.id) is first
+
+
+def test_graph_pages_cover_large_storage():
+    storage = StorageService()
+    for i in range(PAGE_SIZE + 5):
+        storage.save_graph(KnowledgeGraph(name=f"g{i}"))
+    service = ReportJobService(storage, ReportService(), max_workers=1)
+    try:
+        graphs = list(service._iter_graphs())
+        assert len({graph.id for graph in graphs}) == PAGE_SIZE + 5
+    finally:
+        service.shutdown()
+
+
+def test_report_api_requires_owner(client, web_app):
+    response = client.post('/api/reports', json={'report_type': 'SUMMARY'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    urls = [f'/api/reports/{job_id}', f'/api/reports/{job_id}/events',
+            f'/api/reports/{job_id}/export?format=csv']
+    web_app.report_job_service.wait(web_app.parse_id(job_id), timeout=5)
+    assert client.get(urls[0]).status_code == 200
+
+    anonymous = web_app.app.test_client()
+    assert anonymous.post('/api/reports', json={}).status_code == 401
+    other = web_app.app.test_client()
+    other.post('/login', data={'username': 'other', 'password': 'other'})
+    for url in urls:
+        assert anonymous.get(url).status_code == 401
+        assert other.get(url).status_code == 404
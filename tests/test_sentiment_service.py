@@ -0,0 +1,60 @@
+"""
+Тесты словарной оценки тональности и учета вызовов в метриках
+"""
+import pytest
+
+from services.analysis_service import NLPService
+from services.metrics_service import metrics
+from services.sentiment_service import LexiconSentimentScorer, stem_ru, tokenize
+
+TEXTS = [
+    "Проект успешный, результат отличный",
+    "Не успешный проект, сплошные проблемы",
+    "Очень плохой отчет",
+    "Данные без ошибок",
+    "Просто текст",
+]
+
+
+def test_stemming_and_tokenizing():
+    assert stem_ru("успешного") == stem_ru("успешный")
+    assert tokenize("Очень хорошо, спасибо!") == ["очень", "хорошо", ",", "спасибо", "!"]
+
+
+def test_negation_and_intensifiers():
+    scorer = LexiconSentimentScorer()
+    assert scorer.score("Проект успешный") == 1.0
+    assert scorer.score("Проект не успешный") == 0.0
+    assert scorer.score("Без ошибок") == 1.0
+    assert scorer.score("Просто текст") == 0.5
+    # Отрицание не переходит через границу фразы
+    assert scorer.score("Не сегодня. Успешный проект") == 1.0
+
+    mixed = scorer.score("Хороший результат, но проблема")
+    boosted = scorer.score("Очень хороший результат, но проблема")
+    assert 0 < mixed < boosted < 1
+
+
+def test_batch_matches_single_scores():
+    scorer = LexiconSentimentScorer()
+    assert scorer.score_batch(TEXTS) == pytest.approx([scorer.score(t) for t in TEXTS])
+    assert scorer.score_batch([]) == []
+
+
+def _calls(method):
+    return metrics.snapshot()["counters"].get(
+        ("kms_service_calls_total", (("method", method),)), 0)
+
+
+def test_sentiment_calls_are_counted_once():
+    nlp = NLPService(use_cache=False)
+    single = _calls("NLPService.analyze_sentiment")
+    batch = _calls("NLPService.analyze_sentiment_batch")
+
+    nlp.analyze_sentiment(TEXTS[0])
+    assert _calls("NLPService.analyze_sentiment") == single + 1
+    assert _calls("NLPService.analyze_sentiment_batch") == batch
+
+    assert nlp.analyze_sentiment_batch(TEXTS) == pytest.approx(
+        [nlp.analyze_sentiment(t) for t in TEXTS])
+    assert _calls("NLPService.analyze_sentiment_batch") == batch + 1
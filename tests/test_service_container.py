@@ -0,0 +1,45 @@
+import pytest
+
+from services.service_container import ServiceContainer
+
+
+def test_services_are_created_once_on_first_use():
+    calls = []
+    container = ServiceContainer()
+    container.register("storage", lambda c: calls.append(1) or object())
+
+    assert not container.is_initialized("storage")
+    first = container.proxy("storage")
+    assert container.get("storage") is container.get("storage")
+    assert repr(first).endswith("(создан)>")
+    assert calls == [1]
+
+
+def test_health_reports_construction_failures():
+    container = ServiceContainer()
+    container.register("storage", lambda c: object())
+    container.register("nlp", lambda c: 1 / 0)
+    container.register("reports", lambda c: object())
+
+    with pytest.raises(ZeroDivisionError):
+        container.get("nlp")
+
+    health = container.health(require=("storage", "nlp"))
+    assert health["storage"] == "ok"
+    assert health["nlp"].startswith("ZeroDivisionError")
+    assert health["reports"] == "not created"
+
+
+def test_status_endpoint_is_degraded_when_core_service_fails(web_app, client):
+    assert client.get('/api/status').get_json()['status'] == 'active'
+
+    original = web_app.container._factories['nlp']
+    web_app.container.register('nlp', lambda c: 1 / 0)
+    try:
+        response = client.get('/api/status')
+        assert response.status_code == 503
+        data = response.get_json()
+        assert data['status'] == 'degraded'
+        assert data['services']['nlp'].startswith('ZeroDivisionError')
+    finally:
+        web_app.container.register('nlp', original)
@@ -0,0 +1,125 @@
+"""
+Тесты шардированного хранилища: разбор ошибок шардов и постраничные списки
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph
+from services.data_service import (StorageService, graph_cursor, graph_order, parse_graph_cursor,
+                                   summary_order)
+from services.shard_service import ShardError, ShardedStorageService, _ShardServer
+
+
+def _graphs(count):
+    start = datetime(2024, 1, 1)
+    return [KnowledgeGraph(name=f"g{i}", entities=[Entity(name=f"e{i}")],
+                           created_at=start + timedelta(minutes=i % 7))
+            for i in range(count)]
+
+
+@pytest.fixture(scope="module")
+def sharded():
+    storage = ShardedStorageService(num_shards=2)
+    yield storage
+    storage.close()
+
+
+def test_shard_server_has_no_shutdown_operation():
+    with pytest.raises(ShardError):
+        _ShardServer().handle("shutdown", (), {})
+
+
+def test_remote_errors_keep_their_type(sharded):
+    graph = KnowledgeGraph(name="g", entities=[Entity(name="A")])
+    sharded.save_graph(graph)
+
+    with pytest.raises(LookupError):
+        sharded.neighborhood("missing", "A")
+    with pytest.raises(LookupError):
+        sharded.neighborhood(graph.id, "B")
+    with pytest.raises(ValueError):
+        sharded.neighborhood(graph.id, "A", direction="sideways")
+
+    # После ошибок соединения не рассинхронизированы
+    assert sharded.neighborhood(graph.id, "A").entities[0].name == "A"
+
+
+def test_scatter_reads_every_reply_before_raising(sharded):
+    with pytest.raises(ShardError):
+        sharded._scatter("no_such_op")
+    assert sum(sharded.counts().values()) >= 0
+    assert len(sharded._scatter("counts")) == sharded.num_shards
+
+
+def _all_pages(fetch, key, limit):
+    pages, after = [], None
+    while True:
+        page = fetch(after, limit)
+        pages.append(page)
+        if len(page) < limit:
+            return pages
+        after = key(page[-1])
+
+
+def test_sharded_pages_match_local_order(sharded):
+    for graph in _graphs(9):
+        sharded.save_graph(graph)
+    expected = sorted(sharded.graphs.values(), key=graph_order)
+
+    pages = _all_pages(sharded.list_graphs, graph_order, 4)
+    assert [g.id for page in pages for g in page] == [g.id for g in expected]
+
+    summaries = _all_pages(sharded.graph_summaries, summary_order, 3)
+    assert [s["id"] for page in summaries for s in page] == [g.id for g in expected]
+    assert summaries[0][0]["entities"] == 1
+
+
+def test_local_list_graphs_pages():
+    storage = StorageService()
+    graphs = _graphs(5)
+    for graph in graphs:
+        storage.save_graph(graph)
+    ordered = sorted(graphs, key=graph_order)
+
+    assert [g.id for g in storage.list_graphs(None, 2)] == [g.id for g in ordered[:2]]
+    assert [g.id for g in storage.list_graphs(graph_order(ordered[3]), 2)] == [ordered[4].id]
+    assert storage.list_graphs(graph_order(ordered[4]), 2) == []
+    assert storage.graph_summaries(None, 1)[0] == {
+        "id": ordered[0].id, "name": ordered[0].name, "entities": 1, "relations": 0,
+        "created_at": ordered[0].created_at}
+
+
+def test_keyset_pages_are_stable_under_writes():
+    storage = StorageService()
+    for graph in _graphs(6):
+        storage.save_graph(graph)
+    first = storage.list_graphs(None, 3)
+    # Графы, добавленные до курсора, и пересохраненный граф не сдвигают следующую страницу
+    early = KnowledgeGraph(name="early", created_at=datetime(2023, 1, 1))
+    storage.save_graph(early)
+    storage.save_graph(first[0])
+    rest = storage.list_graphs(graph_order(first[-1]), 10)
+
+    seen = [g.id for g in first + rest]
+    assert len(seen) == len(set(seen)) == 6
+    assert early.id not in seen
+
+    # Граф, добавленный напрямую в словарь, тоже попадает в порядок
+    direct = KnowledgeGraph(name="direct", created_at=datetime(2030, 1, 1))
+    storage.graphs[direct.id] = direct
+    assert storage.list_graphs(graph_order(rest[-1]), 10) == [direct]
+
+
+def test_graph_cursor_round_trip():
+    graph = _graphs(1)[0]
+    assert parse_graph_cursor(graph_cursor(graph_order(graph))) == graph_order(graph)
+    assert parse_graph_cursor("мусор") is None
+
+
+def test_knowledge_graphs_page_follows_cursor(client, web_app):
+    for graph in _graphs(web_app.GRAPHS_PER_PAGE + 1):
+        web_app.storage_service.save_graph(graph)
+    first = client.get('/knowledge-graphs')
+    assert first.status_code == 200 and 'after=' in first.get_data(as_text=True)
+    assert client.get('/knowledge-graphs?after=мусор').status_code == 200
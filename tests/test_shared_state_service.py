@@ -0,0 +1,190 @@
+"""
+Тесты общего состояния: захват однократных действий, история чат-бота, чтение своей записи,
+журнал изменений и переподключение к писателю
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph
+from services.shared_state_service import SharedStateWriter, SharedStorageService, read_current
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def writer(tmp_path):
+    return SharedStateWriter(str(tmp_path), publish_delay=0.01)
+
+
+def _claim(writer, name, owner, lease=60.0):
+    return writer.handle("claim", (name, lease), {}, owner=owner)[0]
+
+
+def test_claim_is_done_only_after_completion(writer):
+    first, second = object(), object()
+    assert _claim(writer, "demo-data", first)
+    assert not _claim(writer, "demo-data", second)
+
+    # Владелец отключился до завершения: действие снова доступно
+    writer.release_claims(first)
+    assert _claim(writer, "demo-data", second)
+    writer.handle("complete_claim", ("demo-data",), {}, owner=second)
+    assert not _claim(writer, "demo-data", first)
+    assert writer.publish() > 0
+
+
+def test_expired_lease_can_be_taken_over(writer):
+    first, second = object(), object()
+    assert _claim(writer, "seed", first, lease=0.01)
+    time.sleep(0.02)
+    assert _claim(writer, "seed", second)
+    assert not _claim(writer, "seed", first)
+
+
+def test_completed_claims_and_histories_survive_restart(tmp_path, writer):
+    writer.handle("append_history", ("u1", [{"role": "user", "message": "привет"}]), {})
+    _claim(writer, "demo-data", object())
+    writer.handle("complete_claim", ("demo-data",), {})
+    writer.publish()
+
+    restarted = SharedStateWriter(str(tmp_path))
+    assert restarted.handle("get_history", ("u1",), {})[0] == [{"role": "user", "message": "привет"}]
+    assert not _claim(restarted, "demo-data", object())
+
+
+def test_history_is_saved_without_storage_changes(tmp_path, writer):
+    writer.handle("append_history", ("u2", [{"role": "bot", "message": "ok"}]), {})
+    deadline = time.monotonic() + 2
+    while not (tmp_path / "histories.json").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert SharedStateWriter(str(tmp_path)).histories == {"u2": [{"role": "bot", "message": "ok"}]}
+
+
+def test_worker_reads_its_writes_and_disconnect_releases_claim(tmp_path, writer):
+    threading.Thread(target=writer.serve_forever, daemon=True).start()
+    worker = SharedStorageService(str(tmp_path), consistency_timeout=5.0)
+    other = SharedStorageService(str(tmp_path))
+    try:
+        graph = KnowledgeGraph(name="shared")
+        worker.save_graph(graph)
+        assert worker.get_graph(graph.id).name == "shared"
+
+        assert worker.claim("demo-data")
+        assert not other.claim("demo-data")
+        worker.close()
+        deadline = time.monotonic() + 2
+        while not other.claim("demo-data"):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        other.complete_claim("demo-data")
+    finally:
+        other.close()
+
+
+def _serve(writer):
+    threading.Thread(target=writer.serve_forever, daemon=True).start()
+
+
+def test_worker_sees_its_write_before_publication(tmp_path):
+    writer = SharedStateWriter(str(tmp_path), publish_delay=60.0)
+    _serve(writer)
+    worker = SharedStorageService(str(tmp_path), consistency_timeout=0.0)
+    try:
+        graph = KnowledgeGraph(name="сразу")
+        worker.save_graph(graph)
+        assert read_current(str(tmp_path)) is None
+        assert worker.get_graph(graph.id).name == "сразу"
+    finally:
+        worker.close()
+
+
+def test_readers_apply_journal_without_reloading(tmp_path):
+    writer = SharedStateWriter(str(tmp_path), publish_delay=0.01, compact_ratio=100.0)
+    _serve(writer)
+    worker = SharedStorageService(str(tmp_path))
+    reader = SharedStorageService(str(tmp_path), check_interval=0.0)
+    try:
+        worker.save_graph(KnowledgeGraph(name="первый"))
+        worker.publish()
+        assert len(reader.graphs) == 1
+        local, snapshot = reader._local, read_current(str(tmp_path))["path"]
+
+        second = KnowledgeGraph(name="второй")
+        worker.save_graph(second)
+        worker.add_entities(second.id, [Entity(name="Анна")])
+        worker.publish()
+        current = read_current(str(tmp_path))
+        assert current["path"] == snapshot and current["journal_size"] > 0
+        assert [e.name for e in reader.get_graph(second.id).entities] == ["Анна"]
+        assert reader._local is local and reader.version == current["version"]
+    finally:
+        worker.close()
+        reader.close()
+
+
+def test_compaction_keeps_up_to_date_worker_copy(tmp_path):
+    writer = SharedStateWriter(str(tmp_path), publish_delay=0.01, compact_ratio=0.0)
+    _serve(writer)
+    worker = SharedStorageService(str(tmp_path), check_interval=0.0)
+    try:
+        worker.save_graph(KnowledgeGraph(name="первый"))
+        worker.publish()
+        local = worker.storage
+        worker.save_graph(KnowledgeGraph(name="второй"))
+        worker.publish()
+        assert read_current(str(tmp_path))["journal_size"] == 0
+        assert len(worker.graphs) == 2 and worker.storage is local
+    finally:
+        worker.close()
+
+
+def test_restarted_writer_replays_journal(tmp_path):
+    writer = SharedStateWriter(str(tmp_path), publish_delay=60.0, compact_ratio=100.0)
+    first, second = KnowledgeGraph(name="снимок"), KnowledgeGraph(name="журнал")
+    writer.handle("save_graph", (first,), {})
+    writer.publish()
+    writer.handle("save_graph", (second,), {})
+    writer.publish()
+    current = read_current(str(tmp_path))
+    with open(tmp_path / current["journal"], "ab") as journal:
+        journal.write(b"\x00\x00")  # недописанная запись
+
+    restarted = SharedStateWriter(str(tmp_path), publish_delay=60.0)
+    assert restarted.storage.get_graph(second.id).name == "журнал"
+    assert restarted.version == current["version"]
+    assert (tmp_path / current["journal"]).stat().st_size == current["journal_size"]
+
+
+def _start_writer(directory):
+    return subprocess.Popen([sys.executable, "-m", "services.shared_state_service",
+                             "--dir", directory, "--publish-delay", "0.01"],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def test_worker_reconnects_after_writer_restart(tmp_path):
+    process = _start_writer(str(tmp_path))
+    worker = None
+    try:
+        worker = SharedStorageService(str(tmp_path), consistency_timeout=5.0)
+        first = KnowledgeGraph(name="до")
+        worker.save_graph(first)
+        worker.publish()
+
+        process.terminate()
+        process.wait(10)
+        process = _start_writer(str(tmp_path))
+
+        second = KnowledgeGraph(name="после")
+        worker.save_graph(second)
+        assert worker.get_graph(second.id).name == "после"
+        assert worker.get_graph(first.id).name == "до"
+    finally:
+        if worker is not None:
+            worker.close()
+        process.terminate()
+        process.wait(10)
@@ -0,0 +1,102 @@
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from models.data_models import Entity, KnowledgeGraph, Relation, TransformedData
+from models.enums import EntityType, RelationType, StorageType
+from models.ids import CompactId, new_id
+from services.data_service import StorageService
+from services.snapshot_service import SnapshotError, SnapshotReader, _dump_json, _load_json
+
+
+def _storage():
+    storage = StorageService()
+    alice = Entity(name="Alice", entity_type=EntityType.PERSON, properties={"start": 3})
+    acme = Entity(name="Acme", entity_type=EntityType.ORGANIZATION)
+    storage.save_graph(KnowledgeGraph(name="g", entities=[alice, acme], relations=[
+        Relation(source_entity_id=alice.id, target_entity_id=acme.id,
+                 relation_type=RelationType.PART_OF, strength=0.5)]))
+    storage.save_document(TransformedData(
+        content={"text": "hello", "when": datetime(2024, 5, 1, 12, 30), "pair": (1, 2)},
+        metadata={"source": "file", 1: "int key", "ref": new_id()}))
+    return storage
+
+
+@pytest.mark.parametrize("value", [
+    {"at": datetime(2024, 1, 2, 3, 4, 5, 6), "day": date(2024, 1, 2)},
+    {"tuple": (1, "a", (2, 3)), "set": {1, 2}, "bytes": b"\x00\xff"},
+    {1: "a", (2, 3): "b", "$kms": "escaped"},
+    {"amount": Decimal("1.10"), "type": EntityType.PERSON, "id": CompactId(123456789)},
+    [None, True, 1.5, "text", []],
+])
+def test_typed_json_round_trip(value):
+    restored = _load_json(_dump_json(value))
+    assert restored == value
+    assert type(restored) is type(value)
+
+
+def test_typed_json_keeps_value_types():
+    restored = _load_json(_dump_json({"id": CompactId(42), "at": datetime(2024, 1, 1)}))
+    assert type(restored["id"]) is CompactId
+    assert type(restored["at"]) is datetime
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(SnapshotError):
+        _dump_json({"value": object()})
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_storage_round_trip(tmp_path, compress):
+    storage = _storage()
+    path = str(tmp_path / "storage.kms")
+    storage.save_snapshot(path, compress=compress)
+
+    loaded = StorageService.load_snapshot(path)
+    graph = next(iter(loaded.graphs.values()))
+    original = next(iter(storage.graphs.values()))
+    assert graph.id == original.id and type(graph.id) is type(original.id)
+    assert [(e.name, e.entity_type, e.properties) for e in graph.entities] == \
+        [(e.name, e.entity_type, e.properties) for e in original.entities]
+    assert graph.relations[0].source_entity_id == original.relations[0].source_entity_id
+
+    doc = next(iter(loaded.documents.values()))
+    original_doc = next(iter(storage.documents.values()))
+    assert doc.content == original_doc.content
+    assert doc.metadata == original_doc.metadata
+    assert doc.storage_type == StorageType.DOCUMENT
+    assert loaded.aggregates.totals() == storage.aggregates.totals()
+
+
+def test_indexes_are_mapped_until_close(tmp_path):
+    storage = _storage()
+    storage.indexes["postings"] = array("I", [1, 2, 3])
+    storage.indexes["blob"] = b"abc"
+    path = str(tmp_path / "indexes.kms")
+    storage.save_snapshot(path)
+
+    loaded = StorageService.load_snapshot(path)
+    postings = loaded.indexes["postings"]
+    assert list(postings) == [1, 2, 3]
+    assert bytes(loaded.indexes["blob"]) == b"abc"
+
+    reader = loaded._snapshot_reader
+    loaded.close()
+    assert reader._mmap.closed
+    assert loaded.indexes == {}
+    with pytest.raises(ValueError):
+        postings[0]  # memoryview освобожден вместе с mmap
+
+
+def test_reader_close_releases_views(tmp_path):
+    path = str(tmp_path / "plain.kms")
+    _storage().save_snapshot(path)
+    reader = SnapshotReader(path)
+    column = reader.column("entities.confidence")
+    assert len(column) == 2
+    reader.close()
+    reader.close()  # повторное закрытие безопасно
+    with pytest.raises(ValueError):
+        column[0]
@@ -0,0 +1,61 @@
+"""
+Бюджет времени импорта веб-интерфейса: тяжелые модули не загружаются при старте
+"""
+import json
+import os
+import subprocess
+import sys
+
+from tests.conftest import ROOT
+
+# Секунды на импорт app.py и services сверх самого Flask
+IMPORT_BUDGET = float(os.environ.get("KMS_IMPORT_BUDGET", "0.25"))
+
+HEAVY_MODULES = (
+    "numpy",
+    "cProfile",
+    "sqlite3",
+    "multiprocessing",
+    "services.analysis_service",
+    "services.sentiment_service",
+    "services.cache_service",
+    "services.data_service",
+    "services.snapshot_service",
+    "services.shard_service",
+    "services.report_job_service",
+)
+
+_PROBE = """
+import json, sys, time
+import flask
+started = time.perf_counter()
+import web_interface.app as web_app
+import services
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "elapsed": elapsed,
+    "modules": sorted(sys.modules),
+    "created": [name for name in ("storage", "nlp", "search", "chatbot")
+                if web_app.container.is_initialized(name)],
+}))
+"""
+
+
+def _probe():
+    env = dict(os.environ, KMS_LOG_LEVEL="OFF", PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, "-c", _PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_modules_or_build_services():
+    result = _probe()
+    loaded = [name for name in HEAVY_MODULES if name in result["modules"]]
+    assert loaded == []
+    assert result["created"] == []
+
+
+def test_import_time_within_budget():
+    # Лучший из трех запусков: отсекаем шум планировщика
+    elapsed = min(_probe()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"импорт занял {elapsed:.3f} с (бюджет {IMPORT_BUDGET} с)"
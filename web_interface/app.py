@@ -1,51 +1,62 @@
 ﻿"""
 Веб-интерфейс системы управления знаниями - УПРОЩЕННАЯ РАБОЧАЯ ВЕРСИЯ
 """
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g, Response
+from flask.json.provider import DefaultJSONProvider
+import json
 import sys
 import os
+import time
+import uuid
+import logging
 from datetime import datetime
 
 # Добавляем путь к модулям системы
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 try:
-    # Импортируем минимальный набор
+    # Импортируем минимальный набор; модули сервисов загружаются при первом обращении
     from models.enums import UserRole
     from models.user_models import User
-    from models.data_models import KnowledgeGraph, Entity
     from models.enums import EntityType
     
-    from services.data_service import StorageService
-    from services.analysis_service import NLPService
-    from services.ui_service import SearchService, ChatbotService, ReportService
+    from services.service_container import ServiceContainer
+    from services.metrics_service import metrics, configure_logging
+    from services.profiling_service import PROFILE_HEADER
+    from models.ids import jsonable, parse_id
     
+    configure_logging()
+    services_imported = True
     print("✅ Все модули системы загружены")
 except ImportError as e:
+    services_imported = False
     print(f"⚠️  Предупреждение: {e}")
     print("Работаем в демо-режиме")
 
+logger = logging.getLogger("services.web")
+
+class KmsJSONProvider(DefaultJSONProvider):
+    """JSON-ответы: CompactId - строкой base32 (число больше 2^53 JavaScript округлил бы)"""
+    
+    def dumps(self, obj, **kwargs):
+        if services_imported:
+            obj = jsonable(obj)
+        return super().dumps(obj, **kwargs)
+
 app = Flask(__name__)
+app.json = KmsJSONProvider(app)
 app.secret_key = 'knowledge_management_secret_key_123'
 app.config['SESSION_TYPE'] = 'filesystem'
-
-# Инициализация сервисов
-try:
-    storage_service = StorageService()
-    nlp_service = NLPService()
-    search_service = SearchService(storage_service, nlp_service)
-    chatbot_service = ChatbotService(search_service)
-    report_service = ReportService()
-    services_loaded = True
-except:
-    services_loaded = False
-    print("⚠️  Сервисы инициализированы в демо-режиме")
+# Снимок хранилища, загружаемый вместо демо-данных при первом обращении
+app.config['SNAPSHOT_PATH'] = os.environ.get('KMS_SNAPSHOT_PATH')
+# Общее состояние для нескольких процессов (gunicorn -w N): каталог снимков писателя
+app.config['SHARED_STATE_DIR'] = os.environ.get('KMS_SHARED_STATE_DIR')
 
 # Демо-данные
-def init_demo_data():
+def init_demo_data(storage):
     """Инициализация демонстрационных данных"""
-    if not services_loaded:
-        return
+    from models.data_models import KnowledgeGraph, Entity, Relation
+    from models.enums import RelationType
     
     # Создаем демонстрационный граф знаний
     demo_graph = KnowledgeGraph(
@@ -59,6 +70,21 @@ def init_demo_data():
         ]
     )
     
+    # Связи для запросов окрестности: /api/knowledge-graphs/<id>/neighborhood?entity=Microsoft
+    by_name = {entity.name: entity for entity in demo_graph.entities}
+    for source, target, relation_type in (
+        ("Windows 11", "Microsoft", RelationType.PART_OF),
+        ("Сатья Наделла", "Microsoft", RelationType.PART_OF),
+        ("Microsoft", "Сиэтл", RelationType.LOCATED_IN),
+        ("Microsoft", "Искусственный интеллект", RelationType.RELATED_TO),
+        ("Windows 11", "Искусственный интеллект", RelationType.RELATED_TO),
+    ):
+        demo_graph.relations.append(Relation(
+            source_entity_id=by_name[source].id,
+            target_entity_id=by_name[target].id,
+            relation_type=relation_type
+        ))
+    
     # Дополнительные графы
     project_graph = KnowledgeGraph(
         name="Проект СистемаХ",
@@ -70,12 +96,136 @@ def init_demo_data():
         ]
     )
     
-    storage_service.save_graph(demo_graph)
-    storage_service.save_graph(project_graph)
-    print(f"✅ Демо-данные загружены: {len(storage_service.graphs)} графов")
+    storage.save_graph(demo_graph)
+    storage.save_graph(project_graph)
+    logger.info("Демо-данные загружены: %d графов", storage.aggregates.count('graphs'))
+
+# ========== ФАБРИКИ СЕРВИСОВ ==========
+
+def create_storage_service(container):
+    """Хранилище: общее для процессов, из снимка, если он задан, иначе с демо-данными"""
+    from services.data_service import StorageService
+    
+    shared_dir = app.config.get('SHARED_STATE_DIR')
+    if shared_dir:
+        from services.shared_state_service import SharedStorageService
+        storage = SharedStorageService(shared_dir)
+        # Демо-данные загружает только один процесс; отметка ставится после загрузки,
+        # поэтому при сбое захват снимается и загрузку выполнит другой процесс
+        if storage.claim('demo-data'):
+            init_demo_data(storage)
+            storage.complete_claim('demo-data')
+        return storage
+    
+    snapshot_path = app.config.get('SNAPSHOT_PATH')
+    if snapshot_path and os.path.exists(snapshot_path):
+        return StorageService.load_snapshot(snapshot_path)
+    
+    storage = create_sharded_storage() or StorageService()
+    init_demo_data(storage)
+    return storage
+
+def create_sharded_storage():
+    """Шардированное хранилище, если заданы KMS_SHARDS или KMS_SHARD_NODES"""
+    nodes = os.environ.get('KMS_SHARD_NODES')
+    shards = int(os.environ.get('KMS_SHARDS', '0') or 0)
+    if not nodes and shards <= 1:
+        return None
+    
+    from services.shard_service import ShardedStorageService, parse_address
+    if nodes:
+        return ShardedStorageService(addresses=[parse_address(n) for n in nodes.split(',')])
+    return ShardedStorageService(num_shards=shards)
+
+def create_nlp_service(container):
+    from services.analysis_service import NLPService
+    return NLPService()
+
+def create_search_service(container):
+    from services.ui_service import SearchService
+    return SearchService(container.get('storage'), container.get('nlp'))
+
+def create_chatbot_service(container):
+    from services.ui_service import ChatbotService
+    storage = container.get('storage')
+    # В режиме общего состояния история диалогов видна всем процессам
+    history_store = storage if hasattr(storage, 'append_history') else None
+    return ChatbotService(container.get('search'), history_store=history_store)
 
-# Инициализируем данные
-init_demo_data()
+def create_report_service(container):
+    from services.ui_service import ReportService
+    return ReportService()
+
+def create_report_job_service(container):
+    from services.report_job_service import ReportJobService
+    return ReportJobService(container.get('storage'), container.get('reports'))
+
+def create_profiling_service(container):
+    from services.profiling_service import ProfilingService
+    return ProfilingService()
+
+# Сервисы создаются при первом обращении, а не при импорте модуля;
+# services_imported означает только успешный импорт, готовность - в /api/status
+CORE_SERVICES = ('storage', 'nlp', 'search')
+GRAPHS_PER_PAGE = 20
+
+if services_imported:
+    container = ServiceContainer()
+    container.register('storage', create_storage_service)
+    container.register('nlp', create_nlp_service)
+    container.register('search', create_search_service)
+    container.register('chatbot', create_chatbot_service)
+    container.register('reports', create_report_service)
+    container.register('report_jobs', create_report_job_service)
+    container.register('profiling', create_profiling_service)
+    
+    storage_service = container.proxy('storage')
+    nlp_service = container.proxy('nlp')
+    search_service = container.proxy('search')
+    chatbot_service = container.proxy('chatbot')
+    report_service = container.proxy('reports')
+    report_job_service = container.proxy('report_jobs')
+    profiling_service = container.proxy('profiling')
+
+# ========== МЕТРИКИ ЗАПРОСОВ ==========
+
+@app.before_request
+def start_request_timer():
+    """Засечь время начала обработки запроса"""
+    g.request_started = time.perf_counter()
+    if services_imported and profiling_service.enabled:
+        requested = request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'on')
+        if profiling_service.should_profile(requested):
+            # ID профиля выдает сервер: клиентский ID мог бы перезаписать чужой профиль
+            profile_id = uuid.uuid4().hex
+            g.profile_session = profiling_service.start(
+                f"{request.method} {request.path}", profile_id)
+
+@app.after_request
+def record_request_metrics(response):
+    """Записать длительность и статус запроса"""
+    started = g.pop('request_started', None)
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        profiling_service.stop(profile_session)
+        response.headers['X-Profile-Id'] = profile_session.profile_id
+    if services_imported and started is not None:
+        labels = {
+            'endpoint': request.endpoint or 'unknown',
+            'method': request.method,
+            'status': response.status_code
+        }
+        metrics.inc('kms_http_requests_total', labels=labels)
+        metrics.observe('kms_http_request_seconds', time.perf_counter() - started,
+                        {'endpoint': labels['endpoint']})
+    return response
+
+@app.teardown_request
+def finish_failed_profile(error=None):
+    """Завершить профилирование, если запрос упал до after_request"""
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        profiling_service.stop(profile_session)
 
 # ========== МАРШРУТЫ ==========
 
@@ -91,7 +241,7 @@ def login():
         username = request.form.get('username', '').strip()
         if username:
             user = User(username=username, role=UserRole.USER)
-            session['user_id'] = user.id
+            session['user_id'] = str(user.id)
             session['username'] = user.username
             session['role'] = user.role.value
             return redirect(url_for('dashboard'))
@@ -104,11 +254,14 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    # Статистика системы
+    # Статистика системы из материализованных агрегатов (не зависит от объема данных)
+    totals = storage_service.aggregates.totals() if services_imported else {
+        'graphs': 2, 'entities': 9, 'documents': 5
+    }
     stats = {
-        'graphs_count': len(storage_service.graphs) if services_loaded else 2,
-        'total_entities': sum(len(g.entities) for g in storage_service.graphs.values()) if services_loaded else 9,
-        'documents_count': len(storage_service.documents) if services_loaded else 5,
+        'graphs_count': totals['graphs'],
+        'total_entities': totals['entities'],
+        'documents_count': totals['documents'],
         'username': session.get('username', 'Гость')
     }
     
@@ -127,7 +280,7 @@ def search():
     
     if request.method == 'POST':
         query = request.form.get('query', '').strip()
-        if query and services_loaded:
+        if query and services_imported:
             from models.user_models import UserQuery as UQ
             user_query = UQ(
                 user_id=session['user_id'],
@@ -150,12 +303,12 @@ def chatbot():
     user_id = session['user_id']
     message_history = []
     
-    if services_loaded:
+    if services_imported:
         message_history = chatbot_service.get_conversation_history(user_id)
     
     if request.method == 'POST':
         message = request.form.get('message', '').strip()
-        if message and services_loaded:
+        if message and services_imported:
             response = chatbot_service.process_message(user_id, message)
             message_history = chatbot_service.get_conversation_history(user_id)
     
@@ -177,7 +330,7 @@ def nlp_analysis():
         text = request.form.get('text', '').strip()
         analyzed_text = text
         
-        if text and services_loaded:
+        if text and services_imported:
             entities = nlp_service.extract_entities(text)
             sentiment = nlp_service.analyze_sentiment(text)
     
@@ -193,21 +346,50 @@ def knowledge_graphs():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
+    # Постранично по курсору (ключ последнего графа): шарды передают только графы страницы
     graphs = []
-    if services_loaded:
-        graphs = list(storage_service.graphs.values())
+    after = request.args.get('after')
+    next_cursor = None
+    if services_imported:
+        from services.data_service import graph_cursor, graph_order, parse_graph_cursor
+        
+        graphs = storage_service.list_graphs(parse_graph_cursor(after) if after else None,
+                                             GRAPHS_PER_PAGE + 1)
+        if len(graphs) > GRAPHS_PER_PAGE:
+            graphs = graphs[:GRAPHS_PER_PAGE]
+            next_cursor = graph_cursor(graph_order(graphs[-1]))
     
     return render_template('knowledge_graphs.html', 
                          graphs=graphs,
+                         first_page=not after,
+                         next_cursor=next_cursor,
                          username=session.get('username'))
 
-@app.route('/reports')
+@app.route('/reports', methods=['GET', 'POST'])
 def reports():
     """Генерация отчетов"""
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
+    from services.report_job_service import REPORT_TYPES
+    
+    if request.method == 'POST' and services_imported:
+        report_type = request.form.get('report_type', 'SUMMARY')
+        if report_type in REPORT_TYPES:
+            report_job_service.submit(
+                title=request.form.get('title', '').strip(),
+                report_type=report_type,
+                user_id=session['user_id']
+            )
+        return redirect(url_for('reports'))
+    
+    jobs = report_job_service.list_jobs(session['user_id']) if services_imported else []
+    pending = any(job.status.value in ('PENDING', 'RUNNING') for job in jobs)
+    
     return render_template('reports.html',
+                         report_types=REPORT_TYPES,
+                         jobs=jobs,
+                         pending=pending,
                          username=session.get('username'))
 
 @app.route('/system-info')
@@ -216,6 +398,33 @@ def system_info():
     return render_template('system_info.html',
                          username=session.get('username'))
 
+@app.route('/system-info/profiles')
+def system_profiles():
+    """Список последних профилей запросов и ETL-запусков"""
+    if not services_imported or not profiling_service.enabled:
+        return jsonify({'error': 'Профилирование выключено'}), 404
+    
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'policy': profiling_service.policy,
+        'mode': profiling_service.mode,
+        'profiles': [p.summary() for p in profiling_service.recent_profiles(limit)]
+    })
+
+@app.route('/system-info/profiles/<profile_id>')
+def system_profile(profile_id):
+    """Профиль по ID; ?format=collapsed - свернутые стеки для flamegraph"""
+    if not services_imported or not profiling_service.enabled:
+        return jsonify({'error': 'Профилирование выключено'}), 404
+    
+    record = profiling_service.get_profile(profile_id)
+    if record is None:
+        return jsonify({'error': 'Профиль не найден'}), 404
+    
+    if request.args.get('format') == 'collapsed':
+        return Response(record.collapsed(), mimetype='text/plain')
+    return jsonify(record.to_dict())
+
 @app.route('/logout')
 def logout():
     """Выход из системы"""
@@ -235,20 +444,102 @@ def logout():
 
 @app.route('/api/status')
 def api_status():
-    """API: статус системы"""
+    """API: статус системы (основные сервисы создаются, ошибки создания - в services)"""
+    health = container.health(require=CORE_SERVICES) if services_imported else {}
+    ready = services_imported and all(health[name] == 'ok' for name in CORE_SERVICES)
     return jsonify({
-        'status': 'active',
+        'status': 'active' if ready else 'degraded',
         'version': '1.0',
-        'services_loaded': services_loaded,
+        'services_imported': services_imported,
+        'services': health,
         'user': session.get('username'),
-        'graphs_count': len(storage_service.graphs) if services_loaded else 0,
+        'graphs_count': storage_service.aggregates.count('graphs') if ready else 0,
         'timestamp': datetime.now().isoformat()
-    })
+    }), 200 if ready else 503
+
+@app.route('/api/metrics')
+def api_metrics():
+    """API: метрики в текстовом формате Prometheus"""
+    if not services_imported:
+        return Response('', mimetype='text/plain; version=0.0.4')
+    
+    for name, value in storage_service.aggregates.totals().items():
+        metrics.set_gauge(f'kms_storage_{name}', value)
+    return Response(metrics.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/aggregates')
+def api_aggregates():
+    """API: агрегаты по типам, источникам и дням"""
+    if not services_imported:
+        return jsonify({})
+    
+    include_graphs = request.args.get('graphs', '0') == '1'
+    aggregates = storage_service.aggregates.snapshot(include_graphs=include_graphs)
+    aggregates['by_graph'] = {str(graph_id): summary for graph_id, summary in aggregates['by_graph'].items()}
+    return jsonify(aggregates)
+
+def _split_arg(name):
+    """Список значений из параметра вида a,b,c"""
+    value = request.args.get(name, '')
+    return [item for item in value.split(',') if item.strip()]
+
+def _graph_query(run):
+    """Выполнить запрос к графу и вернуть JSON (404 - нет графа/сущности, 400 - неверные параметры)"""
+    if not services_imported:
+        return jsonify({'success': False, 'error': 'Сервисы не загружены'}), 503
+    try:
+        result = run()
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **result.to_dict()})
+
+@app.route('/api/knowledge-graphs/<graph_id>/neighborhood')
+def api_graph_neighborhood(graph_id):
+    """API: окрестность сущности (?entity=&hops=&relation_types=&entity_types=&direction=&limit=)"""
+    graph_id = parse_id(graph_id)
+    
+    def run():
+        entity = request.args.get('entity', '').strip()
+        if not entity:
+            raise ValueError('Не указана сущность (entity)')
+        return search_service.explore_neighborhood(
+            graph_id, entity,
+            hops=request.args.get('hops', 2, type=int),
+            relation_types=_split_arg('relation_types'),
+            entity_types=_split_arg('entity_types'),
+            direction=request.args.get('direction', 'both'),
+            limit=request.args.get('limit', 1000, type=int),
+            timeout=request.args.get('timeout_ms', 1000, type=int) / 1000
+        )
+    return _graph_query(run)
+
+@app.route('/api/knowledge-graphs/<graph_id>/path')
+def api_graph_path(graph_id):
+    """API: кратчайший путь между сущностями (?source=&target=&max_hops=)"""
+    graph_id = parse_id(graph_id)
+    
+    def run():
+        source = request.args.get('source', '').strip()
+        target = request.args.get('target', '').strip()
+        if not source or not target:
+            raise ValueError('Укажите начальную и конечную сущности (source, target)')
+        return search_service.find_path(
+            graph_id, source, target,
+            max_hops=request.args.get('max_hops', 6, type=int),
+            relation_types=_split_arg('relation_types'),
+            entity_types=_split_arg('entity_types'),
+            direction=request.args.get('direction', 'both'),
+            timeout=request.args.get('timeout_ms', 1000, type=int) / 1000
+        )
+    return _graph_query(run)
 
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
     """API для чат-бота"""
-    if not services_loaded:
+    if not services_imported:
         return jsonify({
             'success': False,
             'response': 'Сервисы не загружены'
@@ -267,6 +558,131 @@ def api_chat():
         'history': history[-5:] if history else []
     })
 
+def _unauthorized():
+    return jsonify({'success': False, 'error': 'Требуется вход в систему'}), 401
+
+@app.route('/api/etl', methods=['POST'])
+def api_etl_run():
+    """API: ETL-запуск по списку источников ({"sources": [{"type": "SQL", "connection": "..."}]})"""
+    if 'user_id' not in session:
+        return _unauthorized()
+    if not services_imported:
+        return jsonify({'success': False, 'error': 'Сервисы не загружены'}), 503
+    
+    from models.data_models import Connection
+    from models.enums import DataSourceType, StorageType
+    from services.data_service import ETLService
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    sources = data.get('sources') or []
+    if not isinstance(sources, list) or not all(isinstance(source, dict) for source in sources):
+        return jsonify({'success': False,
+                        'error': 'sources - список объектов {"type": ..., "connection": ...}'}), 400
+    
+    etl = ETLService(profiler=profiling_service, storage_service=storage_service)
+    try:
+        for source in sources:
+            etl.add_source(Connection(
+                source_type=DataSourceType(str(source.get('type', 'FILE')).upper()),
+                connection_string=source.get('connection', '')
+            ))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    etl.add_loader(StorageType.DOCUMENT)
+    
+    # Профилирование ETL: "profile": true в теле или заголовок X-Profile
+    requested = bool(data.get('profile')) or \
+        request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'on')
+    results = etl.run_etl(profile=requested)
+    return jsonify({'success': not results['errors'], 'results': results,
+                    'profile_id': etl.last_profile_id})
+
+@app.route('/api/reports', methods=['POST'])
+def api_report_submit():
+    """API: поставить отчет в очередь"""
+    if 'user_id' not in session:
+        return _unauthorized()
+    if not services_imported:
+        return jsonify({'success': False, 'error': 'Сервисы не загружены'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        job = report_job_service.submit(
+            title=data.get('title', ''),
+            report_type=data.get('report_type', 'SUMMARY'),
+            user_id=session['user_id'],
+            parameters=data.get('parameters')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'job': report_job_service.describe(job)}), 202
+
+def _own_report_job(job_id):
+    """Задание текущего пользователя; чужие задания не отличаются от несуществующих"""
+    job = report_job_service.get_job(job_id) if services_imported else None
+    if job is None or job.created_by != session['user_id']:
+        return None
+    return job
+
+@app.route('/api/reports/<job_id>')
+def api_report_status(job_id):
+    """API: состояние задания на отчет"""
+    if 'user_id' not in session:
+        return _unauthorized()
+    job_id = parse_id(job_id)
+    job = _own_report_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Задание не найдено'}), 404
+    
+    return jsonify({'success': True, 'job': report_job_service.describe(job)})
+
+@app.route('/api/reports/<job_id>/events')
+def api_report_events(job_id):
+    """API: поток изменений состояния задания (Server-Sent Events)"""
+    if 'user_id' not in session:
+        return _unauthorized()
+    job_id = parse_id(job_id)
+    job = _own_report_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Задание не найдено'}), 404
+    
+    def events():
+        for state in report_job_service.iter_status(job_id):
+            yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/reports/<job_id>/export')
+def api_report_export(job_id):
+    """API: потоковый экспорт готового отчета (?format=csv|json|ndjson)"""
+    if 'user_id' not in session:
+        return _unauthorized()
+    job_id = parse_id(job_id)
+    job = _own_report_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Задание не найдено'}), 404
+    if job.report is None:
+        return jsonify({'success': False, 'error': 'Отчет еще не готов',
+                        'job': report_job_service.describe(job)}), 409
+    
+    export_format = request.args.get('format', 'csv').upper()
+    mimetypes = {
+        'CSV': 'text/csv',
+        'JSON': 'application/json',
+        'NDJSON': 'application/x-ndjson'
+    }
+    if export_format not in mimetypes:
+        return jsonify({'success': False, 'error': f'Неподдерживаемый формат: {export_format}'}), 400
+    
+    filename = f"report-{job.id}.{export_format.lower()}"
+    return Response(report_job_service.iter_export(job_id, export_format),
+                    mimetype=mimetypes[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 # ========== ЗАПУСК СЕРВЕРА ==========
 
 if __name__ == '__main__':
@@ -279,9 +695,13 @@ if __name__ == '__main__':
     print("• /dashboard - Панель управления")
     print("• /search - Поиск знаний (попробуйте 'Microsoft' или 'проект')")
     print("• /knowledge-graphs - Графы знаний")
+    print("• /api/knowledge-graphs/<id>/neighborhood?entity=Microsoft&hops=2 - Окрестность сущности")
     print("• /chatbot - Интеллектуальный чат-бот")
     print("• /nlp-analysis - NLP анализ текста")
     print("• /api/status - API статуса системы")
+    print("• /reports - Фоновые отчеты и потоковый экспорт")
+    print("• POST /api/etl - ETL-запуск (с профилированием при KMS_PROFILING)")
+    print("• /api/metrics - Метрики (Prometheus)")
     print("="*60)
     
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,563 @@
+"""
+Нагрузочное тестирование веб-интерфейса: смесь запросов, перцентили задержек, сравнение прогонов
+
+Запуск:
+    python web_interface/load_test.py --duration 30 --concurrency 16 --output run.json
+    python web_interface/load_test.py --url http://localhost:5000 --compare run.json
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models.data_models import Entity, KnowledgeGraph, Relation, TransformedData
+from models.enums import EntityType, RelationType
+
+logger = logging.getLogger("services.load_test")
+
+REPORT_VERSION = 1
+LATENCY_METRICS = ("p50", "p90", "p99", "mean", "max")
+
+# ---------- Синтетические данные ----------
+
+_NAMES = {
+    EntityType.PERSON: ["Иван Петров", "Анна Смирнова", "Сатья Наделла", "Олег Иванов",
+                        "Мария Кузнецова", "Петр Соколов"],
+    EntityType.ORGANIZATION: ["Microsoft", "ТехноИнновации", "Яндекс", "Сбер", "OpenAI",
+                              "Ростелеком"],
+    EntityType.LOCATION: ["Москва", "Сиэтл", "Казань", "Новосибирск", "Лондон"],
+    EntityType.DATE: ["2023", "2024", "Q4 2024", "январь 2025"],
+    EntityType.CONCEPT: ["Искусственный интеллект", "Анализ рисков", "Облачные вычисления",
+                         "Машинное обучение", "Кибербезопасность", "Проект СистемаХ"],
+}
+
+QUERIES = ["Microsoft", "проект", "анализ рисков", "Москва", "компания", "сотрудник",
+           "искусственный интеллект", "отчет", "облачные", "несуществующий запрос"]
+
+TEXTS = [
+    "Компания Microsoft, основанная Биллом Гейтсом, представила Windows 11 в 2021 году.",
+    "Иван Петров из ТехноИнновации подготовил отличный отчет по анализу рисков.",
+    "Проект СистемаХ в Москве столкнулся с серьезными проблемами и задержками.",
+    "Искусственный интеллект и машинное обучение - не очень новые, но крайне важные темы.",
+]
+
+
+def build_synthetic_storage(graphs: int = 50, entities: int = 40, documents: int = 200,
+                            seed: int = 0):
+    """StorageService, заполненный случайными графами и документами"""
+    from services.data_service import StorageService
+
+    rng = random.Random(seed)
+    storage = StorageService()
+    types = list(_NAMES)
+    for number in range(graphs):
+        graph = KnowledgeGraph(name=f"Граф {number}: {rng.choice(_NAMES[EntityType.CONCEPT])}")
+        for index in range(entities):
+            entity_type = rng.choice(types)
+            graph.entities.append(Entity(
+                name=f"{rng.choice(_NAMES[entity_type])} {index}" if index >= len(types) * 2
+                else rng.choice(_NAMES[entity_type]),
+                entity_type=entity_type,
+                confidence=round(rng.uniform(0.5, 1.0), 2)
+            ))
+        for _ in range(entities * 2):
+            source, target = rng.sample(graph.entities, 2)
+            graph.relations.append(Relation(
+                source_entity_id=source.id,
+                target_entity_id=target.id,
+                relation_type=rng.choice(list(RelationType)),
+                strength=round(rng.random(), 2)
+            ))
+        storage.save_graph(graph)
+
+    for _ in range(documents):
+        storage.save_document(TransformedData(
+            content={"text": rng.choice(TEXTS), "tags": rng.sample(QUERIES, 2)},
+            metadata={"source": rng.choice(["file", "api", "sql"])}
+        ))
+    return storage
+
+
+# ---------- Сценарии ----------
+
+# Сценарий: (rng, данные) -> (метод, путь, параметры запроса: data/json/query_string)
+RequestSpec = Tuple[str, str, Dict[str, Any]]
+
+
+def _search(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'POST', '/search', {'data': {'query': rng.choice(QUERIES)}}
+
+
+def _api_chat(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'POST', '/api/chat', {'json': {'message': f"Найди {rng.choice(QUERIES)}"}}
+
+
+def _nlp_analysis(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'POST', '/nlp-analysis', {'data': {'text': rng.choice(TEXTS)}}
+
+
+def _neighborhood(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    graph_id, names = rng.choice(data['graphs'])
+    return 'GET', f'/api/knowledge-graphs/{graph_id}/neighborhood', {
+        'query_string': {'entity': rng.choice(names), 'hops': 2}}
+
+
+def _aggregates(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'GET', '/api/aggregates', {}
+
+
+def _dashboard(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'GET', '/dashboard', {}
+
+
+def _status(rng: random.Random, data: Dict[str, Any]) -> RequestSpec:
+    return 'GET', '/api/status', {}
+
+
+SCENARIOS: Dict[str, Callable[[random.Random, Dict[str, Any]], RequestSpec]] = {
+    'search': _search,
+    'api_chat': _api_chat,
+    'nlp_analysis': _nlp_analysis,
+    'neighborhood': _neighborhood,
+    'aggregates': _aggregates,
+    'dashboard': _dashboard,
+    'status': _status,
+}
+
+DEFAULT_MIX = {'search': 4, 'api_chat': 2, 'nlp_analysis': 2, 'neighborhood': 1,
+               'aggregates': 1, 'dashboard': 1}
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """Смесь запросов из строки вида "search=4,api_chat=2" """
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name} (доступны: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ---------- Клиенты ----------
+
+class FlaskClient:
+    """Запросы к приложению в том же процессе через тестовый клиент Flask"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self, username: str):
+        self.client.post('/login', data={'username': username, 'password': username})
+
+    def request(self, method: str, path: str, options: Dict[str, Any]) -> int:
+        response = self.client.open(path, method=method, **options)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """Запросы к запущенному серверу по HTTP (сессия - в cookie)"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def login(self, username: str):
+        self.request('POST', '/login', {'data': {'username': username, 'password': username}})
+
+    def request(self, method: str, path: str, options: Dict[str, Any]) -> int:
+        url = self.base_url + path
+        if options.get('query_string'):
+            url += '?' + urllib.parse.urlencode(options['query_string'])
+        headers = {}
+        body = None
+        if 'json' in options:
+            body = json.dumps(options['json']).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif 'data' in options:
+            body = urllib.parse.urlencode(options['data']).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+# ---------- Прогон ----------
+
+@dataclass
+class EndpointStats:
+    """Результаты одного сценария"""
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0          # 5xx и исключения клиента
+    client_errors: int = 0   # 4xx (например, сущность не найдена)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, latency: float, status: Optional[int]):
+        self.latencies.append(latency)
+        key = str(status) if status is not None else 'exception'
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+        elif status >= 400:
+            self.client_errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'client_errors': self.client_errors,
+            'error_rate': round(self.errors / count, 4) if count else 0.0,
+            'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p90': round(percentile(latencies, 90) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'mean': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            'max': round(latencies[-1] * 1000, 3) if count else 0.0,
+            'statuses': dict(sorted(self.statuses.items())),
+        }
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Перцентиль по рангу (nearest-rank) для отсортированного списка"""
+    if not values:
+        return 0.0
+    # percent * n / 100, а не percent / 100 * n: 7 / 100 * 100 = 7.000000000000001
+    rank = math.ceil(percent * len(values) / 100) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+@dataclass
+class LoadTestConfig:
+    """Параметры прогона"""
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    concurrency: int = 8
+    duration: Optional[float] = 10.0   # секунды; None - до requests запросов
+    requests: Optional[int] = None
+    warmup: int = 20                   # запросов на исполнителя, не попадающих в статистику
+    seed: int = 0
+    url: Optional[str] = None          # None - приложение в этом процессе
+    graphs: int = 50
+    entities: int = 40
+    documents: int = 200
+
+
+class LoadTest:
+    """Асинхронный генератор нагрузки: concurrency исполнителей с собственными сессиями
+
+    Запросы выполняются в пуле потоков (клиенты синхронные), поэтому в режиме
+    тестового клиента нагрузка проверяет и потокобезопасность сервисов.
+    """
+
+    def __init__(self, config: LoadTestConfig,
+                 client_factory: Callable[[], Any], data: Dict[str, Any]):
+        self.config = config
+        self.client_factory = client_factory
+        self.data = data
+        self.stats: Dict[str, EndpointStats] = {name: EndpointStats() for name in config.mix}
+        self.setup_errors: List[str] = []
+        self._issued = 0
+        self._deadline = 0.0
+        self._warmed = 0
+
+    def _next_allowed(self) -> bool:
+        if self.config.requests is not None:
+            if self._issued >= self.config.requests:
+                return False
+            self._issued += 1
+            return True
+        return time.monotonic() < self._deadline
+
+    def _timed(self, client, spec: RequestSpec) -> Tuple[float, Optional[int]]:
+        method, path, options = spec
+        started = time.perf_counter()
+        try:
+            status = client.request(method, path, options)
+        except Exception as e:
+            logger.warning("Ошибка запроса %s %s: %s", method, path, e)
+            status = None
+        return time.perf_counter() - started, status
+
+    async def _worker(self, number: int, pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        rng = random.Random(self.config.seed * 1000 + number)
+        names = list(self.config.mix)
+        weights = [self.config.mix[name] for name in names]
+
+        ready = False
+        try:
+            client = await loop.run_in_executor(pool, self.client_factory)
+            await loop.run_in_executor(pool, client.login, f"load{number}")
+            for _ in range(self.config.warmup):
+                name = rng.choices(names, weights)[0]
+                await loop.run_in_executor(pool, self._timed, client,
+                                           SCENARIOS[name](rng, self.data))
+            ready = True
+        except Exception as e:
+            logger.warning("Исполнитель %d не подготовлен: %s", number, e)
+            self.setup_errors.append(f"исполнитель {number}: {e}")
+        finally:
+            self._warmed += 1
+            if self._warmed == self.config.concurrency:
+                self._all_warmed.set()
+        if not ready:
+            return
+        await self._start.wait()
+
+        while self._next_allowed():
+            name = rng.choices(names, weights)[0]
+            latency, status = await loop.run_in_executor(
+                pool, self._timed, client, SCENARIOS[name](rng, self.data))
+            self.stats[name].record(latency, status)
+
+    async def run_async(self) -> Dict[str, Any]:
+        self._warmed = 0
+        self._all_warmed = asyncio.Event()
+        self._start = asyncio.Event()
+        with ThreadPoolExecutor(max_workers=self.config.concurrency,
+                                thread_name_prefix="kms-load") as pool:
+            workers = [asyncio.ensure_future(self._worker(number, pool))
+                       for number in range(self.config.concurrency)]
+            # Замер начинается, когда прогреты все исполнители
+            await self._all_warmed.wait()
+            started = time.monotonic()
+            self._deadline = started + (self.config.duration or 0)
+            self._start.set()
+            await asyncio.gather(*workers)
+            elapsed = time.monotonic() - started
+        return self.report(elapsed)
+
+    def run(self) -> Dict[str, Any]:
+        return asyncio.run(self.run_async())
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {name: stats.summary(elapsed) for name, stats in self.stats.items()}
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.errors += stats.errors
+            total.client_errors += stats.client_errors
+            for status, count in stats.statuses.items():
+                total.statuses[status] = total.statuses.get(status, 0) + count
+        config = self.config
+        return {
+            'version': REPORT_VERSION,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 3),
+            'config': {
+                'target': config.url or 'flask-test-client',
+                'mix': config.mix,
+                'concurrency': config.concurrency,
+                'duration': config.duration,
+                'requests': config.requests,
+                'warmup': config.warmup,
+                'seed': config.seed,
+                'data': {'graphs': config.graphs, 'entities': config.entities,
+                         'documents': config.documents},
+            },
+            'endpoints': endpoints,
+            'total': total.summary(elapsed),
+            'setup_errors': list(self.setup_errors),
+        }
+
+
+# ---------- SLO и сравнение прогонов ----------
+
+def parse_slo(text: Optional[str]) -> Dict[Tuple[str, str], float]:
+    """Цели из строки вида "p99=500,search.p99=200,error_rate=0.01" (задержки - в мс)"""
+    slo = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        key, _, value = part.strip().partition('=')
+        endpoint, _, metric = key.rpartition('.')
+        if metric not in LATENCY_METRICS + ('error_rate',):
+            raise ValueError(f"Неизвестная метрика SLO: {metric}")
+        slo[(endpoint or '*', metric)] = float(value)
+    return slo
+
+
+def check_slo(report: Dict[str, Any], slo: Dict[Tuple[str, str], float]) -> List[str]:
+    """Нарушения SLO; цель "*" относится к каждому сценарию"""
+    violations = []
+    for name, summary in report['endpoints'].items():
+        if not summary['requests']:
+            continue
+        for metric in LATENCY_METRICS + ('error_rate',):
+            limit = slo.get((name, metric), slo.get(('*', metric)))
+            if limit is not None and summary[metric] > limit:
+                violations.append(f"{name}: {metric}={summary[metric]} > {limit}")
+    return violations
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2,
+                    min_delta_ms: float = 1.0) -> List[str]:
+    """Регрессии относительно базового прогона
+
+    Задержка (p50/p90/p99) выросла больше чем на threshold и на min_delta_ms,
+    пропускная способность упала больше чем на threshold, доля ошибок выросла
+    больше чем на процентный пункт.
+    """
+    regressions = []
+    for name, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before or not before['requests'] or not now['requests']:
+            continue
+        for metric in ('p50', 'p90', 'p99'):
+            if now[metric] - before[metric] > min_delta_ms and \
+                    now[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {before[metric]} -> {now[metric]} мс")
+        if now['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> "
+                               f"{now['throughput_rps']} rps")
+        if now['error_rate'] - before['error_rate'] > 0.01:
+            regressions.append(f"{name}: error_rate {before['error_rate']} -> {now['error_rate']}")
+    return regressions
+
+
+def _change(before: float, now: float) -> str:
+    return f"{(now - before) / before * 100:+.0f}%" if before else ''
+
+
+def format_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    """Таблица по сценариям (с изменением p99 и rps относительно базового прогона)"""
+    header = f"{'сценарий':<14}{'запросы':>9}{'rps':>9}{'p50 мс':>10}{'p90 мс':>10}" \
+             f"{'p99 мс':>10}{'ошибки':>9}"
+    if baseline:
+        header += f"{'Δp99':>8}{'Δrps':>8}"
+    lines = [header, '-' * len(header)]
+    rows = list(report['endpoints'].items()) + [('ИТОГО', report['total'])]
+    for name, summary in rows:
+        line = f"{name:<14}{summary['requests']:>9}{summary['throughput_rps']:>9.1f}" \
+               f"{summary['p50']:>10.2f}{summary['p90']:>10.2f}{summary['p99']:>10.2f}" \
+               f"{summary['error_rate']:>9.2%}"
+        before = (baseline['total'] if name == 'ИТОГО' else baseline['endpoints'].get(name)) \
+            if baseline else None
+        if before:
+            line += f"{_change(before['p99'], summary['p99']):>8}" \
+                    f"{_change(before['throughput_rps'], summary['throughput_rps']):>8}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+# ---------- Запуск ----------
+
+def local_target(config: LoadTestConfig) -> Tuple[Callable[[], Any], Dict[str, Any]]:
+    """Приложение в этом процессе с синтетическим хранилищем вместо демо-данных"""
+    from web_interface import app as web_app
+
+    if not web_app.services_imported:
+        raise RuntimeError("Сервисы веб-интерфейса не загружены")
+    storage = build_synthetic_storage(config.graphs, config.entities, config.documents,
+                                      config.seed)
+    web_app.container.set('storage', storage)
+    data = {'graphs': [(str(graph.id), [entity.name for entity in graph.entities])
+                       for graph in storage.graphs.values()]}
+    return (lambda: FlaskClient(web_app.app)), data
+
+
+def remote_target(config: LoadTestConfig) -> Tuple[Callable[[], Any], Dict[str, Any]]:
+    """Запущенный сервер; графы берутся из /api/aggregates, имена сущностей - из словаря"""
+    with urllib.request.urlopen(config.url.rstrip('/') + '/api/aggregates?graphs=1') as response:
+        graph_ids = list(json.load(response).get('by_graph', {}))
+    names = [name for values in _NAMES.values() for name in values]
+    data = {'graphs': [(graph_id, names) for graph_id in graph_ids]}
+    return (lambda: HttpClient(config.url)), data
+
+
+def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """Подготовить цель и выполнить прогон"""
+    client_factory, data = remote_target(config) if config.url else local_target(config)
+    if not data['graphs']:
+        # Конфигурация вызывающего не меняется
+        config = replace(config, mix={name: weight for name, weight in config.mix.items()
+                                      if name != 'neighborhood'})
+    return LoadTest(config, client_factory, data).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест веб-интерфейса")
+    parser.add_argument('--url', help="адрес запущенного сервера (по умолчанию - приложение "
+                                      "в этом процессе через тестовый клиент)")
+    parser.add_argument('--mix', help=f"смесь сценариев, например search=4,api_chat=2 "
+                                      f"(доступны: {', '.join(SCENARIOS)})")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность, с")
+    parser.add_argument('--requests', type=int, help="число запросов вместо длительности")
+    parser.add_argument('--warmup', type=int, default=20, help="запросов прогрева на исполнителя")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--graphs', type=int, default=50)
+    parser.add_argument('--entities', type=int, default=40, help="сущностей в графе")
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--output', help="записать отчет в JSON")
+    parser.add_argument('--compare', help="JSON базового прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="допустимое ухудшение относительно базового прогона (доля)")
+    parser.add_argument('--slo', help="цели, например p99=500,search.p99=200,error_rate=0.01")
+    options = parser.parse_args(argv)
+
+    try:
+        config = LoadTestConfig(
+            mix=parse_mix(options.mix), concurrency=options.concurrency,
+            duration=None if options.requests else options.duration, requests=options.requests,
+            warmup=options.warmup, seed=options.seed, url=options.url, graphs=options.graphs,
+            entities=options.entities, documents=options.documents
+        )
+        slo = parse_slo(options.slo)
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = run_load_test(config)
+    report['slo_violations'] = check_slo(report, slo)
+    report['regressions'] = compare_reports(baseline, report, options.threshold) \
+        if baseline else []
+
+    print(format_report(report, baseline))
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчет: {options.output}")
+    for title, problems in (("Ошибки подготовки исполнителей", report['setup_errors']),
+                            ("Нарушения SLO", report['slo_violations']),
+                            ("Регрессии", report['regressions'])):
+        if problems:
+            print(f"{title}:")
+            for problem in problems:
+                print(f"  {problem}")
+    return 1 if report['setup_errors'] or report['slo_violations'] or report['regressions'] else 0
+
+
+if __name__ == '__main__':
+    # Логи сервисов на каждый запрос исказили бы замер
+    os.environ.setdefault('KMS_LOG_LEVEL', 'WARNING')
+    sys.exit(main())